@@ -4,14 +4,14 @@ import uuid
 import urllib
 import logging
 import requests
-from datetime import datetime
+from collections import OrderedDict
 from newspaper import Article
 from tempfile import TemporaryFile
 
 from django.conf import settings
 from django.http import HttpResponse
 from django.contrib.auth.models import User
-from django.utils.timezone import now, get_current_timezone
+from django.utils.timezone import now
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.db import models
@@ -176,20 +176,25 @@ class DocumentSortedListView(DocumentListView):
     endpoint_name = 'document_sorted_list_view'
 
     def _sort_by_viewdate(self, queryset, user, reversed):
-        def _sort_func(document):
-            try:
-                vd = UserLastViewDate.objects.get(document=document, user=user)
-                return vd.date
-            except UserLastViewDate.DoesNotExist:
-                return datetime.min.replace(tzinfo=get_current_timezone())
-
-        sorted_queryset = sorted(
-            queryset,
-            key=_sort_func,
-            reverse=reversed
+        """
+        Sorts the documents by their last view date by the :user in the DB
+        (never viewed documents come as the oldest ones), so that only the
+        requested page gets loaded. Ties keep the most recent documents first.
+        It's a subquery rather than a Max annotation, which can't be limited
+        to the views of the :user without dropping the never viewed documents.
+        """
+        view_date = 'SELECT MAX(date) FROM %s WHERE document_id = %s.id AND user_id = %%s' % (
+            UserLastViewDate._meta.db_table, Document._meta.db_table
         )
 
-        return sorted_queryset
+        queryset = queryset.extra(
+            select=OrderedDict([('last_view_date', view_date),
+                                ('viewed', '(%s) IS NOT NULL' % view_date)]),
+            select_params=[user.pk, user.pk]
+        )
+
+        order = '-' if reversed else ''
+        return queryset.extra(order_by=[order + 'viewed', order + 'last_view_date', '-created'])
 
     def get_object_count(self):
         """
@@ -641,7 +646,7 @@ class DocumentUploadComputeView(ComputeView):
         temp_filename = os.path.join(settings.MEDIA_ROOT, temp_path)
         return temp_filename
 
-    def process_document(self, title, filename, content, source, time_zone=None):
+    def process_document(self, title, filename, content, source, time_zone=None, previous_version=None):
         if not content or not filename or not title:
             return None
 
@@ -654,7 +659,8 @@ class DocumentUploadComputeView(ComputeView):
                                                 original_filename=filename,
                                                 title=title,
                                                 batch=batch,
-                                                time_zone=time_zone)
+                                                time_zone=time_zone,
+                                                previous_version=previous_version)
 
     def compute(self, request, *args, **kwargs):
         if not self.allow():
@@ -676,6 +682,15 @@ class DocumentUploadComputeView(ComputeView):
             ),
             predicate=lambda item: item)
 
+        # The upload might be a new version of one of the user's documents (the
+        # analysis of the sentences that haven't changed is reused then)
+        previous_version = None
+        if request.GET.get('previous_version'):
+            previous_version = Document.objects.filter(uuid=request.GET.get('previous_version'),
+                                                       owner=self.user).first()
+            if previous_version is None:
+                raise self.BadRequestException("The previous version of the document was not found")
+
         ###############################################################################################
         #
         #  Uploading files
@@ -685,7 +700,8 @@ class DocumentUploadComputeView(ComputeView):
             for filename in request.FILES:
                 title, filename, content = self.handle_attached_file(filename, request.FILES[filename])
                 user_time_zone = request.session.get('user_time_zone')
-                document = self.process_document(title, filename, content, upload_source, user_time_zone)
+                document = self.process_document(title, filename, content, upload_source, user_time_zone,
+                                                 previous_version)
 
         ###############################################################################################
         #
@@ -711,7 +727,8 @@ class DocumentUploadComputeView(ComputeView):
                 title, filename, content = self.handle_url(source_url=url, title=title)
             user_time_zone = request.session.get('user_time_zone')
 
-            document = self.process_document(title, filename, content, upload_source, user_time_zone)
+            document = self.process_document(title, filename, content, upload_source, user_time_zone,
+                                             previous_version)
 
         if not document:
             logging.warning('Could not process any documents for user=%s' % self.user)
@@ -3,6 +3,7 @@
 import json
 import mock
 import tempfile
+from datetime import timedelta
 from core.models import (
     CollaborationInvite, Document, ExternalInvite, UserLastViewDate
 )
@@ -13,7 +14,7 @@ from beagle_realtime.notifications import NotificationManager
 from django.core.urlresolvers import reverse
 from django.conf import settings
 from django.test.utils import override_settings
-from django.utils.timezone import get_current_timezone
+from django.utils.timezone import get_current_timezone, now
 
 
 class DocumentListTest(BeagleWebTest):
@@ -516,6 +517,50 @@ class DocumentSortedListViewTest(BeagleWebTest):
              'Most recent document']
         )
 
+    def test_get_pages(self):
+        unviewed_old = self.create_document('Old unviewed document', self.user, pending=False)
+        viewed_first = self.create_document('Viewed first', self.user, pending=False)
+        viewed_last = self.create_document('Viewed last', self.user, pending=False)
+        unviewed_new = self.create_document('New unviewed document', self.user, pending=False)
+
+        UserLastViewDate.objects.all().delete()
+        UserLastViewDate.create_or_update(viewed_first, self.user, now() - timedelta(days=3))
+        UserLastViewDate.create_or_update(self.document2, self.user, now() - timedelta(days=2))
+        UserLastViewDate.create_or_update(self.document1, self.user, now() - timedelta(days=1))
+        UserLastViewDate.create_or_update(viewed_last, self.user, now())
+
+        # The views of the other users don't count
+        user2 = self.create_user2()
+        UserLastViewDate.create_or_update(unviewed_old, user2, now())
+        UserLastViewDate.create_or_update(viewed_first, user2, now())
+
+        def get_pages(order=None):
+            pages = []
+            for page in range(4):
+                url = reverse('document_sorted_list_view') + '?rpp=2&page=%s' % page
+                if order:
+                    url += '&order=' + order
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                data = json.loads(response.content)
+                self.assertEqual(data['meta']['pagination']['object_count'], 7)
+                pages.append([obj['title'] for obj in data['objects']])
+            return pages
+
+        # The never viewed documents come last, the most recently created first
+        self.assertEqual(get_pages(), [
+            ['Viewed last', 'Most recent document'],
+            ['Document viewed some time ago', 'Viewed first'],
+            ['New unviewed document', 'Old unviewed document'],
+            ['Unviewed document'],
+        ])
+        self.assertEqual(get_pages('dsc'), [
+            ['New unviewed document', 'Old unviewed document'],
+            ['Unviewed document', 'Viewed first'],
+            ['Document viewed some time ago', 'Most recent document'],
+            ['Viewed last'],
+        ])
+
 
 class DocumentViewedByTest(BeagleWebTest):
 
@@ -1608,6 +1653,30 @@ class DocumentUploadComputeViewTestCase(BeagleWebTest):
 
                 mock_conversion.assert_called_once_with(mock.ANY, 'media/RETURN_VALUE_FILE_PATH', True)
 
+    def test_upload_previous_version(self):
+        self.make_paid(self.user)
+        self.login()
+        previous = self.create_document('Supply Agreement', self.user, pending=False)
+        data = {'text': 'This is an awesome text. It is pretty much about anything. Running out of inspiration here.'
+                        'What more is it to say? How can I lengthen this even more? Good question! Marvelous question.'
+                        'In fact, I need this to be just over 100 chars. Can we make this happen people?'}
+
+        with mock.patch('core.tasks.process_document_conversion.delay'):
+            with mock.patch('api_v1.document.endpoints.default_storage.save') as mock_save:
+                mock_save.return_value = 'RETURN_VALUE_FILE_PATH'
+                response = self.client.post(self.API_URL + '?previous_version=' + previous.uuid,
+                                            data=json.dumps(data), content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                document = Document.objects.get(uuid=json.loads(response.content)['uuid'])
+                self.assertEqual(document.previous_version, previous)
+
+                # Only one of the user's own documents
+                other = self.create_document('Other', self.create_user('other@mail.com', 'other', 'p@ss'),
+                                             pending=False)
+                response = self.client.post(self.API_URL + '?previous_version=' + other.uuid,
+                                            data=json.dumps(data), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
     def test_url_containing_unicode(self):
         self.make_paid(self.user)
         self.login()
@@ -118,7 +118,6 @@ class SentenceAcceptActionView(SentenceMixin, ActionView):
 
         new_sentence = self.instance.accept(self.user)
         self.document.update_sentence(self.instance, new_sentence)
-        self.document.save()
         self.send_notification(self.get_sentence_index(request, *args, **kwargs),
                                new_sentence)
 
@@ -144,7 +143,6 @@ class SentenceRejectActionView(SentenceMixin, ActionView):
 
         new_sentence = self.instance.reject(self.user)
         self.document.update_sentence(self.instance, new_sentence)
-        self.document.save()
         self.send_notification(self.get_sentence_index(request, *args, **kwargs),
                                new_sentence)
 
@@ -165,7 +163,6 @@ class SentenceUndoActionView(SentenceMixin, ActionView):
     def action(self, request, *args, **kwargs):
         new_sentence = self.instance.undo(self.user)
         self.document.update_sentence(self.instance, new_sentence)
-        self.document.save()
         self.send_notification(self.get_sentence_index(request, *args, **kwargs),
                                new_sentence)
 
@@ -190,8 +187,7 @@ class SentenceLikeActionView(SentenceMixin, ActionView):
             raise self.UnauthorizedException("You are not allowed to like with your subscription")
 
         self.instance.like(self.user)
-        self.document.invalidate_cache()
-        self.document.save()
+        self.document.update_cached_sentence(self.instance)
 
         # Also send socket notification for everybody else to receive changes
         self.send_notification(self.get_sentence_index(request, *args, **kwargs),
@@ -242,8 +238,7 @@ class SentenceDislikeActionView(SentenceMixin, ActionView):
             raise self.UnauthorizedException("You are not allowed to dislike with your subscription")
 
         self.instance.dislike(self.user)
-        self.document.invalidate_cache()
-        self.document.save()
+        self.document.update_cached_sentence(self.instance)
 
         # Also send socket notif for everybody else to receive changes
         self.send_notification(self.get_sentence_index(request, *args, **kwargs),
@@ -798,18 +793,7 @@ class SentenceHistoryListView(ListView, SentenceMixin):
 
         steps = self.get_steps(request, *args, **kwargs)
 
-        version = self.sentence
-        history = []
-        for i in range(abs(steps)):
-            if not version:
-                break
-            else:
-                history.append(version)
-            if steps > 0:
-                version = version.next_revision
-            else:
-                version = version.prev_revision
-        return history
+        return self.sentence.get_history(steps)
 
 
 class SentenceCommentsListView(ListView, SentenceMixin):
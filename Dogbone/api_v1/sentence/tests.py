@@ -1504,6 +1504,40 @@ class SentenceModifyAcceptRejectTest(BeagleWebTest):
         self.assertTrue(data['accepted'])
         self.assertEqual(data['form'], "Je suis francais.")
 
+    def test_document_saves_new_revisions(self):
+        """ Checks that the stored document points to the revisions made by accept/reject/undo """
+        self.make_paid(self.user)
+        self.login()
+        the_sentences = ["Je suis francais.", "J'aime baguettes."]
+        document = self.create_analysed_document("About the french", the_sentences, self.user)
+        idx = 0
+
+        def current_sentence():
+            pks = Document.objects.get(pk=document.pk).sentences_pks
+            self.assertEqual(len(pks), len(the_sentences))
+            return Sentence.objects.get(pk=pks[idx])
+
+        url = self.url_detail(document, idx)
+        self.client.put(url, json.dumps({'text': "Je ne parle pas francais."}))
+        edited = current_sentence()
+        self.assertEqual(edited.text, "Je ne parle pas francais.")
+        self.assertFalse(edited.accepted)
+
+        self.client.post(self.url_accept(document, idx))
+        accepted = current_sentence()
+        self.assertNotEqual(accepted.pk, edited.pk)
+        self.assertTrue(accepted.accepted)
+
+        self.client.post(reverse('sentence_undo_view', kwargs={'uuid': document.uuid, 's_idx': idx}))
+        undone = current_sentence()
+        self.assertNotEqual(undone.pk, accepted.pk)
+        self.assertFalse(undone.accepted)
+
+        self.client.post(self.url_reject(document, idx))
+        rejected = current_sentence()
+        self.assertNotEqual(rejected.pk, undone.pk)
+        self.assertEqual(rejected.prev_revision_id, undone.pk)
+
 
 class SentenceLockDetailViewTest(MultiUserBeagleWebTest):
 
@@ -120,6 +120,7 @@ class SentenceBeagleBotCommentTest(BeagleWebTest):
 
     def test_ask_beagle(self):
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as _:
             with mock.patch('beagle_bot.tasks.BeagleBot.ask') as mock_ask:
@@ -221,6 +222,7 @@ class SentenceBeagleBotCommentTest(BeagleWebTest):
         document_upload_count = self.user.details.document_upload_count
 
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock):
             with mock.patch('beagle_bot.tasks.ask_beagle.delay') as mock_ask_beagle:
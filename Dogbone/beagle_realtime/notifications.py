@@ -10,9 +10,19 @@ class NotificationManager:
 
     redis_manager = RedisConnection(settings.REDIS_URL)
 
+    # Keeps the session channels of each user (and of all the superusers) in
+    # Redis sets, so that the recipients don't have to be looked up in the DB
+    channels_index = RedisConnection(settings.REDIS_URL)
+
     USER_SESSION_NAMESPACE = "user-notifications.%(session_key)s"
     GLOBAL_NAMESPACE = 'global'
 
+    USER_CHANNELS_INDEX = "user-channels.%(user_pk)s"
+    ADMIN_CHANNELS_INDEX = "admin-channels"
+    # Set once the index has been built from all the sessions (by the
+    # index_session_channels command), until then it can't be relied on
+    CHANNELS_INDEX_BUILT = "user-channels-indexed"
+
     class ServerNotifications:
         # Sent to the user notifying that their document started processing
         DOCUMENT_PROCESSING_STARTED_NOTIFICATION = 'DOCUMENT_PROCESSING_STARTED'
@@ -36,6 +46,9 @@ class NotificationManager:
         # Process of keywords finding has been started
         DOCUMENT_KEYWORDS_SEARCH_STARTED = 'DOCUMENT_KEYWORDS_SEARCH_STARTED'
 
+        # One of the analysis stages above (sent along with its name) has been completed
+        DOCUMENT_ANALYSIS_STAGE_COMPLETED = 'DOCUMENT_ANALYSIS_STAGE_COMPLETED'
+
         # Sent to the user notifying that their document is completed
         DOCUMENT_COMPLETED_NOTIFICATION = 'DOCUMENT_COMPLETED'
 
@@ -138,6 +151,129 @@ class NotificationManager:
         """
         return cls.USER_SESSION_NAMESPACE % {'session_key': session_key}
 
+    @classmethod
+    def get_user_channels_index(cls, user_pk):
+        """
+        The naming convention of the Redis sets of user session channels
+        :param user_pk: User pk
+        :return:
+        """
+        return cls.USER_CHANNELS_INDEX % {'user_pk': user_pk}
+
+    @classmethod
+    def index_session(cls, user, session_key):
+        """
+        Adds the channel of a new session of the :user to the index
+        (and to the superusers' one if it's the case)
+        """
+        conn = cls.channels_index.get_connection()
+        if conn is None:
+            return
+
+        channel = cls.get_session_channel(session_key)
+        pipe = conn.pipeline(transaction=False)
+        pipe.sadd(cls.get_user_channels_index(user.pk), channel)
+        if user.is_superuser:
+            pipe.sadd(cls.ADMIN_CHANNELS_INDEX, channel)
+
+        try:
+            pipe.execute()
+        except Exception as e:
+            logging.error('Could not index session channel. Encountered=%s', str(e))
+
+    @classmethod
+    def unindex_session(cls, user_pk, session_key):
+        """ Removes the channel of a session that's gone from the index """
+        conn = cls.channels_index.get_connection()
+        if conn is None:
+            return
+
+        channel = cls.get_session_channel(session_key)
+        pipe = conn.pipeline(transaction=False)
+        pipe.srem(cls.get_user_channels_index(user_pk), channel)
+        pipe.srem(cls.ADMIN_CHANNELS_INDEX, channel)
+
+        try:
+            pipe.execute()
+        except Exception as e:
+            logging.error('Could not unindex session channel. Encountered=%s', str(e))
+
+    @classmethod
+    def reindex_superuser(cls, user):
+        """
+        Adds the session channels of the :user to the superusers' index, or
+        removes them from it, depending on whether the :user is a superuser
+        """
+        conn = cls.channels_index.get_connection()
+        if conn is None:
+            return
+
+        try:
+            channels = conn.smembers(cls.get_user_channels_index(user.pk))
+            if channels:
+                if user.is_superuser:
+                    conn.sadd(cls.ADMIN_CHANNELS_INDEX, *channels)
+                else:
+                    conn.srem(cls.ADMIN_CHANNELS_INDEX, *channels)
+        except Exception as e:
+            logging.error('Could not reindex superuser session channels. Encountered=%s', str(e))
+
+    @classmethod
+    def get_users_channels(cls, users, include_superusers=False, except_users=None, except_sessions=None):
+        """
+        Get the session channels of the :users (and of all the superusers)
+        from the index in a single round trip to Redis.
+        Falls back to looking the sessions up in the DB if Redis is not available
+        or the index hasn't been built yet.
+
+        :param users: The users to send notifications to
+        :param include_superusers: Whether to send them to all the superusers as well
+        :param except_users: Users to be left out (superusers included)
+        :param except_sessions: Session keys to be left out
+        :return: set of channels
+        """
+
+        except_users = set(except_users or [])
+        except_channels = set(cls.get_session_channel(session_key)
+                              for session_key in except_sessions or [])
+        users = set(users) - except_users
+
+        conn = cls.channels_index.get_connection()
+        if conn is not None:
+            keys = [cls.get_user_channels_index(user.pk) for user in users]
+            if include_superusers:
+                keys.append(cls.ADMIN_CHANNELS_INDEX)
+            except_keys = [cls.get_user_channels_index(user.pk) for user in except_users]
+
+            if not keys:
+                return set()
+
+            pipe = conn.pipeline(transaction=False)
+            pipe.exists(cls.CHANNELS_INDEX_BUILT)
+            pipe.sunion(keys)
+            if except_keys:
+                pipe.sunion(except_keys)
+
+            try:
+                results = pipe.execute()
+            except Exception as e:
+                logging.error('Could not read session channels index. Encountered=%s', str(e))
+            else:
+                if results[0]:
+                    channels = results[1]
+                    if except_keys:
+                        channels -= results[2]
+                    return channels - except_channels
+
+        if include_superusers:
+            users |= set(User.objects.filter(is_superuser=True)) - except_users
+
+        channels = set()
+        for user in users:
+            for session in user.session_set.all():
+                channels.add(cls.get_session_channel(session.session_key))
+        return channels - except_channels
+
     @classmethod
     def create_message(cls, channels=None, event_name=None, message=None):
         if channels is None:
@@ -157,7 +293,7 @@ class NotificationManager:
         :param message: The actual payload
         :return:
         """
-        channels = [cls.get_session_channel(session.session_key) for session in user.session_set.all()]
+        channels = cls.get_users_channels([user])
         return cls.create_message(channels=channels, event_name=event_name, message=message)
 
     @classmethod
@@ -173,16 +309,8 @@ class NotificationManager:
         :return:
         """
 
-        if not except_sessions:
-            except_sessions = []
-        except_sessions = set(except_sessions)
-
-        user = batch.owner
-        channels = []
-        for session in user.session_set.all():
-            if session.session_key not in except_sessions:
-                channels.append(cls.get_session_channel(session.session_key))
-        return cls.create_message(channels=set(channels), event_name=event_name, message=message)
+        channels = cls.get_users_channels([batch.owner], except_sessions=except_sessions)
+        return cls.create_message(channels=channels, event_name=event_name, message=message)
 
     @classmethod
     def create_document_message(cls, document, event_name=None, message=None, except_users=None, except_sessions=None):
@@ -197,23 +325,11 @@ class NotificationManager:
         :return:
         """
 
-        if not except_users:
-            except_users = []
-        except_users = set(except_users)
-
-        if not except_sessions:
-            except_sessions = []
-        except_sessions = set(except_sessions)
-
-        # TODO (Bogdan): Optimize this to prefetch the sessions for users
-        users = set(list(document.collaborators) + [document.owner] +
-                    list(User.objects.filter(is_superuser=True))) - except_users
-        channels = []
-        for user in users:
-            for session in user.session_set.all():
-                if session.session_key not in except_sessions:
-                    channels.append(cls.get_session_channel(session.session_key))
-        return cls.create_message(channels=set(channels), event_name=event_name, message=message)
+        users = list(document.collaborators) + [document.owner]
+        channels = cls.get_users_channels(users, include_superusers=True,
+                                          except_users=except_users,
+                                          except_sessions=except_sessions)
+        return cls.create_message(channels=channels, event_name=event_name, message=message)
 
     @classmethod
     def create_collaborators_message(cls, user, event_name=None, message=None, except_users=None, except_sessions=None):
@@ -226,23 +342,11 @@ class NotificationManager:
         :return:
         """
         from core.tools import user_collaborators
-        if not except_users:
-            except_users = []
-
-        except_users = set(except_users)
-
-        if not except_sessions:
-            except_sessions = []
 
-        except_sessions = set(except_sessions)
-
-        users = user_collaborators(user) - except_users
-        channels = []
-        for user in users:
-            for session in user.session_set.all():
-                if session.session_key not in except_sessions:
-                    channels.append(cls.get_session_channel(session.session_key))
-        return cls.create_message(channels=set(channels), event_name=event_name, message=message)
+        channels = cls.get_users_channels(user_collaborators(user),
+                                          except_users=except_users,
+                                          except_sessions=except_sessions)
+        return cls.create_message(channels=channels, event_name=event_name, message=message)
 
     @classmethod
     def send(cls, msg):
@@ -258,11 +362,15 @@ class NotificationManager:
             logging.error('Connection is None in NotificationManager')
             return False
 
-        for channel in msg.channels:
-            try:
-               conn.publish(channel, json.dumps(payload))
-            except Exception as e:
-                logging.error('Could not publish message. Encountered=%s', str(e))
+        try:
+            # Serialize once and publish to all the channels in a single round trip
+            payload = json.dumps(payload)
+            pipe = conn.pipeline(transaction=False)
+            for channel in msg.channels:
+                pipe.publish(channel, payload)
+            pipe.execute()
+        except Exception as e:
+            logging.error('Could not publish message. Encountered=%s', str(e))
 
         return True
 
@@ -22,17 +22,37 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as mock_connection:
 
             result = message.send()
+            return_mock.pipeline.assert_called_once_with(transaction=False)
             return_mock.publish.assert_called_once_with('my_channel', mock.ANY)
+            return_mock.execute.assert_called_once_with()
             payload = return_mock.publish.call_args[0][1]
             self.assertEqual(json.loads(payload), {'created': mock.ANY,
                                                    'message': {'content': 'A sooooper message'},
                                                    'event_name': 'my_message_type'})
             self.assertTrue(result)
 
+    def test_send_unserializable(self):
+        message = NotificationManager.create_message()
+        message.set_channels(['my_channel'])
+        message.set_event_name('my_message_type')
+        message.set_message({'content': object()})
+        return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
+        with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
+                        return_value=return_mock), \
+                mock.patch('beagle_realtime.notifications.logging.error') as mock_log_error:
+
+            # The error is logged, but doesn't fail the caller
+            message.send()
+            self.assertFalse(return_mock.publish.called)
+            self.assertFalse(return_mock.execute.called)
+            self.assertTrue(mock_log_error.called)
+
     def test_user_send_no_session(self):
         user = User(username='un', email='email@mail.com')
         user.set_password('12341234')
@@ -43,6 +63,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as mock_connection:
 
@@ -66,6 +87,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as mock_connection:
 
@@ -111,6 +133,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         sessions = [s.session_key for s in Session.objects.all()]
         self.assertEqual(len(sessions), 3)
 
@@ -122,6 +145,8 @@ class NotificationManagerTestCase(BeagleWebTest):
             result = message.send()
 
             self.assertEqual(return_mock.publish.call_count, 3)
+            # All in a single round trip
+            return_mock.execute.assert_called_once_with()
 
             for idx, call in enumerate(return_mock.publish.call_args_list):
                 chunks = call[0][0].split('.')
@@ -171,6 +196,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         sessions = [s.session_key for s in Session.objects.all()]
         self.assertEqual(len(sessions), 3)
 
@@ -232,6 +258,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         sessions = [s.session_key for s in Session.objects.all()]
         self.assertEqual(len(sessions), 3)
 
@@ -286,6 +313,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as mock_connection:
 
@@ -305,6 +333,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as mock_connection:
 
@@ -324,6 +353,7 @@ class NotificationManagerTestCase(BeagleWebTest):
         message.set_event_name('my_message_type')
         message.set_message({'content': 'A sooooper message'})
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as mock_connection:
 
@@ -334,3 +364,97 @@ class NotificationManagerTestCase(BeagleWebTest):
                                                    'message': {'content': 'A sooooper message'},
                                                    'event_name': 'my_message_type'})
             self.assertTrue(result)
+
+    def test_document_channels_index(self):
+        user1 = User(username='user1', email='email1@mail.com')
+        user1.set_password('12341234')
+        user1.save()
+
+        user2 = User(username='user2', email='email2@mail.com')
+        user2.set_password('12341234')
+        user2.save()
+
+        document = self.create_document('Title', user1, pending=False)
+        CollaborationInvite(document=document, inviter=user1, invitee=user2).save()
+
+        index_mock = mock.Mock()
+        pipe_mock = index_mock.pipeline.return_value
+        pipe_mock.execute.return_value = [
+            True,
+            set(['user-notifications.s1', 'user-notifications.s2',
+                 'user-notifications.s3', 'user-notifications.s4']),
+            set(['user-notifications.s2'])
+        ]
+        with mock.patch('beagle_realtime.notifications.NotificationManager.channels_index.get_connection',
+                        return_value=index_mock):
+            message = NotificationManager.create_document_message(document,
+                                                                  except_users=[user2],
+                                                                  except_sessions=['s3'])
+
+        # The superusers come from their own index instead of the DB
+        self.assertEqual(set(pipe_mock.sunion.call_args_list[0][0][0]),
+                         set(['user-channels.%s' % user1.pk, 'admin-channels']))
+        pipe_mock.sunion.assert_any_call(['user-channels.%s' % user2.pk])
+        pipe_mock.exists.assert_called_once_with('user-channels-indexed')
+        pipe_mock.execute.assert_called_once_with()
+        self.assertEqual(message.channels, set(['user-notifications.s1', 'user-notifications.s4']))
+
+    def test_channels_index_not_built(self):
+        user = User(username='un', email='email@mail.com')
+        user.set_password('12341234')
+        user.save()
+
+        self.client.login(username='un', password='12341234')
+        session = user.session_set.all()[0]
+
+        index_mock = mock.Mock()
+        pipe_mock = index_mock.pipeline.return_value
+        pipe_mock.execute.return_value = [False, set()]
+        with mock.patch('beagle_realtime.notifications.NotificationManager.channels_index.get_connection',
+                        return_value=index_mock):
+            message = NotificationManager.create_user_message(user)
+
+        # The sessions are looked up in the DB instead
+        self.assertEqual(message.channels, set(['user-notifications.%s' % session.session_key]))
+
+    def test_session_channels_indexed(self):
+        user = User(username='un', email='email@mail.com', is_superuser=True)
+        user.set_password('12341234')
+        user.save()
+
+        index_mock = mock.Mock()
+        pipe_mock = index_mock.pipeline.return_value
+        with mock.patch('beagle_realtime.notifications.NotificationManager.channels_index.get_connection',
+                        return_value=index_mock):
+            self.client.login(username='un', password='12341234')
+            channel = 'user-notifications.%s' % user.session_set.all()[0].session_key
+
+            pipe_mock.sadd.assert_any_call('user-channels.%s' % user.pk, channel)
+            pipe_mock.sadd.assert_any_call('admin-channels', channel)
+
+            self.client.logout()
+
+            pipe_mock.srem.assert_any_call('user-channels.%s' % user.pk, channel)
+            pipe_mock.srem.assert_any_call('admin-channels', channel)
+
+    def test_superuser_channels_reindexed(self):
+        user = User(username='un', email='email@mail.com')
+        user.set_password('12341234')
+        user.save()
+
+        index_mock = mock.Mock()
+        index_mock.smembers.return_value = set(['user-notifications.s1'])
+        with mock.patch('beagle_realtime.notifications.NotificationManager.channels_index.get_connection',
+                        return_value=index_mock):
+            # Unrelated changes don't touch the index
+            user.save(update_fields=['email'])
+            self.assertFalse(index_mock.smembers.called)
+
+            user.is_superuser = True
+            user.save()
+            index_mock.smembers.assert_called_with('user-channels.%s' % user.pk)
+            index_mock.sadd.assert_called_once_with('admin-channels', 'user-notifications.s1')
+
+            user.is_superuser = False
+            user.save()
+            index_mock.srem.assert_called_once_with('admin-channels', 'user-notifications.s1')
@@ -0,0 +1,81 @@
+import logging
+
+from collections import namedtuple
+
+from ml.facade import LearnerFacade
+from ml.capsules import Capsule
+from core.models import SentenceAnnotations
+from keywords.models import SearchKeyword
+from keywords.matcher import get_keyword_matcher
+
+
+# What an analysis stage returns: a list of (sentence_idx, label, add_tag_kwargs)
+# tuples and the stage specific state to be saved on the document (if any)
+AnalysisStageResult = namedtuple('AnalysisStageResult', ['tags', 'state'])
+
+
+def apply_learners(owner, sentences, parties, previous_version=None, unchanged=None):
+    """
+    If the :previous_version was analysed by the same learners, the
+    suggestions for the :unchanged sentences are copied from it.
+    """
+    tags = []
+    learners_state = []
+    already_added_learners = set()
+
+    learners = list(LearnerFacade.get_all(owner, active_only=True, mature_only=True))
+    for ol in learners:
+        # Add necessary info about learners to the state (the model version
+        # changes whenever the model is trained, positively or negatively)
+        if ol.db_model.tag not in already_added_learners:
+            learners_state.append((ol.db_model.tag, ol.db_model.pretrained, ol.db_model.positive_set_size,
+                                   ol.db_model.model_version))
+            already_added_learners.add(ol.db_model.tag)
+
+    if not unchanged or previous_version.learners_state != map(list, learners_state):
+        unchanged = {}
+    analysed_idxs = [i for i in range(len(sentences)) if i not in unchanged]
+
+    # :capsules list should be treated as immutable
+    capsules = [Capsule(sentences[i].text, i, parties=parties) for i in analysed_idxs]
+
+    # Vectorize the capsules only once for all the learners
+    logging.info('Applying %s Learners to %s sentences' % (len(learners), len(capsules)))
+    if capsules and learners:
+        all_preds = LearnerFacade.predict_many(learners, capsules)
+    else:
+        all_preds = [[]] * len(learners)
+
+    for ol, preds in zip(learners, all_preds):
+        for i, p in zip(analysed_idxs, preds):
+            if p:
+                tags.append((i, ol.db_model.tag,
+                             {'annotation_type': SentenceAnnotations.SUGGESTED_TAG_TYPE,
+                              'classifier_id': ol.db_model.pk}))
+
+    classifier_ids = set(ol.db_model.pk for ol in learners)
+    for i, previous in sorted(unchanged.items()):
+        for ann in (previous.annotations or {}).get('annotations', []):
+            if ann['type'] == SentenceAnnotations.SUGGESTED_TAG_TYPE and \
+                    ann.get('classifier_id') in classifier_ids:
+                tags.append((i, ann['label'],
+                             {'annotation_type': SentenceAnnotations.SUGGESTED_TAG_TYPE,
+                              'classifier_id': ann['classifier_id']}))
+
+    return AnalysisStageResult(tags=tags, state=learners_state)
+
+
+def apply_keywords(owner, sentences):
+    tags = []
+
+    active_keywords = SearchKeyword.activated.filter(owner=owner)
+    keywords_state = [(kw.keyword, kw.exact_match) for kw in active_keywords]
+
+    # Scan each sentence only once for all the keywords
+    matcher = get_keyword_matcher(active_keywords)
+    for i, sentence in enumerate(sentences):
+        for keyword in matcher.find(sentence.text):
+            tags.append((i, keyword,
+                         {'annotation_type': SentenceAnnotations.KEYWORD_TAG_TYPE}))
+
+    return AnalysisStageResult(tags=tags, state=keywords_state)
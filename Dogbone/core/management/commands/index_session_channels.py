@@ -0,0 +1,52 @@
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from user_sessions.models import Session
+from beagle_realtime.notifications import NotificationManager
+
+
+# The new indexes are built under these keys, then renamed over the current ones
+REBUILT_INDEX_PREFIX = 'rebuilt.'
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the index of the session channels of the users (used for sending notifications)'
+
+    def handle(self, *args, **options):
+        conn = NotificationManager.channels_index.get_connection()
+        if conn is None:
+            print('Could not connect to Redis.')
+            return
+
+        # The expired sessions are gone as far as the users are concerned
+        sessions = Session.objects.filter(user__isnull=False, expire_date__gt=timezone.now()) \
+                                  .select_related('user')
+        indexes = {}
+        for session in sessions:
+            channel = NotificationManager.get_session_channel(session.session_key)
+            indexes.setdefault(NotificationManager.get_user_channels_index(session.user.pk),
+                               set()).add(channel)
+            if session.user.is_superuser:
+                indexes.setdefault(NotificationManager.ADMIN_CHANNELS_INDEX, set()).add(channel)
+
+        # The current indexes keep being used while the new ones get built
+        pipe = conn.pipeline(transaction=False)
+        for index, channels in indexes.items():
+            pipe.delete(REBUILT_INDEX_PREFIX + index)
+            pipe.sadd(REBUILT_INDEX_PREFIX + index, *channels)
+        pipe.execute()
+
+        # Don't block Redis with KEYS, iterate over the indexes instead
+        stale = set(conn.scan_iter(match=NotificationManager.get_user_channels_index('*')))
+        stale.add(NotificationManager.ADMIN_CHANNELS_INDEX)
+        stale -= set(indexes)
+
+        # Swap all of them at once
+        pipe = conn.pipeline(transaction=True)
+        for index in indexes:
+            pipe.rename(REBUILT_INDEX_PREFIX + index, index)
+        pipe.delete(*stale)
+        pipe.set(NotificationManager.CHANNELS_INDEX_BUILT, 1)
+        pipe.execute()
+        print('Indexed %d sessions.' % len(sessions))
@@ -1,6 +1,8 @@
 import time
 import re
+import json
 import uuid
+import hashlib
 import logging
 import jsonfield
 import collections
@@ -13,10 +15,11 @@ from itertools import ifilter
 from unidecode import unidecode
 from model_utils.models import TimeStampedModel
 from notifications.models import Notification
+from user_sessions.models import Session
 from picklefield import PickledObjectField
 from bulk_update.helper import bulk_update
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
@@ -24,11 +27,11 @@ from django.core.urlresolvers import reverse
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in
 from django.db.models import Q
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.contrib.contenttypes.models import ContentType
 
 from ml.clfs import AGREEMENT_TYPE_CLASSIFIER
-from nlplib import doclevel_process, sentlevel_process
+from nlplib import doclevel_process, sentlevel_process, NlplibFacade
 from nlplib.utils import (
     linebreaks_to_markers,
     LINEBREAK_MARKER,
@@ -434,6 +437,15 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
     keywords_state = jsonfield.JSONField(null=True, default=None)
     # The state of Learners at the time of doc's last analysis
     learners_state = jsonfield.JSONField(null=True, default=None)
+    # The state of the RLTE analysis (parties and flags) at the time of doc's last analysis
+    rlte_state = jsonfield.JSONField(null=True, default=None)
+    # The mentions found in the imported sentences (by content hash) at the time
+    # of doc's last RLTE analysis, except for the empty ones
+    rlte_mentions = jsonfield.JSONField(null=True, default=None)
+
+    # The document this one was uploaded as a new version of (if any)
+    previous_version = models.ForeignKey('self', default=None, null=True, blank=True,
+                                         related_name='next_versions', on_delete=models.SET_NULL)
 
     # Doc-level extracted details, after NLP analysis
     doclevel_analysis = jsonfield.JSONField(load_kwargs={'object_pairs_hook': collections.OrderedDict}, null=True)
@@ -487,7 +499,7 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
     @classmethod
     def analysis_workflow_start(cls, uploader, file_path, upload_source,
                                 original_filename, title, batch,
-                                send_notifications=True, time_zone=None):
+                                send_notifications=True, time_zone=None, previous_version=None):
         """
         :param uploader: the User model that uploads the document
         :param file_path: where the document is stored
@@ -497,6 +509,7 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
         :param batch: the Batch model that contains the document
         :param send_notifications: if during the process we issue push notifications
         :param time_zone: the time zone in which internal timestamps should be considered
+        :param previous_version: the Document model the document is a new version of
         :return:
         """
         from core.tasks import process_document_conversion
@@ -507,7 +520,8 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
                             pending=True,
                             upload_source=upload_source,
                             batch=batch,
-                            time_zone=time_zone)
+                            time_zone=time_zone,
+                            previous_version=previous_version)
 
         document.save()
 
@@ -570,8 +584,9 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
         processed['sentences'] = []
         # Gather sentence-level from each sentence
         s_models = self.get_sorted_sentences()
+        prefetched = Sentence.prefetch_to_dict(s_models)
         for idx, s_model in enumerate(s_models):
-            s_dict = s_model.to_dict()
+            s_dict = s_model.to_dict(prefetched=prefetched)
             s_dict['idx'] = idx
             # Fill in with sentence level only analysis results
             processed['sentences'].append(s_dict)
@@ -649,14 +664,24 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
                 modified_by=self.owner,
                 newlines=newlines,
                 comments=imported_comments,
+                content_hash=Sentence.compute_content_hash(s_clnspace),
+                # Pre-assigned, so that the pks can be looked up after the bulk insert
+                uuid=str(uuid.uuid4()),
             )
-            s_model.save()
 
-            sentences.append(s_model.pk)
+            sentences.append(s_model)
             if change is not None:
                 edited_sentences.append((s_model, change))
 
-        self.sents = {'sentences': sentences}
+        # Insert all the sentences at once (bulk_create doesn't set their pks)
+        Sentence.objects.bulk_create(sentences, batch_size=1000)
+        pks = dict(Sentence.objects.filter(doc=self).values_list('uuid', 'pk'))
+        for s_model in sentences:
+            s_model.pk = pks[s_model.uuid]
+
+        self.sents = {'sentences': [s_model.pk for s_model in sentences]}
+        # The edits below update the stored list of sentences, so it must be there
+        self.save(update_fields=['sents'])
 
         # Can edit appropriate sentences only after the document is fully
         # initialized with all its sentences
@@ -723,53 +748,190 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
             self.doclevel_analyse()
         return self.doclevel_analysis['parties']
 
-    def analyse(self):
+    def get_rlte_state(self, facade):
+        """
+        What the RLTE analysis of the sentences depends on, besides their text:
+        the parties, the RLTE flags and the mention clusters of the whole
+        document (as found by the :facade analysing it)
+        """
+        ps = self.get_parties_full()
+        return {'parties': [ps['them']['name'], ps['you']['name'],
+                            [ps['them']['confidence'], ps['you']['confidence']]],
+                'flags': self.owner.details.rlte_flags,
+                'mention_clusters': facade.clusters_state}
+
+    def get_previous_version(self):
+        """
+        Returns the document this one was uploaded as a new version of (e.g.
+        the previous round of a redline), or None if there isn't any or it's
+        not analysed
+        """
+        if self.previous_version_id is None:
+            return None
+
+        return Document.objects.filter(pk=self.previous_version_id,
+                                       pending=False, failed=False, trash=False) \
+            .defer('cached_analysis') \
+            .first()
+
+    def get_unchanged_sentences(self, previous_version, sentences=None):
+        """
+        Maps the indices of the sentences whose text is the same as the one
+        of a sentence imported in :previous_version to that previous sentence
+        """
+        if sentences is None:
+            sentences = self.get_sorted_sentences()
+
+        hashes = set(s.content_hash for s in sentences if s.content_hash)
+        if not hashes:
+            return {}
+
+        previous = {}
+        for s in previous_version.get_sentences_queryset().filter(content_hash__in=hashes,
+                                                                  deleted=False):
+            previous.setdefault(s.content_hash, s)
+
+        return {i: previous[s.content_hash] for i, s in enumerate(sentences)
+                if s.content_hash in previous}
+
+    def analyse(self, unchanged=None, previous_version=None):
+        """
+        :param unchanged: maps the indices of the sentences unchanged since the
+            :previous_version of the document to their previous version. If
+            that version was analysed in the same RLTE state (which includes
+            the mention clusters of the whole document), their RLTE annotations
+            and external references are copied instead of being computed again.
+            Their mentions are also taken from that version, so that they
+            don't even need to be word-tagged then
+        """
         if not self.doclevel_analysis:
             self.doclevel_analyse()
 
         processed = self.doclevel_analysis.copy()
 
-        # Gather the text of all sentences
+        # Gather the text of all sentences, they all make up the context
+        # of the analysis (e.g. the mention clusters)
         sents = self.get_sorted_sentences()
-        sents_text = [s.text for s in sents]
-
-        # Init a facade with the extracted parties
-        ps = self.doclevel_analysis['parties']
-        parties = (ps['them']['name'], ps['you']['name'],
-                   (ps['them']['confidence'], ps['you']['confidence']))
-
-        s_analysis, _ = sentlevel_process(sentences=sents_text, parties=parties, user=self.owner)
+        known_mentions = {}
+        if unchanged and previous_version is not None and previous_version.rlte_mentions is not None:
+            known_mentions = dict((i, previous_version.rlte_mentions.get(sents[i].content_hash, []))
+                                  for i in unchanged)
+        facade = NlplibFacade(sentences=[s.text for s in sents], parties=self._get_facade_parties(),
+                              known_mentions=known_mentions)
+        rlte_state = self.get_rlte_state(facade)
+
+        if not unchanged or previous_version is None or previous_version.rlte_state != rlte_state:
+            unchanged = {}
+        analysed_idxs = [i for i in range(len(sents)) if i not in unchanged]
+
+        # Only run the analyzers on the other sentences
+        facade.analysed_idxs = analysed_idxs
+        s_analysis, _ = sentlevel_process(facade=facade, user=self.owner,
+                                          processes=settings.RLTE_ANALYZERS_PROCESSES)
 
         # Add initial version for each sentence
-        for i, s in enumerate(s_analysis['sentences']):
-            # Init the annotations with the ones involving both parties
-            annotations = [a for a in s.get('annotations', []) if a['party'] == 'both']
-            # For the annotations involving a single party
-            for annotation in [a for a in s.get('annotations', []) if a['party'] != 'both']:
-                # If there isn't another identical annotation involving both parties
-                if next(ifilter(lambda item: item['label'] == annotation['label'] and
-                        item['sublabel'] == annotation['sublabel'], annotations), None) is None:
-                    # Add the single party annotation to the sentence annotations
-                    annotations.append(annotation)
+        for i in analysed_idxs:
+            self._apply_sentence_analysis(sents[i], s_analysis['sentences'][i])
 
+        # Copy the analysis of the unchanged sentences
+        for i, previous in sorted(unchanged.items()):
             s_model = sents[i]
 
-            s_model.extrefs = s.get('external_refs', None)
+            s_model.extrefs = previous.extrefs
 
-            # Add all annotations in tag form to the sentence
-            if annotations:
-                for ann in annotations:
+            for ann in (previous.annotations or {}).get('annotations', []):
+                # Only the ones tagged by the analysis, not by the users
+                if ann['type'] == SentenceAnnotations.ANNOTATION_TAG_TYPE and ann.get('user') is None:
                     s_model.add_tag(user=None,
                                     label=ann['label'],
                                     sublabel=ann['sublabel'],
                                     party=ann['party'],
                                     approved=True,
-                                    annotation_type=SentenceAnnotations.ANNOTATION_TAG_TYPE)
+                                    annotation_type=SentenceAnnotations.ANNOTATION_TAG_TYPE,
+                                    commit=False)
+
+        self.rlte_state = rlte_state
+        self.rlte_mentions = dict((s.content_hash, mentions)
+                                  for s, mentions in zip(sents, facade.sentence_mentions)
+                                  if s.content_hash and mentions)
 
+        # Save the extrefs and the annotations of all the sentences at once
         bulk_update(sents, batch_size=1000)
 
         return processed
 
+    def _get_facade_parties(self):
+        """ The parties of the document, as expected by the facade """
+        ps = self.get_parties_full()
+        return (ps['them']['name'], ps['you']['name'],
+                (ps['them']['confidence'], ps['you']['confidence']))
+
+    def _apply_sentence_analysis(self, s_model, s):
+        """
+        Sets the external references and the RLTE annotations (in tag form)
+        found by the sentence level analysis :s on the sentence :s_model
+        """
+        # Init the annotations with the ones involving both parties
+        annotations = [a for a in s.get('annotations', []) if a['party'] == 'both']
+        # For the annotations involving a single party
+        for annotation in [a for a in s.get('annotations', []) if a['party'] != 'both']:
+            # If there isn't another identical annotation involving both parties
+            if next(ifilter(lambda item: item['label'] == annotation['label'] and
+                    item['sublabel'] == annotation['sublabel'], annotations), None) is None:
+                # Add the single party annotation to the sentence annotations
+                annotations.append(annotation)
+
+        s_model.extrefs = s.get('external_refs', None)
+
+        # Add all annotations in tag form to the sentence
+        for ann in annotations:
+            s_model.add_tag(user=None,
+                            label=ann['label'],
+                            sublabel=ann['sublabel'],
+                            party=ann['party'],
+                            approved=True,
+                            annotation_type=SentenceAnnotations.ANNOTATION_TAG_TYPE,
+                            commit=False)
+
+    def analyse_sentence(self, sentence, replaced=None):
+        """
+        Analyses a single (e.g. just edited) sentence of the document, instead
+        of all of them. If the :sentence is a new revision, :replaced is the
+        one it replaces.
+        The learners and the keywords only need the sentence itself. The RLTE
+        analyzers also depend on the parties and the mention clusters of the
+        whole document, which are restored from its stored RLTE state. They
+        only fit as long as the sentence has the same mentions as the one it
+        replaces, since the clusters are resolved from the mentions, so only
+        the two sentences get tagged, whatever the length of the document.
+        Returns False if the stored RLTE state doesn't fit (the RLTE analyzers
+        are skipped then, and the whole document needs to be analysed).
+        The sentence is saved, but the document is not updated.
+        """
+        from core.analysis import apply_learners, apply_keywords
+
+        rlte_analysed = False
+        if self.rlte_state and self.rlte_state.get('mention_clusters') is not None:
+            # The replaced text is only there for comparing the mentions
+            old_text = replaced.text if replaced is not None else sentence.text
+            facade = NlplibFacade(sentences=[old_text, sentence.text],
+                                  parties=self._get_facade_parties(),
+                                  analysed_idxs=[1],
+                                  clusters_state=self.rlte_state['mention_clusters'])
+            if self.get_rlte_state(facade) == self.rlte_state and \
+                    facade.mention_indicators(0) == facade.mention_indicators(1):
+                s_analysis, _ = sentlevel_process(facade=facade, user=self.owner)
+                self._apply_sentence_analysis(sentence, s_analysis['sentences'][1])
+                rlte_analysed = True
+
+        for stage in (apply_learners(self.owner, [sentence], self.get_parties()),
+                      apply_keywords(self.owner, [sentence])):
+            for _, label, tag_kwargs in stage.tags:
+                sentence.add_tag(self.owner, label, commit=False, **tag_kwargs)
+
+        sentence.save()
+        return rlte_analysed
+
     def invalidate_analysis(self):
         """
         Turns the `dirty` flag on, so that next time the analysis is requested,
@@ -788,19 +950,85 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
         self.cached_analysis = None
         self.save()
 
+    def update_cached_sentence(self, sentence, replaced=None, invalidate=False,
+                               reset_rlte_state=False):
+        """
+        Only one sentence has changed, so patch its entry in the cache instead
+        of invalidating the whole of it (unless :invalidate is set).
+        If the :sentence is a new revision, :replaced is the one it replaces,
+        and the document is made to point to the :sentence instead (and its
+        RLTE state is dropped if :reset_rlte_state is set). A ValueError is
+        raised if the document points to neither of them.
+        The document is locked meanwhile, so that the concurrent updates of
+        other sentences don't get lost. Only the sentences, the cache and the
+        RLTE state are saved, the other fields of the document are left
+        untouched.
+        """
+        with transaction.atomic():
+            current = Document.objects.select_for_update() \
+                                      .only('cached_analysis', 'sents', 'dirty') \
+                                      .get(pk=self.pk)
+            updates = {}
+
+            pks = current.sentences_pks
+            # The document might already point to the new revision
+            if replaced is not None and replaced.pk in pks:
+                idx = pks.index(replaced.pk)
+                for i, spk in enumerate(pks):
+                    if spk == replaced.pk:
+                        pks[i] = sentence.pk
+                updates['sents'] = current.sents
+                if reset_rlte_state:
+                    updates['rlte_state'] = None
+            elif sentence.pk in pks:
+                idx = pks.index(sentence.pk)
+            elif replaced is not None:
+                raise ValueError('Sentence %s is not in document %s' % (replaced.pk, self.pk))
+            else:
+                idx = None
+
+            cached = current.cached_analysis
+            if invalidate:
+                cached = None
+                updates['cached_analysis'] = cached
+            elif cached and not current.dirty:
+                # Unless the cache doesn't match the sentences anyway
+                if idx is not None and idx < len(cached['sentences']):
+                    s_dict = sentence.to_dict()
+                    s_dict['idx'] = idx
+                    cached['sentences'][idx] = s_dict
+                else:
+                    cached = None
+                updates['cached_analysis'] = cached
+
+            if updates:
+                Document.objects.filter(pk=self.pk).update(**updates)
+
+        if 'sents' in updates:
+            self.sents = current.sents
+        self.cached_analysis = cached
+        if 'rlte_state' in updates:
+            self.rlte_state = None
+
     def update_sentence(self, old_sent, new_sent, reanalyze=False):
         """
         Replaces a sentence with a new version. Both `old_sent` and `new_sent`
         are Sentence objects.
-        If `reanalyze` is set to True, a full reanalysis is being done.
-        """
-        for idx, spk in enumerate(self.sentences_pks):
-            if spk == old_sent.pk:
-                self.sentences_pks[idx] = new_sent.pk
-        self.invalidate_cache()
-        if reanalyze:
+        If `reanalyze` is set to True, the new version gets analysed: by itself
+        if the stored RLTE state of the document fits it (see analyse_sentence),
+        or else along with the whole document.
+        """
+        analysed = reanalyze and self.analyse_sentence(new_sent, replaced=old_sent)
+        full_reanalysis = reanalyze and not analysed
+        # Unless analysed in it, a new text might not fit the stored RLTE state
+        # anymore (e.g. if it has new mentions)
+        self.update_cached_sentence(new_sent, replaced=old_sent, invalidate=full_reanalysis,
+                                    reset_rlte_state=not analysed and old_sent.text != new_sent.text)
+        if full_reanalysis:
             self.analyse()
-        self.save()
+            self.save(update_fields=['rlte_state', 'rlte_mentions'])
+            # Only the stored copy of the sentence got the new annotations
+            new_sent = Sentence.objects.get(pk=new_sent.pk)
 
         return new_sent
 
@@ -810,10 +1038,7 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
         """
         deleted_sentence = sentence.delete(user)
         # There nothing to reanalyse since the sentence is dead
-        deleted_sentence = self.update_sentence(sentence, deleted_sentence, reanalyze=False)
-        self.save()
-
-        return deleted_sentence
+        return self.update_sentence(sentence, deleted_sentence, reanalyze=False)
 
     def has_access(self, user):
         """
@@ -1186,6 +1411,24 @@ class Document(TimeStampedModel, TrashableModel, PendingModel):
         s3_key = self.pdf_s3.split(':')[1]
         return s3_bucket.read_to_file(s3_key)
 
+    def get_export_key(self, s3_path, include_comments=False, include_track_changes=False,
+                       included_annotations=None):
+        """
+        Hashes everything an export of the document depends on: the current
+        revisions of its sentences (along with their comments and annotations
+        if they get exported), the export options and the export format
+        """
+        from richtext.exporting import EXPORT_FORMAT_VERSION
+
+        sentences = [[s.pk, s.accepted, s.deleted,
+                      s.comments if include_comments else None,
+                      s.annotations if included_annotations else None]
+                     for s in self.get_sorted_sentences()]
+        key = json.dumps([EXPORT_FORMAT_VERSION, s3_path, bool(self.docx_s3), self.time_zone,
+                          bool(include_comments), bool(include_track_changes),
+                          included_annotations, sentences], sort_keys=True)
+        return hashlib.sha1(key).hexdigest()
+
     def get_sentences_queryset(self):
         return Sentence.objects.filter(pk__in=self.sentences_pks)
 
@@ -1392,18 +1635,40 @@ class Sentence(TimeStampedModel):
 
     # History navigation
     prev_revision = models.OneToOneField('Sentence', null=True, blank=True, related_name='next_revision')
+    # Position in the chain of revisions of the sentence (all sharing the
+    # same uuid), starting from 0 for the first revision
+    revision = models.IntegerField('Revision number', default=0)
+
+    # Hash of the text the sentence was imported with (used for matching
+    # the unchanged sentences across the versions of a document)
+    content_hash = models.CharField('Content hash', max_length=40, null=True, blank=True,
+                                    default=None, db_index=True)
+
+    class Meta:
+        index_together = [['uuid', 'revision']]
+
+    @staticmethod
+    def compute_content_hash(text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return hashlib.sha1(text).hexdigest()
 
     def get_report_url(self, sentence_index):
         return sentence_url(self, sentence_index)
 
     @classmethod
-    def expand_comment_dict(cls, comment, sentence, document):
+    def expand_comment_dict(cls, comment, sentence, document, authors=None):
+        """
+        :param authors: dict of prefetched user dicts by username (see `prefetch_to_dict`)
+        """
         # There is a weird mutation bug with the comments: when the loop runs
         # again it replaces the author with the result of user_to_dict
         _comment = deepcopy(comment)
         try:
             if comment['author'] == '@beagle':
                 _comment['author'] = {'username': '@beagle'}
+            elif authors is not None:
+                _comment['author'] = authors[comment['author']]
             else:
                 _comment['author'] = user_to_dict(User.objects.get(username=comment['author']))
             return _comment
@@ -1415,16 +1680,70 @@ class Sentence(TimeStampedModel):
         all_revisions = Sentence.objects.filter(uuid=self.uuid)
         accepted_revs = all_revisions.filter(accepted=True)
         try:
-            latest = accepted_revs.order_by('-id')[0]
+            latest = accepted_revs.order_by('-revision')[0]
         except IndexError:  # this should not occur in normal circumstances
             latest = None
         return latest
 
+    @classmethod
+    def get_latest_approved_revisions(cls, sentences):
+        """
+        Same as `latest_approved_revision`, but for many sentences at once.
+        Returns a dict mapping the uuids of the :sentences to their latest
+        approved revisions.
+        """
+        uuids = set(s.uuid for s in sentences)
+        if not uuids:
+            return {}
+
+        latest = {}
+        for revision in cls.objects.filter(uuid__in=uuids, accepted=True).order_by('revision'):
+            latest[revision.uuid] = revision
+        return latest
+
+    @classmethod
+    def prefetch_to_dict(cls, sentences):
+        """
+        Gathers everything `to_dict` would look up for each of the :sentences
+        (their latest approved revisions, the users who modified, liked or
+        commented on them, their documents) in a constant number of queries.
+        Returns the `prefetched` argument of `to_dict`.
+        """
+        approved_revisions = cls.get_latest_approved_revisions(
+            [s for s in sentences if not s.accepted])
+        revisions = list(sentences) + approved_revisions.values()
+
+        user_pks = set()
+        usernames = set()
+        for s in revisions:
+            user_pks.add(s.modified_by_id)
+            if s.likes:
+                user_pks.update(s.likes['likes'])
+                user_pks.update(s.likes['dislikes'])
+            if s.comments and 'comments' in s.comments:
+                usernames.update(comment.get('author') for comment
+                                 in s.comments['comments'][:settings.COMMENTS_PER_PAGE])
+
+        users = {}
+        authors = {}
+        for user in User.objects.filter(Q(pk__in=user_pks) | Q(username__in=usernames)).select_related('details'):
+            users[user.pk] = authors[user.username] = user_to_dict(user)
+
+        doc_uuids = dict(Document.objects.filter(pk__in=set(s.doc_id for s in revisions))
+                                         .values_list('pk', 'uuid'))
+
+        return {
+            'approved_revisions': approved_revisions,
+            'users': users,
+            'authors': authors,
+            'doc_uuids': doc_uuids,
+        }
+
     @property
     def latest_revision(self):
         all_revisions = Sentence.objects.filter(uuid=self.uuid)
         try:
-            latest = all_revisions.order_by('-id')[0]
+            latest = all_revisions.order_by('-revision')[0]
         except IndexError:  # this should not occur in normal circumstances
             latest = None
         return latest
@@ -1441,19 +1760,37 @@ class Sentence(TimeStampedModel):
 
     @property
     def first_revision(self):
-        curr_rev = self
-        while curr_rev.prev_revision:
-            curr_rev = curr_rev.prev_revision
-        return curr_rev
+        if not self.revision:
+            return self
+        return Sentence.objects.filter(uuid=self.uuid).order_by('revision')[0]
+
+    def get_history(self, steps):
+        """
+        Returns up to abs(:steps) revisions starting from the current one:
+        the next ones if :steps is positive, the previous ones otherwise
+        """
+        revisions = Sentence.objects.filter(uuid=self.uuid)
+        if steps > 0:
+            revisions = revisions.filter(revision__gte=self.revision).order_by('revision')
+        else:
+            revisions = revisions.filter(revision__lte=self.revision).order_by('-revision')
+        return list(revisions[:abs(steps)])
 
     def save(self, *args, **kwargs):
-        """ Auto generate an url friendly unique ID """
+        """
+        Auto generate an url friendly unique ID and number the new revisions
+        """
         if not self.uuid:
             self.uuid = str(uuid.uuid4())
+        if self.pk is None and self.prev_revision is not None:
+            self.revision = self.prev_revision.revision + 1
         return super(Sentence, self).save(*args, **kwargs)
 
-    def _likes_export(self):
-        """ Turn user pks into usernames in the like/dislike lists """
+    def _likes_export(self, users=None):
+        """
+        Turn user pks into usernames in the like/dislike lists
+        :param users: dict of prefetched user dicts by pk (see `prefetch_to_dict`)
+        """
         if not self.likes:
             return None
 
@@ -1461,40 +1798,59 @@ class Sentence(TimeStampedModel):
         dislikes = []
         for upk in self.likes['likes']:
             try:
-                u = User.objects.get(pk=upk)
-                likes.append(user_to_dict(u))
-            except User.DoesNotExist:
+                if users is not None:
+                    likes.append(users[upk])
+                else:
+                    likes.append(user_to_dict(User.objects.get(pk=upk)))
+            except (User.DoesNotExist, KeyError):
                 logging.warning('User that liked something doesn\'t exist anymore.')
                 pass
 
         for upk in self.likes['dislikes']:
             try:
-                u = User.objects.get(pk=upk)
-                dislikes.append(user_to_dict(u))
-            except User.DoesNotExist:
+                if users is not None:
+                    dislikes.append(users[upk])
+                else:
+                    dislikes.append(user_to_dict(User.objects.get(pk=upk)))
+            except (User.DoesNotExist, KeyError):
                 logging.warning('User that disliked something doesn\'t exist anymore.')
                 pass
 
         return {'likes': likes, 'dislikes': dislikes}
 
-    def to_dict(self, get_latest=True, get_recent_comments=True, get_total_comments_count=True):
+    def to_dict(self, get_latest=True, get_recent_comments=True, get_total_comments_count=True,
+                prefetched=None):
+        """
+        :param prefetched: what `prefetch_to_dict` gathered for many sentences
+        at once (otherwise everything is looked up just for this sentence)
+        """
+        if prefetched is None:
+            users = authors = None
+            doc_uuid = self.doc.uuid
+            modified_by = self.modified_by.username
+        else:
+            users = prefetched['users']
+            authors = prefetched['authors']
+            doc_uuid = prefetched['doc_uuids'][self.doc_id]
+            modified_by = users[self.modified_by_id]['username']
+
         s = {'form': self.text,
              'style': self.style,
              'uuid': self.uuid,
-             'doc': self.doc.uuid,
+             'doc': doc_uuid,
              'external_refs': self.extrefs,
              'accepted': self.accepted,
              'rejected': self.rejected,
              'deleted': self.deleted,
-             'modified_by': self.modified_by.username,
-             'likes': self._likes_export(),
+             'modified_by': modified_by,
+             'likes': self._likes_export(users),
              'lock': self.lock.to_dict() if self.is_locked else None,
              'newlines': self.newlines,
              'annotations': self.annotations['annotations'] if self.annotations else None
              }
 
         if get_recent_comments:
-            s['comments'] = self.recent_comments
+            s['comments'] = self.get_recent_comments(authors)
 
         if get_total_comments_count:
             if not self.comments or 'comments' not in self.comments:
@@ -1503,9 +1859,12 @@ class Sentence(TimeStampedModel):
                 s['comments_count'] = len(self.comments['comments'])
 
         if get_latest and not self.accepted:
-            latest = self.latest_approved_revision
+            if prefetched is None:
+                latest = self.latest_approved_revision
+            else:
+                latest = prefetched['approved_revisions'].get(self.uuid)
             if latest:
-                s['latestRevision'] = latest.to_dict(get_latest=False)
+                s['latestRevision'] = latest.to_dict(get_latest=False, prefetched=prefetched)
 
         if LINEBREAK_MARKER in self.text:
             s['contains_linebreaks'] = True
@@ -1574,16 +1933,16 @@ class Sentence(TimeStampedModel):
             s.annotations = annotations
         elif reanalyze and s.annotations is not None:
             # The system annotations will be regenerated, so discard the old
-            s.annotations = [a for a in s.annotations['annotations']
-                             if 'type' not in a or a['type'] != SentenceAnnotations.ANNOTATION_TAG_TYPE]
+            system_types = (SentenceAnnotations.ANNOTATION_TAG_TYPE,
+                            SentenceAnnotations.SUGGESTED_TAG_TYPE,
+                            SentenceAnnotations.KEYWORD_TAG_TYPE)
+            s.annotations = {'annotations': [a for a in s.annotations.get('annotations', [])
+                                             if a.get('type') not in system_types]}
 
         s.save()
 
         if reanalyze:
-            self.doc.update_sentence(self, s)
-            self.doc.analyse()
-            s = Sentence.objects.get(pk=s.pk)  # The object is not synched to model
-            self.doc.save()
+            s = self.doc.update_sentence(self, s, reanalyze=True)
 
         return s
 
@@ -1624,8 +1983,11 @@ class Sentence(TimeStampedModel):
             logging.error("Sentence.reject: trying to reject a sentence that "
                           "doesn't have a previous version - %s" % self.pk)
             return self
-        while s_fallback.rejected and s_fallback.prev_revision:
-            s_fallback = s_fallback.prev_revision
+        if s_fallback.rejected:
+            # The newest unrejected one before it (or else the first one)
+            s_fallback = Sentence.objects.filter(uuid=self.uuid, revision__lt=s_fallback.revision,
+                                                 rejected=False).order_by('-revision').first() or \
+                s_fallback.first_revision
 
         # Make a new reverted revision
         s_revert = s_fallback.clone()
@@ -1724,10 +2086,12 @@ class Sentence(TimeStampedModel):
 
     def add_tag(self, user, label, sublabel=None, party=None, approved=False,
                 annotation_type=SentenceAnnotations.MANUAL_TAG_TYPE,
-                classifier_id=None, experiment_uuid=None):
+                classifier_id=None, experiment_uuid=None, commit=True):
         """
         Returns True if successfully added, False if it's a duplicate
         Note: duplicates are allowed for ANNOTATION_TAG_TYPE
+        If :commit is False, neither the sentence nor its document are saved
+        (use a BulkTagger for tagging many sentences at once)
         """
         if not label:
             return False
@@ -1745,20 +2109,19 @@ class Sentence(TimeStampedModel):
 
         if not self.annotations or 'annotations' not in self.annotations:
             self.annotations = {'annotations': [annotation]}
-            self.doc.invalidate_cache()
-            self.save()
-            return True
+        else:
+            # For ANNOTATION type allow duplicates, for the others don't
+            if annotation_type != SentenceAnnotations.ANNOTATION_TAG_TYPE:
+                # Look if the annotation already exists
+                for ann in self.annotations['annotations']:
+                    if sublabel is None and ann['label'] == label:
+                        return False
 
-        # For ANNOTATION type allow duplicates, for the others don't
-        if annotation_type != SentenceAnnotations.ANNOTATION_TAG_TYPE:
-            # Look if the annotation already exists
-            for ann in self.annotations['annotations']:
-                if sublabel is None and ann['label'] == label:
-                    return False
+            self.annotations['annotations'].append(annotation)
 
-        self.annotations['annotations'].append(annotation)
-        self.doc.invalidate_cache()
-        self.save()
+        if commit:
+            self.save()
+            self.doc.update_cached_sentence(self)
         return True
 
     def get_tags(self, excluded=[]):
@@ -1810,15 +2173,24 @@ class Sentence(TimeStampedModel):
             # Tag not found
             return
 
-        self.doc.invalidate_cache()
         self.save()
+        self.doc.update_cached_sentence(self)
         return annotation
 
     @property
     def recent_comments(self):
         """ Returns the first page of comments. Uses settings.COMMENTS_PER_PAGE """
+        return self.get_recent_comments()
+
+    def get_recent_comments(self, authors=None):
+        """
+        Same as `recent_comments`
+        :param authors: dict of prefetched user dicts by username (see `prefetch_to_dict`)
+        """
         if self.comments is not None:
-            return [Sentence.expand_comment_dict(comment, self, self.doc)
+            # Expanding the comments doesn't need the document, don't fetch it
+            document = self.doc if authors is None else None
+            return [Sentence.expand_comment_dict(comment, self, document, authors)
                     for comment in self.comments['comments'][:settings.COMMENTS_PER_PAGE]]
         return None
 
@@ -1844,8 +2216,8 @@ class Sentence(TimeStampedModel):
         else:
             self.comments['comments'].insert(0, comment_dict)
 
-        self.doc.invalidate_cache()
         self.save()
+        self.doc.update_cached_sentence(self)
 
         comment_posted.send(sender=self.__class__, sentence=self, author=user, comment=comment)
         return comment_dict
@@ -1865,7 +2237,6 @@ class Sentence(TimeStampedModel):
             reanalyze=reanalyze)
 
         self.doc.update_sentence(self, new_sentence)
-        self.doc.save()
 
         sentence_edited.send(sender=self.__class__, sentence=self, author=author)
 
@@ -1884,8 +2255,8 @@ class Sentence(TimeStampedModel):
             self.comments = {'comments': [comment_dict]}
         else:
             self.comments['comments'].insert(0, comment_dict)
-        self.doc.invalidate_cache()
         self.save()
+        self.doc.update_cached_sentence(self)
 
         return comment_dict
 
@@ -1899,8 +2270,8 @@ class Sentence(TimeStampedModel):
                     # Remove the comment
                     self.comments['comments'].pop(i)
                     break
-            self.doc.invalidate_cache()
             self.save()
+            self.doc.update_cached_sentence(self)
             return True
         except ValueError:
             logging.error("Encountered Error in remove_comment comment_uuid=%s", comment_uuid)
@@ -1954,6 +2325,39 @@ class Sentence(TimeStampedModel):
         return unicode(self.doc)
 
 
+class BulkTagger(object):
+    """
+    Accumulates in memory the tags added to the sentences of a document,
+    instead of saving the sentence and the document on each `add_tag` call.
+    On `flush`, all the tagged sentences are saved with a single bulk update
+    and the cache of the document is invalidated exactly once.
+    """
+
+    def __init__(self, document, batch_size=1000):
+        self.document = document
+        self.batch_size = batch_size
+        self._tagged = collections.OrderedDict()
+
+    def add_tag(self, sentence, *args, **kwargs):
+        """ Same as `Sentence.add_tag`, but nothing is saved until `flush` """
+        kwargs['commit'] = False
+        added = sentence.add_tag(*args, **kwargs)
+        if added:
+            self._tagged[sentence.pk] = sentence
+        return added
+
+    def flush(self):
+        """ Returns True if there were any tags to be saved, False otherwise """
+        if not self._tagged:
+            return False
+
+        bulk_update(self._tagged.values(), update_fields=['annotations'],
+                    batch_size=self.batch_size)
+        self._tagged.clear()
+        self.document.invalidate_cache()
+        return True
+
+
 class CollaborationInvite(TimeStampedModel):
     # The person that invites
     inviter = models.ForeignKey(User, related_name='invitations_sent')
@@ -2349,6 +2753,33 @@ def notify_user_logged_in(sender, user, request, **kwargs):
     ).send()
 
 
+@receiver(user_logged_in, sender=User)
+def index_session_channel(sender, user, request, **kwargs):
+    """
+    Keep track of the session channels of the user (for sending notifications)
+    """
+    NotificationManager.index_session(user, request.session.session_key)
+
+
+@receiver(post_save, sender=User)
+def reindex_superuser_channels(sender, instance, created, update_fields=None, **kwargs):
+    """
+    The user might have been made a superuser, or not be one anymore
+    """
+    if created or (update_fields is not None and 'is_superuser' not in update_fields):
+        return
+    NotificationManager.reindex_superuser(instance)
+
+
+@receiver(post_delete, sender=Session)
+def unindex_session_channel(sender, instance, **kwargs):
+    """
+    The session has expired or the user has logged out
+    """
+    if instance.user_id is not None:
+        NotificationManager.unindex_session(instance.user_id, instance.session_key)
+
+
 @receiver(comment_posted, sender=Sentence)
 def process_comment_posted(sender, **kwargs):
     logging.info('Received signal: process_comment_posted')
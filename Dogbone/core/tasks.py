@@ -2,15 +2,19 @@ import os
 import pytz
 import uuid
 import logging
-import requests
+import functools
 import traceback
 import langdetect
 
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from bulk_update.helper import bulk_update
 from celery import shared_task, chain
 from constance import config
 from datetime import datetime
 from django.conf import settings
 from dogbone.tools import absolutify
+from django.db import connection
 from django.db.models import Q
 from django.utils import timezone
 from django.core.files.base import ContentFile
@@ -25,10 +29,11 @@ from utils import remove_extension
 from ml.facade import LearnerFacade
 from ml.capsules import Capsule
 from core.exceptions import SpotException
+from integrations.spot import SpotAPI
 from core.tools import notification_to_dict, init_sample_docs
 from core.models import Batch, Document, ExternalInvite, CollaborationInvite, Sentence
-from core.models import SentenceAnnotations
-from keywords.models import SearchKeyword
+from core.models import SentenceAnnotations, BulkTagger
+from core.analysis import AnalysisStageResult, apply_learners, apply_keywords
 from utils.conversion import InvalidDocumentTypeException
 from dogbone.exceptions import DocumentSizeOverLimitException
 from integrations.tasks import send_slack_message, log_intercom_custom_event
@@ -116,6 +121,7 @@ def process_document_task(doc_id, send_notifications=True, send_emails=True, doc
 
         try:
             sentences = document.get_sentences()
+            cleaned_sentences = []
             for s in sentences:
                 # Clean only system annotations, not user annotations
                 cleaned_annot = []
@@ -127,7 +133,8 @@ def process_document_task(doc_id, send_notifications=True, send_emails=True, doc
                             # Keep it
                             cleaned_annot.append(a)
                     s.annotations['annotations'] = cleaned_annot
-                    s.save()
+                    cleaned_sentences.append(s)
+            bulk_update(cleaned_sentences, update_fields=['annotations'], batch_size=1000)
         except Exception as e:
             document.failed = True
             document.error_message = '[Error while cleaning sentences for reanalysis]  ' + str(e)
@@ -140,225 +147,103 @@ def process_document_task(doc_id, send_notifications=True, send_emails=True, doc
     ####################################################################################################
     #
     # DEFAULT TAGS - RLTE Analysis (Responsibilities, Liabilities, Terminations, External References)
-    #
-    ####################################################################################################
-
-    # Triggers the lazy analysis
-
-    try:
-        payload = {'notif': NotificationManager.ServerNotifications.DOCUMENT_RLTE_ANALYSIS_STARTED,
-                   'document': document.to_dict(include_raw=False, include_analysis=False)}
-        message = NotificationManager.create_document_message(document, 'message', payload)
-        message.send()
-
-        document.analysis_result
-        logging.info('Finished RLTE analysis for document %s' % document)
-    except Exception as e:
-        document.failed = True
-        document.error_message = '[Error while document.analysis_result]  ' + str(e)
-        document.save()
-
-        if settings.DEBUG:
-            traceback.print_exc()
-        raise e
-
-    ####################################################################################################
-    #
     # ONLINE LEARNERS TAGS + DEFAULT LEARNERS
+    # Apply Spot experiments
+    # Search for keywords
+    #
+    # These stages only depend on the sentences produced by the conversion,
+    # so they run concurrently and their tags are merged at the end
     #
     ####################################################################################################
 
-    payload = {'notif': NotificationManager.ServerNotifications.DOCUMENT_APPLY_LEARNERS_STARTED,
-               'document': document.to_dict(include_raw=False, include_analysis=False)}
-    message = NotificationManager.create_document_message(document, 'message', payload)
-    message.send()
-
-    any_suggested_tag = False
-    learners_state = []
-    already_added_learners = set()
-
     try:
-        # :capsules list should be treated as immutable
-        sentences = document.get_sorted_sentences()
+        # Make sure the parties are identified before the stages start
         parties = document.get_parties()
-        capsules = [Capsule(s.text, i, parties=parties) for i, s in enumerate(sentences)]
-        logging.info('Retrieved %s sentences for document %s' % (len(capsules), document))
-
-        for ol in LearnerFacade.get_all(document.owner, active_only=True, mature_only=True):
-            # Add necessary info about learners to the state
-            if ol.db_model.tag not in already_added_learners:
-                learners_state.append((ol.db_model.tag, ol.db_model.pretrained, ol.db_model.positive_set_size))
-                already_added_learners.add(ol.db_model.tag)
-            logging.info('Applying the Learner=%s   tag=%s' % (ol, ol.db_model.tag))
-            preds = ol.predict(capsules)
-
-            logging.info('Retrieved predictions for document %s for tag=%s' % (document, ol.db_model.tag))
-            for i, p in enumerate(preds):
-                if p:
-                    s = sentences[i]
-                    label = ol.db_model.tag
-                    s.add_tag(document.owner, label,
-                              annotation_type=SentenceAnnotations.SUGGESTED_TAG_TYPE,
-                              classifier_id=ol.db_model.pk)
-                    any_suggested_tag = True
-
+        sentences = document.get_sorted_sentences()
+        owner = document.owner
+
+        # The sentences unchanged since the previous version of the document
+        # (if any) can reuse its analysis instead of being analysed again
+        previous_version = None if is_reanalisys else document.get_previous_version()
+        unchanged = {}
+        if previous_version is not None:
+            unchanged = document.get_unchanged_sentences(previous_version, sentences)
+            logging.info('%s of %s sentences unchanged since the previous version document=%s',
+                         len(unchanged), len(sentences), previous_version.uuid)
     except Exception as e:
         document.failed = True
-        document.error_message = '[Error while applying learners]  ' + str(e)
+        document.error_message = '[Error while preparing the analysis]  ' + str(e)
         document.save()
 
         if settings.DEBUG:
             traceback.print_exc()
         raise e
 
-    document.learners_state = learners_state
-    if any_suggested_tag:
-        logging.info("The cache has been invalidated")
-        document.invalidate_cache()
-
-    ####################################################################################################
-    #
-    # Apply Spot experiments
-    #
-    ####################################################################################################
-
-    payload = {'notif': NotificationManager.ServerNotifications.DOCUMENT_APPLY_SPOT_EXPERIMENTS_STARTED,
-               'document': document.to_dict(include_raw=False, include_analysis=False)}
-    message = NotificationManager.create_document_message(document, 'message', payload)
-    message.send()
-
-    any_spot_tag = False
-
-    try:
-        user_profile = document.owner.details
-
-        spot_experiments = user_profile.spot_experiments
-        if not spot_experiments:
-            # Exit the outer try-catch block
-            raise SpotException('No Spot experiments found.')
-
-        spot_access_token = user_profile.spot_access_token
-        if not spot_access_token:
-            # Exit the outer try-catch block
-            raise SpotException('No Spot API access token found. '
-                                'Make sure to authorize your account in Spot.')
-
-        headers = {'X-Access-Token': spot_access_token}
-
-        # Check that the user has access to the Spot API
-        ping_url = os.path.join(config.SPOT_API_URL, 'publish', 'ping') + '/'
-        ping_response = requests.get(ping_url, headers=headers)
-        if not (ping_response.status_code == 200 and ping_response.json()['pong']):
-            # Exit the outer try-catch block
-            raise SpotException('Could not access Spot API due to failed authentication. '
-                                'Make sure to authorize your account in Spot.')
-
-        parties = document.get_parties()
-        sentences = document.get_sorted_sentences()
-        samples = [Capsule(sentence.text, parties=parties).preprocess() for sentence in sentences]
-
-        not_found_experiments = []
-
-        # Actual names of dogbone tags don't make sense in Spot,
-        # so simply use the username of the document's owner
-        tag = document.owner.username
-
-        url_template = os.path.join(config.SPOT_API_URL, 'publish', '%s', 'predict') + '/'
-        input_json = {'tag': tag, 'samples': samples}
-
-        for experiment_uuid in spot_experiments:
-            url = url_template % experiment_uuid
-
-            logging.info('Applying experiment=%s from Spot to document=%s',
-                         experiment_uuid, document.uuid)
-
-            response = requests.post(url, json=input_json, headers=headers)
-
-            if response.status_code == 404:
-                not_found_experiments.append(experiment_uuid)
-                continue
-
-            if response.status_code == 200:
-                output_json = response.json()
-                predictions = output_json['predictions']
-                experiment_metadata = output_json.get('experiment')
-                if experiment_metadata is None:
-                    experiment_metadata = user_profile.get_spot_experiment(experiment_uuid)
-                else:
-                    del experiment_metadata['uuid']  # redundant field for metadata
-                    # Fetch and save the current number of samples used for training
-                    # the corresponding online learner so far
-                    online_learner_dict = experiment_metadata.pop('online_learners', {}).get(tag, {})
-                    experiment_metadata['samples'] = online_learner_dict.get('samples', 0)
-                    # Update metadata after each successful request
-                    user_profile.set_spot_experiment(experiment_uuid, experiment_metadata)
-
-                for sentence, prediction in zip(sentences, predictions):
-                    if prediction:
-                        label = '[Spot] %s' % experiment_metadata['name']
-                        sentence.add_tag(document.owner, label,
-                                         annotation_type=SentenceAnnotations.SUGGESTED_TAG_TYPE,
-                                         experiment_uuid=experiment_uuid)
-                        any_spot_tag = True
-
-        for experiment_uuid in not_found_experiments:
-            logging.warning('Removing experiment=%s since it does not exist in Spot anymore.',
-                            experiment_uuid)
-            user_profile.pop_spot_experiment(experiment_uuid)
-
-    except Exception as e:
-        message = 'Error on applying Spot experiments: %r' % e
-        if isinstance(e, SpotException):
-            logging.warning(message)
-        else:
-            # An unexpected exception occurred, so also print the stack traceback
-            # along with the error message in the DEBUG mode
-            if settings.DEBUG:
-                logging.exception(message)
-            else:
-                logging.error(message)
+    stages = [
+        AnalysisStage('rlte',
+                      NotificationManager.ServerNotifications.DOCUMENT_RLTE_ANALYSIS_STARTED,
+                      '[Error while document.analysis_result]  ',
+                      lambda: _apply_rlte_analysis(document.pk, previous_version, unchanged)),
+        AnalysisStage('learners',
+                      NotificationManager.ServerNotifications.DOCUMENT_APPLY_LEARNERS_STARTED,
+                      '[Error while applying learners]  ',
+                      lambda: apply_learners(owner, sentences, parties, previous_version, unchanged)),
+        AnalysisStage('spot',
+                      NotificationManager.ServerNotifications.DOCUMENT_APPLY_SPOT_EXPERIMENTS_STARTED,
+                      None,
+                      lambda: _apply_spot_experiments(document, owner, sentences, parties)),
+        AnalysisStage('keywords',
+                      NotificationManager.ServerNotifications.DOCUMENT_KEYWORDS_SEARCH_STARTED,
+                      '[Error while applying keywords]  ',
+                      lambda: apply_keywords(owner, sentences)),
+    ]
+
+    document_dict = document.to_dict(include_raw=False, include_analysis=False)
+
+    def notify_stage_started(stage):
+        payload = {'notif': stage.started_notification,
+                   'document': document_dict}
+        message = NotificationManager.create_document_message(document, 'message', payload)
+        message.send()
 
-    if any_spot_tag:
-        logging.info("The cache has been invalidated")
-        document.invalidate_cache()
+    results = {}
+    errors = {}
+    for stage, result, error in _run_analysis_stages(stages, settings.DOCUMENT_ANALYSIS_STAGES_CONCURRENCY,
+                                                     on_start=notify_stage_started):
+        if error is not None:
+            errors[stage.name] = error
+            continue
+        results[stage.name] = result
 
-    ####################################################################################################
-    #
-    # Search for keywords
-    #
-    ####################################################################################################
+        # Report the progress as each stage completes
+        payload = {'notif': NotificationManager.ServerNotifications.DOCUMENT_ANALYSIS_STAGE_COMPLETED,
+                   'stage': stage.name,
+                   'document': document_dict}
+        message = NotificationManager.create_document_message(document, 'message', payload)
+        message.send()
 
-    payload = {'notif': NotificationManager.ServerNotifications.DOCUMENT_KEYWORDS_SEARCH_STARTED,
-               'document': document.to_dict(include_raw=False, include_analysis=False)}
-    message = NotificationManager.create_document_message(document, 'message', payload)
-    message.send()
+    # The RLTE analysis has saved its own copy of the document
+    document = Document.objects.get(pk=document.pk)
 
-    any_keyword_tag = False
-    keywords_state = []
-    try:
-        active_keywords = SearchKeyword.activated.filter(owner=document.owner)
-        sentences = document.get_sentences()
-        keywords_state = [(kw.keyword, kw.exact_match) for kw in active_keywords]
-
-        for sentence in sentences:
-            for kw in active_keywords:
-                if kw.matches(sentence.text):
-                    sentence.add_tag(document.owner, kw.keyword,
-                                     annotation_type=SentenceAnnotations.KEYWORD_TAG_TYPE)
-                    any_keyword_tag = True
-    except Exception as e:
-        document.failed = True
-        document.error_message = '[Error while applying keywords]  ' + str(e)
-        document.save()
+    for stage in stages:
+        if stage.name in errors:
+            e = errors[stage.name]
+            document.failed = True
+            document.error_message = stage.error_prefix + str(e)
+            document.save()
+            raise e
 
-        if settings.DEBUG:
-            traceback.print_exc()
-        raise e
+    # Merge the tags of all the stages (in the order of the stages)
+    tagger = BulkTagger(document)
+    sentences = document.get_sorted_sentences()
+    for stage in stages:
+        for idx, label, tag_kwargs in results[stage.name].tags:
+            tagger.add_tag(sentences[idx], document.owner, label, **tag_kwargs)
 
-    document.keywords_state = keywords_state
-    if any_keyword_tag:
+    document.learners_state = results['learners'].state
+    document.keywords_state = results['keywords'].state
+    if tagger.flush():
         logging.info("The cache has been invalidated")
-        document.invalidate_cache()
 
     document.pending = False
     document.save()
@@ -492,6 +377,161 @@ def process_document_task(doc_id, send_notifications=True, send_emails=True, doc
     return True
 
 
+AnalysisStage = namedtuple('AnalysisStage', ['name', 'started_notification', 'error_prefix', 'func'])
+
+
+def _run_analysis_stage(stage, on_start=None):
+    try:
+        if on_start is not None:
+            on_start(stage)
+        return stage, stage.func(), None
+    except Exception as e:
+        if settings.DEBUG:
+            traceback.print_exc()
+        return stage, None, e
+
+
+def _run_analysis_stage_in_thread(stage, on_start=None):
+    try:
+        return _run_analysis_stage(stage, on_start)
+    finally:
+        # Each thread opens its own DB connection, don't leak it
+        connection.close()
+
+
+def _run_analysis_stages(stages, concurrency=1, on_start=None):
+    """
+    Runs the independent analysis stages of a document and yields
+    (stage, result, error) triples in the order the stages complete.
+    If :concurrency is greater than 1, the stages run in a pool of threads.
+    :on_start is called with each stage right before it starts running.
+    """
+    # The threads use their own DB connections, so they can't see the changes
+    # from a transaction which is not committed yet (e.g. in tests)
+    if concurrency <= 1 or connection.in_atomic_block:
+        for stage in stages:
+            yield _run_analysis_stage(stage, on_start)
+        return
+
+    pool = ThreadPool(processes=min(concurrency, len(stages)))
+    try:
+        run_stage = functools.partial(_run_analysis_stage_in_thread, on_start=on_start)
+        for outcome in pool.imap_unordered(run_stage, stages):
+            yield outcome
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _apply_rlte_analysis(document_pk, previous_version=None, unchanged=None):
+    """
+    Triggers the lazy analysis, which saves the RLTE annotations by itself
+    (on its own copy of the document).
+    If the :previous_version was analysed in the same state, the analysis of
+    the :unchanged sentences is copied from it (see `Document.analyse`).
+    """
+    document = Document.objects.get(pk=document_pk)
+    if unchanged:
+        document.analyse(unchanged=unchanged, previous_version=previous_version)
+        document.cached_analysis = None
+        document.dirty = False
+        document.save()
+    document.analysis_result
+    logging.info('Finished RLTE analysis for document %s' % document)
+
+    return AnalysisStageResult(tags=[], state=None)
+
+
+def _apply_spot_experiments(document, owner, sentences, parties):
+    """ Errors are only logged, they don't make the document processing fail """
+    tags = []
+
+    try:
+        user_profile = owner.details
+
+        spot_experiments = user_profile.spot_experiments
+        if not spot_experiments:
+            # Exit the outer try-catch block
+            raise SpotException('No Spot experiments found.')
+
+        spot_access_token = user_profile.spot_access_token
+        if not spot_access_token:
+            # Exit the outer try-catch block
+            raise SpotException('No Spot API access token found. '
+                                'Make sure to authorize your account in Spot.')
+
+        spot_api = SpotAPI(config.SPOT_API_URL, spot_access_token)
+
+        # Check that the user has access to the Spot API
+        if not spot_api.ping():
+            # Exit the outer try-catch block
+            raise SpotException('Could not access Spot API due to failed authentication. '
+                                'Make sure to authorize your account in Spot.')
+
+        samples = [Capsule(sentence.text, parties=parties).preprocess() for sentence in sentences]
+
+        not_found_experiments = []
+
+        # Actual names of dogbone tags don't make sense in Spot,
+        # so simply use the username of the document's owner
+        tag = owner.username
+
+        logging.info('Applying %s experiments from Spot to document=%s',
+                     len(spot_experiments), document.uuid)
+
+        # Call all the experiments at once, a slow experiment is simply skipped
+        for experiment_uuid, response, error in spot_api.predict_many(spot_experiments, tag, samples):
+            if error is not None:
+                logging.warning('Skipping experiment=%s from Spot for document=%s: %r',
+                                experiment_uuid, document.uuid, error)
+                continue
+
+            if response.status_code == 404:
+                not_found_experiments.append(experiment_uuid)
+                continue
+
+            if response.status_code == 200:
+                output_json = response.json()
+                predictions = output_json['predictions']
+                experiment_metadata = output_json.get('experiment')
+                if experiment_metadata is None:
+                    experiment_metadata = user_profile.get_spot_experiment(experiment_uuid)
+                else:
+                    del experiment_metadata['uuid']  # redundant field for metadata
+                    # Fetch and save the current number of samples used for training
+                    # the corresponding online learner so far
+                    online_learner_dict = experiment_metadata.pop('online_learners', {}).get(tag, {})
+                    experiment_metadata['samples'] = online_learner_dict.get('samples', 0)
+                    # Update metadata after each successful request
+                    user_profile.set_spot_experiment(experiment_uuid, experiment_metadata)
+
+                for i, prediction in enumerate(predictions[:len(sentences)]):
+                    if prediction:
+                        label = '[Spot] %s' % experiment_metadata['name']
+                        tags.append((i, label,
+                                     {'annotation_type': SentenceAnnotations.SUGGESTED_TAG_TYPE,
+                                      'experiment_uuid': experiment_uuid}))
+
+        for experiment_uuid in not_found_experiments:
+            logging.warning('Removing experiment=%s since it does not exist in Spot anymore.',
+                            experiment_uuid)
+            user_profile.pop_spot_experiment(experiment_uuid)
+
+    except Exception as e:
+        message = 'Error on applying Spot experiments: %r' % e
+        if isinstance(e, SpotException):
+            logging.warning(message)
+        else:
+            # An unexpected exception occurred, so also print the stack traceback
+            # along with the error message in the DEBUG mode
+            if settings.DEBUG:
+                logging.exception(message)
+            else:
+                logging.error(message)
+
+    return AnalysisStageResult(tags=tags, state=None)
+
+
 def handle_invalid_document(document, send_notifications=False, notif=None, error=None, send_emails=False):
     batch = document.batch
     batch.add_invalid_document(document)
@@ -882,20 +922,29 @@ def prepare_docx_export(doc_id, s3_path, batch=None, include_comments=False, inc
         KeyError: Raises an exception.
     """
 
-    from richtext.exporting import document_to_docx, document_to_rich_docx
+    from richtext.exporting import document_to_docx, document_to_rich_docx, read_export_key
 
     logger = logging.getLogger(__name__)
     logger.info("Celery: `prepare_docx_export` with doc_id=%s" % doc_id)
     doc = Document.objects.get(pk=doc_id)
 
     try:
-        if doc.docx_s3:
+        export_key = doc.get_export_key(s3_path,
+                                        include_comments=include_comments,
+                                        include_track_changes=include_track_changes,
+                                        included_annotations=included_annotations)
+
+        if read_export_key(s3_path) == export_key:
+            # The export already in S3 was made from the very same data
+            logger.info("Reusing the export of doc_id=%s" % doc_id)
+        elif doc.docx_s3:
             document_to_rich_docx(
                 doc,
                 s3_path,
                 include_comments=include_comments,
                 include_track_changes=include_track_changes,
-                included_annotations=included_annotations
+                included_annotations=included_annotations,
+                export_key=export_key
             )
         else:
             document_to_docx(
@@ -903,7 +952,8 @@ def prepare_docx_export(doc_id, s3_path, batch=None, include_comments=False, inc
                 s3_path,
                 include_comments=include_comments,
                 include_track_changes=include_track_changes,
-                included_annotations=included_annotations
+                included_annotations=included_annotations,
+                export_key=export_key
             )
 
         # Notify that it's finished through a socket notif
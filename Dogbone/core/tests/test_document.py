@@ -1,6 +1,9 @@
+import ast
 import mock
+from collections import Counter
 
 from django.contrib.auth.models import User
+from django.test import SimpleTestCase
 from django.utils.timezone import now
 from notifications.models import Notification
 
@@ -8,6 +11,7 @@ from core.models import (
     Document, CollaborationInvite, ExternalInvite,
     Sentence, SentenceAnnotations, UserLastViewDate
 )
+from core import models
 from dogbone.testing.base import BeagleWebTest
 
 
@@ -635,3 +639,25 @@ class UserLastViewDateTest(BeagleWebTest):
         UserLastViewDate.create_or_update(d, self.user, time2)
         viewdate = UserLastViewDate.objects.get(document = d, user = self.user)
         self.assertEqual(viewdate.date, time2)
+
+
+class ModelsModuleTest(SimpleTestCase):
+
+    def test_no_duplicate_definitions(self):
+        """
+        Checks that no class (e.g. a model) or function is defined twice in
+        core.models, nor any method twice in the same class: only the first
+        definition of a model gets registered, and of a method the last one
+        """
+        with open(models.__file__.replace('.pyc', '.py')) as f:
+            tree = ast.parse(f.read())
+
+        def duplicates(nodes):
+            counts = Counter(n.name for n in nodes
+                             if isinstance(n, (ast.ClassDef, ast.FunctionDef)))
+            return [name for name, count in counts.items() if count > 1]
+
+        self.assertEqual(duplicates(tree.body), [])
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                self.assertEqual(duplicates(node.body), [], node.name)
@@ -21,6 +21,7 @@ class NotificationTaskTest(BeagleWebTest):
         self.login()
 
         return_mock = mock.Mock()
+        return_mock.pipeline.return_value = return_mock
         with mock.patch('beagle_realtime.notifications.NotificationManager.redis_manager.get_connection',
                         return_value=return_mock) as _:
 
@@ -1,7 +1,9 @@
 import mock
 
-from core.models import Document, Sentence
+from core.models import BulkTagger, Document, Sentence, SentenceAnnotations
 from dogbone.testing.base import BeagleWebTest
+from keywords.models import SearchKeyword
+from nlplib import sentlevel_process
 
 
 class DocSentencesTest(BeagleWebTest):
@@ -27,6 +29,28 @@ class DocSentencesTest(BeagleWebTest):
             s = Sentence.objects.get(id=sid)
             self.assertEqual(s.text, self.sents[i])
 
+    def test_doc_sents_bulk_creation(self):
+        """ Checks that the sentences are inserted at once and the edits are still applied """
+        d = Document.objects.create(original_name='Bulk Doc',
+                                    title='Bulk',
+                                    owner=self.user)
+        with mock.patch('core.models.Sentence.save') as save_mock:
+            d.init(self.sents[:3], None, None)
+            self.assertFalse(save_mock.called)
+
+        d = Document.objects.create(original_name='Changed Doc',
+                                    title='Changed',
+                                    owner=self.user)
+        d.init(self.sents[:3], changes=[None, self.repl_sent, None])
+        sentences = d.get_sorted_sentences()
+
+        self.assertEqual([s.text for s in sentences],
+                         [self.sents[0], self.repl_sent, self.sents[2]])
+        self.assertEqual(sentences[1].prev_revision.text, self.sents[1])
+        self.assertEqual(len(set(s.uuid for s in sentences)), 3)
+        self.assertEqual(Document.objects.get(pk=d.pk).sentences_pks,
+                         [s.pk for s in sentences])
+
     def test_sent_labels_extract(self):
         """ Checks an obvious sentence for labels """
         sid = self.d.sentences_ids[0]
@@ -96,6 +120,74 @@ class DocSentencesTest(BeagleWebTest):
         self.assertNotEqual(s.pk, s2.pk)
         self.assertNotEqual(s.annotations, s2.annotations)
 
+    def test_sent_change_text_reanalyze_only_sentence(self):
+        """ Checks that only the edited sentence is analysed again """
+        SearchKeyword.add(self.user, 'ever')
+        s = self.d.get_sorted_sentences()[0]
+        s.add_tag(self.user, 'tag1')
+
+        with mock.patch('core.models.Document.analyse') as analyse_mock:
+            s2 = s.new_revision(self.user, text='Neither party will ever be responsible.', reanalyze=True)
+            self.assertFalse(analyse_mock.called)
+
+        labels_by_type = s2.get_tags_by_type()
+        self.assertEqual(labels_by_type[SentenceAnnotations.MANUAL_TAG_TYPE], set(['tag1']))
+        self.assertEqual(labels_by_type[SentenceAnnotations.KEYWORD_TAG_TYPE], set(['ever']))
+        self.assertEqual(Document.objects.get(pk=self.d.pk).sentences_pks[0], s2.pk)
+
+    def test_sent_change_text_reanalyze_in_context(self):
+        """
+        Checks that the edited sentence is analysed by itself, but in the
+        stored context of the whole document
+        """
+        s = self.d.get_sorted_sentences()[1]
+        edited = 'The roses are white between Company and You.'
+
+        with mock.patch('core.models.sentlevel_process', wraps=sentlevel_process) as sentlevel_mock:
+            s2 = s.new_revision(self.user, text=edited, reanalyze=True)
+
+        facade = sentlevel_mock.call_args[1]['facade']
+        self.assertEqual(facade.sentences, [self.sents[1], edited])
+        self.assertEqual(facade.analysed_idxs, [1])
+        self.assertEqual(Document.objects.get(pk=self.d.pk).rlte_state, self.d.rlte_state)
+
+        # The same annotations as if the whole document was analysed
+        d = Document.objects.create(original_name='Edited Doc',
+                                    title='Edited',
+                                    owner=self.user)
+        d.init([self.sents[0], edited] + self.sents[2:], None, None)
+        d.doclevel_analysis = Document.objects.get(pk=self.d.pk).doclevel_analysis
+        d.analyse()
+        self.assertEqual(d.rlte_state, self.d.rlte_state)
+        self.assertEqual(s2.get_tags_by_type().get(SentenceAnnotations.ANNOTATION_TAG_TYPE),
+                         d.get_sorted_sentences()[1].get_tags_by_type().get(SentenceAnnotations.ANNOTATION_TAG_TYPE))
+
+    def test_sent_change_text_reanalyze_new_mentions(self):
+        """ Checks that the whole document is analysed again if the edited sentence has new mentions """
+        s = self.d.get_sorted_sentences()[1]
+
+        with mock.patch('core.models.Document.analyse', autospec=True,
+                        side_effect=Document.analyse) as analyse_mock:
+            s2 = s.new_revision(self.user, text='The roses are red between Acme Corporation and You.',
+                                reanalyze=True)
+            self.assertTrue(analyse_mock.called)
+
+        document = Document.objects.get(pk=self.d.pk)
+        self.assertEqual(document.sentences_pks[1], s2.pk)
+        self.assertIsNotNone(document.rlte_state)
+
+    def test_sent_change_text_resets_rlte_state(self):
+        """ Checks that a text edited without reanalysis no longer fits the stored RLTE state """
+        s = self.d.get_sorted_sentences()[1]
+        s2 = s.new_revision(self.user, annotations={'annotations': []})
+        self.d.update_sentence(s, s2)
+        self.assertIsNotNone(Document.objects.get(pk=self.d.pk).rlte_state)
+
+        s3 = s2.new_revision(self.user, text=self.repl_sent)
+        self.d.update_sentence(s2, s3)
+        self.assertIsNone(self.d.rlte_state)
+        self.assertIsNone(Document.objects.get(pk=self.d.pk).rlte_state)
+
     def test_sent_change_doc_cache_invalidation(self):
         """ Checks if sentence text manual change updates in the document """
         sid = self.d.sentences_ids[0]
@@ -109,6 +201,81 @@ class DocSentencesTest(BeagleWebTest):
         self.assertEqual(self.d.analysis_result['sentences'][0]['form'],
                          s2.text)
 
+    def test_cached_analysis_patched(self):
+        """ Checks that sentence changes patch the cache instead of invalidating it """
+        self.d.analysis_result
+        s = self.d.get_sorted_sentences()[1]
+
+        with mock.patch('core.models.Document.invalidate_cache') as invalidate_cache_mock:
+            s.add_comment(self.user, 'comment1')
+            s.add_tag(self.user, 'tag1')
+            s.edit(self.user, 'The roses are blue between Company and You.', None)
+            self.assertFalse(invalidate_cache_mock.called)
+
+        patched = Document.objects.get(pk=self.d.pk).cached_analysis
+        self.assertIsNotNone(patched)
+
+        # The same as if it was generated from scratch
+        Document.objects.get(pk=self.d.pk).invalidate_cache()
+        Document.objects.get(pk=self.d.pk).analysis_result
+        self.assertEqual(patched, Document.objects.get(pk=self.d.pk).cached_analysis)
+
+    def test_update_sentence_keeps_concurrent_changes(self):
+        """ Checks that replacing a sentence only saves the sentences and the cache of the document """
+        self.d.analysis_result
+        stale = Document.objects.get(pk=self.d.pk)
+        sentences = stale.get_sorted_sentences()
+
+        # Meanwhile, another sentence is replaced through another instance
+        s0 = sentences[0].new_revision(self.user, text=self.repl_sent)
+        self.d.update_sentence(sentences[0], s0)
+        Document.objects.filter(pk=self.d.pk).update(title='New Title')
+
+        s1 = sentences[1].new_revision(self.user, text='The roses are blue between Company and You.')
+        stale.update_sentence(sentences[1], s1)
+
+        document = Document.objects.get(pk=self.d.pk)
+        self.assertEqual(document.title, 'New Title')
+        self.assertEqual(document.sentences_pks[:2], [s0.pk, s1.pk])
+        self.assertEqual([s['form'] for s in document.cached_analysis['sentences'][:2]],
+                         [s0.text, s1.text])
+
+    def test_update_sentence_not_in_document(self):
+        """ Checks that a sentence the document doesn't point to can't be replaced """
+        s = self.d.get_sorted_sentences()[0]
+        s2 = s.new_revision(self.user, text=self.repl_sent)
+        self.d.update_sentence(s, s2)
+
+        s3 = s.new_revision(self.user, text='The roses are blue between Company and You.')
+        with self.assertRaises(ValueError):
+            self.d.update_sentence(s, s3)
+        self.assertEqual(Document.objects.get(pk=self.d.pk).sentences_pks[0], s2.pk)
+
+    def test_bulk_tagger(self):
+        """ Checks that bulk tags are saved only on flush, all at once """
+        # Trigger cache creation
+        self.d.analysis_result
+        sentences = self.d.get_sorted_sentences()
+        tagger = BulkTagger(self.d)
+
+        self.assertTrue(tagger.add_tag(sentences[1], self.user, 'bulk1'))
+        self.assertTrue(tagger.add_tag(sentences[1], self.user, 'bulk2'))
+        self.assertFalse(tagger.add_tag(sentences[1], self.user, 'bulk2'))
+        self.assertTrue(tagger.add_tag(sentences[2], self.user, 'bulk1'))
+
+        # Nothing is persisted yet
+        self.assertNotIn('bulk1', Sentence.objects.get(pk=sentences[1].pk).get_tags())
+        self.assertIsNotNone(Document.objects.get(pk=self.d.pk).cached_analysis)
+
+        with mock.patch('core.models.Document.invalidate_cache',
+                        autospec=True) as invalidate_cache_mock:
+            self.assertTrue(tagger.flush())
+            invalidate_cache_mock.assert_called_once_with(self.d)
+
+        self.assertTrue({'bulk1', 'bulk2'} <= set(Sentence.objects.get(pk=sentences[1].pk).get_tags()))
+        self.assertIn('bulk1', Sentence.objects.get(pk=sentences[2].pk).get_tags())
+        self.assertFalse(tagger.flush())
+
     def test_sent_history_walk(self):
         """ Checks if sentence history is properly created and persisted """
         sid = self.d.sentences_ids[0]
@@ -245,3 +412,49 @@ class SentenceOperationsTest(BeagleWebTest):
         s = s.new_revision(self.user, text='New sentence sentence sentence sentence.')
         s.reject(self.user)
         self.assertEqual(len(Sentence.objects.filter(uuid=uuid)), 5)
+
+    def test_revision_chain(self):
+        """ Checks that the revisions are numbered and looked up in one query """
+        s1 = self.s.new_revision(self.user, text='New sentence sentence.')
+        s2 = s1.new_revision(self.user, text='New sentence sentence sentence.')
+        s3 = s2.reject(self.user)
+        self.assertEqual([s.revision for s in (self.s, s1, s2, s3)], [0, 1, 2, 3])
+        self.assertEqual(s3.text, s1.text)
+        # Both the edits are rejected now
+        self.assertEqual(s3.reject(self.user).text, self.s.text)
+
+        s3 = Sentence.objects.get(pk=s3.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(s3.first_revision, self.s)
+        with self.assertNumQueries(1):
+            self.assertEqual(s1.get_history(-5), [s1, self.s])
+        with self.assertNumQueries(1):
+            self.assertEqual(s1.get_history(2), [s1, s2])
+
+    def test_latest_approved_revisions(self):
+        """ Checks that the latest approved revisions are fetched at once """
+        edited = self.s.new_revision(self.user, text='New sentence sentence.')
+        other = Sentence.objects.create(text='Other sentence.',
+                                        accepted=True,
+                                        doc=self.s.doc,
+                                        modified_by=self.user)
+
+        with self.assertNumQueries(1):
+            revisions = Sentence.get_latest_approved_revisions([edited, other])
+
+        self.assertEqual(revisions, {edited.uuid: edited.latest_approved_revision,
+                                     other.uuid: other})
+
+    def test_prefetch_to_dict(self):
+        """ Checks that prefetched sentences get serialized without any queries """
+        self.s.add_comment(self.user, 'comment1')
+        self.s.like(self.user)
+        edited = self.s.new_revision(self.user, text='New sentence sentence.')
+        sentences = [Sentence.objects.get(pk=edited.pk), Sentence.objects.get(pk=self.s.pk)]
+
+        prefetched = Sentence.prefetch_to_dict(sentences)
+        with self.assertNumQueries(0):
+            dicts = [s.to_dict(prefetched=prefetched) for s in sentences]
+
+        self.assertEqual(dicts, [s.to_dict() for s in sentences])
+        self.assertEqual(dicts[0]['latestRevision']['uuid'], self.s.uuid)
@@ -5,6 +5,7 @@ import shutil
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase
 from django.utils.timezone import now
 from dogbone.tools import absolutify
 from dogbone.testing.base import BeagleWebTest
@@ -12,11 +13,14 @@ from core.tasks import (
     process_document_task, process_document_conversion,
     send_document_complete_notification, send_password_request,
     send_external_invite, prepare_docx_export, InvalidDocumentTypeException,
-    EasyPDFCloudHTTPException
+    EasyPDFCloudHTTPException, AnalysisStage, AnalysisStageResult, _run_analysis_stages
 )
 from portal.mailer import BeagleMailer
 from portal.models import ExternalInvite
 from core.models import Sentence, SentenceAnnotations, Document
+from nlplib import sentlevel_process
+from nlplib.utils import sents2wordtag
+from beagle_realtime.notifications import NotificationManager
 from authentication.models import PasswordResetRequest, OneTimeLoginHash
 from keywords.models import SearchKeyword
 
@@ -274,6 +278,120 @@ class ProcessDocumentTaskTest(BeagleWebTest):
                                                                     'on document _Some title_'.format(self.user.email),
                                                                     '#intercom')
 
+    def test_stage_completed_notifications(self):
+        """ Check that a notification is sent as each analysis stage completes """
+        doc = self.create_document('Some title', self.user, pending=True)
+        with mock.patch('core.tasks.NotificationManager.create_document_message') as mock_create_document_message, \
+                mock.patch('core.tasks.send_document_digest.delay'), \
+                mock.patch('core.tasks.log_intercom_custom_event.delay'), \
+                mock.patch('core.tasks.log_statistic_event.delay'), \
+                mock.patch('core.tasks.send_slack_message'):
+            process_document_task(doc.id)
+
+        payloads = [call[0][2] for call in mock_create_document_message.call_args_list]
+        completed = [payload['stage'] for payload in payloads
+                     if payload['notif'] == NotificationManager.ServerNotifications.DOCUMENT_ANALYSIS_STAGE_COMPLETED]
+        self.assertEqual(sorted(completed), ['keywords', 'learners', 'rlte', 'spot'])
+
+    def test_reuse_previous_version_analysis(self):
+        """
+        Check that only the changed sentences of a new version of a document
+        get analysed (or even word-tagged), while the unchanged ones get the
+        previous analysis
+        """
+        sentences = ['The Supplier shall deliver the goods within 30 days.',
+                     'This Agreement may be terminated by either party.',
+                     'The Supplier shall not be liable for indirect damages.']
+        previous = self.create_analysed_document('Supply Agreement.docx', sentences, self.user)
+
+        revised = list(sentences)
+        revised[0] = 'The Supplier shall deliver the goods within 60 days.'
+        with mock.patch('core.models.sentlevel_process', wraps=sentlevel_process) as mock_sentlevel, \
+                mock.patch('nlplib.facade.sents2wordtag', wraps=sents2wordtag) as mock_sents2wordtag:
+            document = self.create_analysed_document('Supply Agreement.docx', revised, self.user,
+                                                     previous_version=previous)
+            # The whole document is the context, but only the changed sentence gets analysed
+            facade = mock_sentlevel.call_args[1]['facade']
+            self.assertEqual(facade.sentences, revised)
+            self.assertEqual(facade.analysed_idxs, [0])
+            tagged = [s for call in mock_sents2wordtag.call_args_list for s in call[0][0]]
+            self.assertEqual(tagged, [facade.preprocessed_sentences[0]])
+
+        self.assertEqual(document.get_previous_version(), previous)
+        previous_sentences = previous.get_sorted_sentences()
+        document_sentences = document.get_sorted_sentences()
+        for i in (1, 2):
+            self.assertEqual(document_sentences[i].annotations, previous_sentences[i].annotations)
+            self.assertEqual(document_sentences[i].extrefs, previous_sentences[i].extrefs)
+
+    def test_reuse_previous_version_analysis_same_as_full(self):
+        """
+        Check that reusing the analysis of the unchanged sentences gives the
+        same annotations as a full analysis, with mentions across sentences
+        """
+        sentences = ['This Agreement is made between Acme Corporation (the "Supplier") '
+                     'and Beta LLC (the "Customer").',
+                     'The Supplier shall deliver the goods within 30 days.',
+                     'The Customer shall pay all the fees within thirty days.',
+                     'The Supplier shall not be liable for indirect damages.',
+                     'Either party may terminate this Agreement by written notice.']
+        previous = self.create_analysed_document('Services Agreement.docx', sentences, self.user)
+
+        revised = list(sentences)
+        revised[3] = 'The Supplier shall not be liable for any indirect damages.'
+        incremental = self.create_analysed_document('Services Agreement.docx', revised, self.user,
+                                                    previous_version=previous)
+        full = self.create_analysed_document('Services Agreement.docx', revised, self.user)
+
+        self.assertIsNone(full.get_previous_version())
+        self.assertEqual(incremental.rlte_state, full.rlte_state)
+        self.assertEqual(incremental.rlte_mentions, full.rlte_mentions)
+        self.assertEqual([(s.annotations, s.extrefs) for s in incremental.get_sorted_sentences()],
+                         [(s.annotations, s.extrefs) for s in full.get_sorted_sentences()])
+
+    def test_reuse_previous_version_system_annotations(self):
+        """
+        Check that only the annotations found by the analysis of the previous
+        version are copied, not the ones its users added
+        """
+        sentences = ['The Supplier shall deliver the goods within 30 days.',
+                     'The Supplier shall not be liable for indirect damages.']
+        previous = self.create_analysed_document('Supply Agreement.docx', sentences, self.user)
+        liable = previous.get_sorted_sentences()[1]
+        system_annotations = list(liable.annotations['annotations'])
+        liable.add_tag(self.user, 'Penalty', annotation_type=SentenceAnnotations.ANNOTATION_TAG_TYPE)
+
+        revised = ['The Supplier shall deliver the goods within 60 days.', sentences[1]]
+        document = self.create_analysed_document('Supply Agreement.docx', revised, self.user,
+                                                 previous_version=previous)
+
+        self.assertEqual(document.get_sorted_sentences()[1].annotations['annotations'], system_annotations)
+
+class RunAnalysisStagesTest(SimpleTestCase):
+
+    def _failing_stage(self):
+        raise ValueError('Stage failed')
+
+    def test_run_analysis_stages(self):
+        stages = [
+            AnalysisStage('first', None, None, lambda: AnalysisStageResult(tags=[(0, 'A', {})], state=None)),
+            AnalysisStage('second', None, None, self._failing_stage),
+            AnalysisStage('third', None, None, lambda: AnalysisStageResult(tags=[], state=[1])),
+        ]
+
+        for concurrency in (1, 3):
+            started = []
+            outcomes = dict((stage.name, (result, error))
+                            for stage, result, error in _run_analysis_stages(stages, concurrency,
+                                                                             on_start=started.append))
+
+            self.assertEqual(sorted(stage.name for stage in started), ['first', 'second', 'third'])
+            self.assertEqual(set(outcomes), set(['first', 'second', 'third']))
+            self.assertEqual(outcomes['first'], (AnalysisStageResult(tags=[(0, 'A', {})], state=None), None))
+            self.assertIsNone(outcomes['second'][0])
+            self.assertIsInstance(outcomes['second'][1], ValueError)
+            self.assertEqual(outcomes['third'], (AnalysisStageResult(tags=[], state=[1]), None))
+
 
 class PrepareExportTaskTest(BeagleWebTest):
 
@@ -285,11 +403,13 @@ class PrepareExportTaskTest(BeagleWebTest):
         default = {
             'include_comments': False,
             'include_track_changes': False,
-            'included_annotations': None
+            'included_annotations': None,
+            'export_key': mock.ANY
         }
 
         with mock.patch('richtext.exporting.document_to_docx') as document_to_docx_mock, \
-                mock.patch('richtext.exporting.document_to_rich_docx') as document_to_rich_docx_mock:
+                mock.patch('richtext.exporting.document_to_rich_docx') as document_to_rich_docx_mock, \
+                mock.patch('richtext.exporting.read_export_key', return_value=None):
             prepare_docx_export(doc.pk, s3_path)
             document_to_docx_mock.assert_called_once_with(doc, s3_path, **default)
             document_to_rich_docx_mock.assert_not_called()
@@ -298,11 +418,46 @@ class PrepareExportTaskTest(BeagleWebTest):
             doc.save_docx(mock.ANY)
 
         with mock.patch('richtext.exporting.document_to_docx') as document_to_docx_mock, \
-                mock.patch('richtext.exporting.document_to_rich_docx') as document_to_rich_docx_mock:
+                mock.patch('richtext.exporting.document_to_rich_docx') as document_to_rich_docx_mock, \
+                mock.patch('richtext.exporting.read_export_key', return_value=None):
             prepare_docx_export(doc.pk, s3_path)
             document_to_docx_mock.assert_not_called()
             document_to_rich_docx_mock.assert_called_once_with(doc, s3_path, **default)
 
+    def test_document_export_reused(self):
+        doc = self.create_document('Some title', self.user, pending=False)
+        s3_path = settings.S3_EXPORT_PATH % doc.uuid
+
+        # Keep the export key of the latest export (as S3 does in its metadata)
+        export_keys = {}
+
+        def save_export(document, path, **kwargs):
+            export_keys[path] = kwargs['export_key']
+
+        with mock.patch('richtext.exporting.document_to_docx', side_effect=save_export) as document_to_docx_mock, \
+                mock.patch('richtext.exporting.read_export_key', side_effect=export_keys.get):
+            prepare_docx_export(doc.pk, s3_path)
+            self.assertEqual(document_to_docx_mock.call_count, 1)
+
+            # Nothing has changed since the previous export
+            prepare_docx_export(doc.pk, s3_path)
+            self.assertEqual(document_to_docx_mock.call_count, 1)
+
+            # Different options
+            prepare_docx_export(doc.pk, s3_path, include_comments=True)
+            self.assertEqual(document_to_docx_mock.call_count, 2)
+
+            # A sentence has changed
+            sentence = doc.get_sorted_sentences()[0]
+            sentence.edit(self.user, 'Some other title', None)
+            prepare_docx_export(doc.pk, s3_path, include_comments=True)
+            self.assertEqual(document_to_docx_mock.call_count, 3)
+
+            # The exports are made differently now
+            with mock.patch('richtext.exporting.EXPORT_FORMAT_VERSION', 2):
+                prepare_docx_export(doc.pk, s3_path, include_comments=True)
+            self.assertEqual(document_to_docx_mock.call_count, 4)
+
 
 class SendDocumentCompleteNotificationTaskTest(BeagleWebTest):
     NEED_DEFAULT_USER = False
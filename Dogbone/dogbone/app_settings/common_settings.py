@@ -1,5 +1,6 @@
 from datetime import timedelta
 import os
+import tempfile
 
 from selenium import webdriver
 
@@ -228,6 +229,37 @@ CELERYBEAT_SCHEDULE = {
     }
 }
 
+######################################################################################
+#
+#  DOCUMENT PROCESSING
+#
+######################################################################################
+
+# The number of threads running the independent analysis stages of a document
+# (RLTE, learners, Spot experiments, keywords); 1 runs them one after another.
+# Only their I/O (Spot requests, S3 reads) overlaps, the CPU bound parts are
+# still serialized by the GIL
+DOCUMENT_ANALYSIS_STAGES_CONCURRENCY = 4
+
+# The number of processes running the RLT analyzers (for each of the parties) of
+# a document; 1 runs them in the current process (e.g. the Celery worker). They
+# are only forked from the main thread, so the analysis stages must run one
+# after another (DOCUMENT_ANALYSIS_STAGES_CONCURRENCY = 1) for this to apply
+RLTE_ANALYZERS_PROCESSES = 1
+
+# The number of pages of a scanned PDF rasterized and OCRed at the same time
+# (each one by its own convert and tesseract processes); 1 does one page at a time
+OCR_CONCURRENCY = 4
+
+# Where the conversions of the PDFs (possibly OCRed) are kept, keyed by the
+# SHA-256 of the PDFs, so that the same file doesn't get converted twice; None
+# disables the cache. The least recently used ones go over the size limit. The txt
+# fallbacks (when the docx conversion fails) expire soon, so that the file gets
+# another chance of being converted to docx.
+CONVERSION_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'dogbone_conversion_cache')
+CONVERSION_CACHE_MAX_SIZE = 1024 * 1024 * 1024  # bytes
+CONVERSION_CACHE_TXT_TTL = 60 * 60  # seconds
+
 ######################################################################################
 #
 #  MARKETING
@@ -268,6 +300,16 @@ DEFAULT_GOOGLE_DRIVE_CLIENT_SECRET = 'AjgHIhJdGFGa3GTVKrt-McAn'
 
 DEFAULT_SPOT_API_URL = 'http://spot.beagle.ai/api/v1/'
 
+# The (connect, read) timeout in seconds of each call to the Spot API
+SPOT_API_TIMEOUT = (3.05, 30)
+
+# The total time in seconds a call to a Spot experiment gets for its whole
+# response (the read timeout is only for each chunk of it)
+SPOT_API_DEADLINE = 60
+
+# The maximum number of experiments called at the same time for a document
+SPOT_API_CONCURRENCY = 4
+
 ######################################################################################
 #
 #  DYNAMIC SETTINGS
@@ -66,6 +66,15 @@ class BeagleWebTest(TestCase):
         cls.cache_set_patcher.start()
         cls.cache_delete_patcher.start()
 
+        # Mock and thus disable the index of session channels
+        # (the recipients of notifications get looked up in the DB instead)
+        cls.channels_index_patcher = mock.patch(
+            'beagle_realtime.notifications.NotificationManager.channels_index.get_connection',
+            return_value=None
+        )
+
+        cls.channels_index_patcher.start()
+
         # Mock and thus disable some middleware classes
         cls.user_time_zone_middleware_patcher = mock.patch(
             'portal.middleware.UserTimezoneMiddleware.process_request',
@@ -84,6 +93,8 @@ class BeagleWebTest(TestCase):
         cls.visitor_tracking_middleware_patcher.stop()
         cls.user_time_zone_middleware_patcher.stop()
 
+        cls.channels_index_patcher.stop()
+
         cls.cache_delete_patcher.stop()
         cls.cache_set_patcher.stop()
         cls.cache_get_patcher.stop()
@@ -129,7 +140,8 @@ class BeagleWebTest(TestCase):
         return d
 
     @staticmethod
-    def create_analysed_document(original_filename, sentences, owner, batch=None):
+    def create_analysed_document(original_filename, sentences, owner, batch=None,
+                                 previous_version=None):
         from core.tasks import process_document_task
 
         d = Document(owner=owner,
@@ -138,7 +150,8 @@ class BeagleWebTest(TestCase):
                      docx_s3=None,
                      pdf_s3=None,
                      pending=True,
-                     batch=batch)
+                     batch=batch,
+                     previous_version=previous_version)
         d.init(sentences)
         d.save()
 
@@ -147,17 +147,20 @@ class S3FileManager(object):
         s3_key = self.build_key(key)
         s3_key.get_contents_to_filename(file_path)
 
-    def save_file(self, key, file_handle, acl=None):
+    def save_file(self, key, file_handle, acl=None, metadata=None):
         """
         API for saving an open file to S3
         :param key: the key string (it can be a file path)
         :param file_handle:
         :param acl:
+        :param metadata: dict of metadata to be stored along with the file
         :return:
         """
         logging.info('Saving file handle to S3. key=%s', key)
 
         s3_key = self.build_key(key)
+        for metadata_key, metadata_value in (metadata or {}).items():
+            s3_key.set_metadata(metadata_key, metadata_value)
         s3_key.set_contents_from_file(file_handle)
         if acl is not None:
             s3_key.set_acl(acl)
@@ -229,6 +232,18 @@ class S3FileManager(object):
         s3_key = self.build_key(key)
         return s3_key.get_metadata(metadata_key)
 
+    def read_metadata(self, key, metadata_key):
+        """
+        Fetch some metadata stored in S3 for a given S3 key
+        :param key: the S3 key name
+        :param metadata_key: the metadata key on the S3 key
+        :return: the metadata value or None (also if there's no such S3 key)
+        """
+        s3_key = self.bucket.get_key(key)
+        if s3_key is None:
+            return None
+        return s3_key.get_metadata(metadata_key)
+
     def set_metadata(self, key, metadata_key, metadata_value):
         """
         Set some metadata for a given S3 key
@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+import threading
+import requests
+
+from django.conf import settings
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from requests.adapters import HTTPAdapter
+
+
+class SpotAPI(object):
+    """
+    Client for the Spot publish API.
+
+    All the clients of a process share a single keep-alive session, so the
+    connections to Spot get reused across calls (and across documents).
+    Every call has a timeout, and a deadline for getting the whole response,
+    so a slow experiment only fails by itself instead of stalling its caller.
+    """
+
+    _session = None
+    _session_lock = threading.Lock()
+
+    def __init__(self, base_url, access_token, timeout=None, deadline=None, concurrency=None):
+        """
+        :param timeout: (connect, read) timeout in seconds of each call
+        :param deadline: the total time in seconds each call of predict_many
+                         gets for the whole response (the read timeout only
+                         bounds the wait for each chunk of it)
+        :param concurrency: the maximum number of calls made at the same time
+        """
+        self.base_url = base_url
+        self.headers = {'X-Access-Token': access_token}
+        self.timeout = timeout or settings.SPOT_API_TIMEOUT
+        self.deadline = deadline or settings.SPOT_API_DEADLINE
+        self.concurrency = concurrency or settings.SPOT_API_CONCURRENCY
+
+    @classmethod
+    def get_session(cls):
+        with cls._session_lock:
+            if cls._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=settings.SPOT_API_CONCURRENCY)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._session = session
+        return cls._session
+
+    def _url(self, *path):
+        return os.path.join(self.base_url, 'publish', *path) + '/'
+
+    def ping(self):
+        """ Checks that the access token grants access to the Spot API """
+        try:
+            response = self.get_session().get(self._url('ping'), headers=self.headers,
+                                              timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.warning('Could not ping the Spot API: %r' % e)
+            return False
+        return response.status_code == 200 and response.json()['pong']
+
+    def predict(self, experiment_uuid, tag, samples):
+        """ Returns the response of the experiment on the :samples """
+        return self.get_session().post(self._url(experiment_uuid, 'predict'),
+                                       json={'tag': tag, 'samples': samples},
+                                       headers=self.headers, timeout=self.timeout)
+
+    def _safe_predict(self, args):
+        experiment_uuid, tag, samples = args
+        try:
+            return experiment_uuid, self.predict(experiment_uuid, tag, samples), None
+        except requests.RequestException as e:
+            return experiment_uuid, None, e
+
+    def predict_many(self, experiment_uuids, tag, samples):
+        """
+        Calls several experiments on the same :samples at the same time.
+        Returns a list of (experiment_uuid, response, error) triples
+        (in the order of :experiment_uuids), the error being the exception
+        raised by a failed or timed out call, or a Timeout for a call past
+        its deadline.
+        """
+        calls = [(experiment_uuid, tag, samples) for experiment_uuid in experiment_uuids]
+        if not calls:
+            return []
+
+        processes = max(min(self.concurrency, len(calls)), 1)
+        pool = ThreadPool(processes=processes)
+        try:
+            start = time.time()
+            pending = [pool.apply_async(self._safe_predict, (call,)) for call in calls]
+            results = []
+            for i, (call, result) in enumerate(zip(calls, pending)):
+                # The calls start in order, :processes of them at a time
+                deadline = start + self.deadline * (i // processes + 1)
+                try:
+                    results.append(result.get(timeout=max(deadline - time.time(), 0)))
+                except TimeoutError:
+                    results.append((call[0], None, requests.Timeout(
+                        'No complete response from experiment %s within %ss' % (call[0], self.deadline))))
+            return results
+        finally:
+            # Don't wait for the calls past their deadline, they end by themselves
+            pool.close()
@@ -35,7 +35,11 @@ def cannot_get_bucket_mock(*args, **kwargs):
 
 
 class S3BucketMock(S3BaseMock):
-    pass
+
+    # Placeholder methods which will be mocked (but must be present anyway!)
+
+    def get_key(self, key_name):
+        pass
 
 
 class S3KeyMock(S3BaseMock):
@@ -196,6 +200,21 @@ class S3Test(TestCase):
         get_metadata_mock.assert_called_once_with(self.metadata_key)
         self.check_manager(manager)
 
+    @mock.patch('integrations.tests.test_s3.S3KeyMock.get_metadata')
+    def test_s3_manager_read_metadata(self, get_metadata_mock):
+        manager = self.create_manager()
+        with mock.patch('integrations.tests.test_s3.S3BucketMock.get_key',
+                        return_value=S3KeyMock()) as get_key_mock:
+            manager.read_metadata(self.key_name,
+                                  self.metadata_key)
+            get_key_mock.assert_called_once_with(self.key_name)
+        get_metadata_mock.assert_called_once_with(self.metadata_key)
+
+        # No such key in the bucket
+        self.assertIsNone(manager.read_metadata(self.key_name,
+                                                self.metadata_key))
+        self.check_manager(manager)
+
     def test_ssl_s3url(self):
         # Subdomain calling format
         self.assertEqual('https://bucket.s3.amazonaws.com/filename',
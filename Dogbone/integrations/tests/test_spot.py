@@ -0,0 +1,165 @@
+import json
+import time
+import socket
+import threading
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from django.test import SimpleTestCase
+from requests.exceptions import Timeout
+from integrations.spot import SpotAPI
+
+
+class StubSpotHandler(BaseHTTPRequestHandler):
+    """ Mimics the Spot publish API: /publish/ping/ and /publish/<uuid>/predict/ """
+
+    protocol_version = 'HTTP/1.1'
+    delays = {'slow': 2.}
+    # The trickling experiments send their reply a chunk at a time, each one
+    # well within the read timeout, but all of them well past the deadline
+    trickles = {'trickle': (8, .5)}
+    # The fast experiments only reply once they are all in flight at once
+    fast_experiments = ('fast1', 'fast2', 'fast3')
+
+    condition = threading.Condition()
+    arrived = set()
+    in_flight = set()
+    max_in_flight = 0
+
+    @classmethod
+    def reset(cls):
+        cls.arrived = set()
+        cls.in_flight = set()
+        cls.max_in_flight = 0
+
+    def _reply(self, status, data):
+        body = json.dumps(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.headers.get('X-Access-Token') != 'token':
+            return self._reply(403, {'detail': 'Forbidden'})
+        self._reply(200, {'pong': True})
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        experiment_uuid = self.path.strip('/').split('/')[-2]
+        if experiment_uuid == 'missing':
+            return self._reply(404, {'detail': 'Not found'})
+
+        cls = self.__class__
+        with cls.condition:
+            cls.arrived.add(experiment_uuid)
+            cls.in_flight.add(experiment_uuid)
+            cls.max_in_flight = max(cls.max_in_flight, len(cls.in_flight))
+            cls.condition.notify_all()
+            if experiment_uuid in cls.fast_experiments:
+                deadline = time.time() + 5
+                while not cls.arrived.issuperset(cls.fast_experiments) and time.time() < deadline:
+                    cls.condition.wait(deadline - time.time())
+        if experiment_uuid in self.trickles:
+            return self._trickle(experiment_uuid, *self.trickles[experiment_uuid])
+        time.sleep(self.delays.get(experiment_uuid, 0))
+        with cls.condition:
+            cls.in_flight.discard(experiment_uuid)
+
+        self._reply(200, {'predictions': ['fast' in s for s in data['samples']],
+                          'experiment': {'uuid': experiment_uuid, 'name': experiment_uuid}})
+
+    def _trickle(self, experiment_uuid, chunks, delay):
+        body = json.dumps({'predictions': [], 'experiment': {'uuid': experiment_uuid,
+                                                             'name': experiment_uuid}})
+        body += ' ' * max(chunks - len(body), 0)
+        size = len(body) // chunks + 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            for i in range(0, len(body), size):
+                self.wfile.write(body[i:i + size])
+                self.wfile.flush()
+                time.sleep(delay)
+        except socket.error:
+            pass
+        finally:
+            with self.condition:
+                self.in_flight.discard(experiment_uuid)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSpotServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SpotAPITest(SimpleTestCase):
+
+    def setUp(self):
+        StubSpotHandler.reset()
+        self.server = StubSpotServer(('127.0.0.1', 0), StubSpotHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%s/api/v1' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_ping(self):
+        self.assertTrue(SpotAPI(self.base_url, 'token').ping())
+        self.assertFalse(SpotAPI(self.base_url, 'wrong token').ping())
+
+    def test_predict_many(self):
+        spot_api = SpotAPI(self.base_url, 'token', timeout=(1, 1), concurrency=4)
+        experiments = ['fast1', 'missing', 'slow', 'fast2', 'fast3']
+        results = spot_api.predict_many(experiments, 'tag', ['fast sample', 'other sample'])
+
+        self.assertEqual([r[0] for r in results], experiments)
+
+        # Each fast experiment only got its reply (before timing out) because
+        # the other ones were requested at the same time
+        for experiment_uuid in StubSpotHandler.fast_experiments:
+            _, response, error = results[experiments.index(experiment_uuid)]
+            self.assertIsNone(error)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['predictions'], [True, False])
+
+        self.assertEqual(results[1][1].status_code, 404)
+
+        # The slow experiment times out without holding back the other ones
+        _, response, error = results[2]
+        self.assertIsNone(response)
+        self.assertIsInstance(error, Timeout)
+
+        # But never more requests at once than the concurrency of the API
+        self.assertGreaterEqual(StubSpotHandler.max_in_flight, 3)
+        self.assertLessEqual(StubSpotHandler.max_in_flight, 4)
+
+    def test_predict_many_deadline(self):
+        spot_api = SpotAPI(self.base_url, 'token', timeout=(1, 1), deadline=2, concurrency=4)
+        experiments = ['fast1', 'trickle', 'fast2', 'fast3']
+
+        start = time.time()
+        results = spot_api.predict_many(experiments, 'tag', ['fast sample'])
+        elapsed = time.time() - start
+
+        # The trickling experiment never hits the read timeout, but still
+        # fails by itself once past its deadline
+        _, response, error = results[1]
+        self.assertIsNone(response)
+        self.assertIsInstance(error, Timeout)
+
+        for experiment_uuid in StubSpotHandler.fast_experiments:
+            _, response, error = results[experiments.index(experiment_uuid)]
+            self.assertIsNone(error)
+            self.assertEqual(response.json()['predictions'], [True])
+
+        # Without delaying the other ones past the deadline
+        self.assertLess(elapsed, 3)
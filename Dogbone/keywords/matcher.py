@@ -0,0 +1,148 @@
+import threading
+
+from collections import OrderedDict, deque
+from nltk import word_tokenize
+
+
+# The maximum number of compiled keyword sets kept in memory by a process
+MATCHERS_CACHE_SIZE = 256
+
+# With fewer keywords than this, looking for each of them with `in` (a scan of
+# the text in C) is faster than stepping through the automaton in Python
+AUTOMATON_MIN_KEYWORDS = 100
+
+
+class KeywordMatcher(object):
+    """
+    Matches a whole set of keywords against a text at once.
+
+    Large keyword sets are compiled into an Aho-Corasick automaton, so they
+    are matched in a single pass over the text, whose cost doesn't depend on
+    the number of keywords. Small ones (under AUTOMATON_MIN_KEYWORDS) are just
+    looked up one by one with `in`, which is faster for a handful of keywords.
+    Matching is equivalent to calling `SearchKeyword.matches` for
+    each keyword: the text is lowercased, a regular keyword matches any
+    substring and an exact_match keyword must be one of the text's tokens
+    (the text only gets tokenized if such a keyword occurs as a substring).
+    """
+
+    def __init__(self, keywords):
+        """
+        :param keywords: a list of (keyword, exact_match) pairs,
+                         the keywords being already standardized
+        """
+        self.keywords = []
+        self.exact = set()
+        # Regular keywords that match any text
+        self._empty = set()
+
+        # Aho-Corasick automaton: transitions, failure links and outputs
+        # (None when the keywords are looked up one by one)
+        self._goto = None
+        self._fail = None
+        self._out = None
+
+        for keyword, exact_match in keywords:
+            idx = len(self.keywords)
+            self.keywords.append(keyword)
+            if exact_match:
+                self.exact.add(idx)
+            if not keyword and not exact_match:
+                self._empty.add(idx)
+
+        if len(self.keywords) >= AUTOMATON_MIN_KEYWORDS:
+            self._goto = [{}]
+            self._fail = [0]
+            self._out = [set()]
+            for idx, keyword in enumerate(self.keywords):
+                if keyword:
+                    self._insert(keyword, idx)
+            self._build_failure_links()
+
+    def _insert(self, keyword, idx):
+        state = 0
+        for ch in keyword:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._out[state].add(idx)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                # Also report the keywords ending at the fallback state
+                self._out[next_state] |= self._out[self._fail[next_state]]
+
+    def find(self, text):
+        """
+        Returns the list of keywords found in :text
+        (in the same order they were given to the matcher)
+        """
+        standard_text = text.lower()
+
+        if self._goto is None:
+            found = set(idx for idx, keyword in enumerate(self.keywords)
+                        if keyword and keyword in standard_text)
+            found |= self._empty
+        else:
+            found = self._find_with_automaton(standard_text)
+
+        exact_found = found & self.exact
+        if exact_found:
+            tokens = set(word_tokenize(standard_text.strip()))
+            found -= set(idx for idx in exact_found
+                         if self.keywords[idx] not in tokens)
+
+        return [self.keywords[idx] for idx in sorted(found)]
+
+    def _find_with_automaton(self, standard_text):
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        found = set(self._empty)
+        state = 0
+        for ch in standard_text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+
+        return found
+
+
+_matchers_cache = OrderedDict()
+_matchers_cache_lock = threading.Lock()
+
+
+def get_keyword_matcher(keywords):
+    """
+    Returns a KeywordMatcher for a list of `SearchKeyword` models.
+    The compiled matchers are cached per process by the keywords themselves,
+    so a matcher is only rebuilt when the set of keywords changes.
+    """
+    key = tuple((kw.keyword, kw.exact_match) for kw in keywords)
+
+    with _matchers_cache_lock:
+        matcher = _matchers_cache.pop(key, None)
+        if matcher is None:
+            matcher = KeywordMatcher(key)
+        # Mark as the most recently used
+        _matchers_cache[key] = matcher
+        while len(_matchers_cache) > MATCHERS_CACHE_SIZE:
+            _matchers_cache.popitem(last=False)
+
+    return matcher
@@ -0,0 +1,64 @@
+import mock
+
+from django.test import SimpleTestCase
+
+from keywords.matcher import KeywordMatcher, get_keyword_matcher
+from keywords.models import SearchKeyword
+
+
+class KeywordMatcherTestCase(SimpleTestCase):
+
+    SENTENCES = [
+        'This is a test with an interesting keyword inside',
+        'This is a test with FuNKy-WriTTen keyword inside',
+        'This is a test with an interestingly keyword inside',
+        'The Recipient shall not disclose the Confidential Information.',
+        '',
+    ]
+
+    KEYWORDS = [
+        ('interesting', False),
+        ('interest', True),
+        ('interesting', True),
+        ('funky-written', True),
+        ('confidential information', False),
+        ('test with', False),
+        ('st wi', False),
+        ('not-interesting', False),
+    ]
+
+    def test_find_all_overlapping(self):
+        """
+        Checking that all the keywords are reported, even when they overlap
+        """
+        keywords = [('he', False), ('she', False), ('his', False), ('hers', False)]
+        self.assertEqual(KeywordMatcher(keywords).find('ushers'), ['he', 'she', 'hers'])
+
+        with mock.patch('keywords.matcher.AUTOMATON_MIN_KEYWORDS', 0):
+            self.assertEqual(KeywordMatcher(keywords).find('ushers'), ['he', 'she', 'hers'])
+
+    def test_find_same_as_matches(self):
+        """
+        Checking that the matcher agrees with `SearchKeyword.matches`
+        """
+        keywords = [SearchKeyword(keyword=kw, exact_match=exact)
+                    for kw, exact in self.KEYWORDS]
+        matcher = KeywordMatcher(self.KEYWORDS)
+        with mock.patch('keywords.matcher.AUTOMATON_MIN_KEYWORDS', 0):
+            automaton = KeywordMatcher(self.KEYWORDS)
+        for sentence in self.SENTENCES:
+            expected = [kw.keyword for kw in keywords if kw.matches(sentence)]
+            self.assertEqual(matcher.find(sentence), expected)
+            self.assertEqual(automaton.find(sentence), expected)
+
+    def test_matcher_cached(self):
+        """
+        Checking that a matcher is only rebuilt when the keywords change
+        """
+        keywords = [SearchKeyword(keyword=kw, exact_match=exact)
+                    for kw, exact in self.KEYWORDS]
+        matcher = get_keyword_matcher(keywords)
+        self.assertIs(get_keyword_matcher(list(keywords)), matcher)
+
+        keywords[0].exact_match = True
+        self.assertIsNot(get_keyword_matcher(keywords), matcher)
@@ -93,31 +93,85 @@ class TagLearner:
         scores = self.decision_score(X_text, X_flags)
         return (scores > 0)
 
+    @staticmethod
+    def _ensemble_confidences(has_offline, has_online):
+        """ Returns the weights of the offline and online models' scores """
+        offline_confidence = 0.6 if has_offline else 0.
+        online_confidence = 0.4 if has_online else 0.
+
+        # Normalize confidence ratios
+        offline_confidence /= (offline_confidence + online_confidence) or .000001
+        online_confidence /= (offline_confidence + online_confidence) or .000001
+
+        return offline_confidence, online_confidence
+
     def decision_score(self, X_text, X_flags):
         """ Returns the decision function scores """
         # Include both online and offline models
         offline_pred = np.array([0.] * len(X_text))
         online_pred = np.array([0.] * len(X_text))
-        offline_confidence = 0.
-        online_confidence = 0.
 
         if self.global_model:
             X_offline = self.offline_vectorizer.transform(self.meta.tag, X_text, X_flags)
             offline_pred = self.global_model.decision_function(X_offline)
-            offline_confidence = 0.6
 
         if self.model:
             X = self.online_vectorizer.transform(self.meta.tag, X_text, X_flags)
             online_pred = self.model.decision_function(X)
-            online_confidence = 0.4
 
-        # Normalize confidence ratios
-        offline_confidence /= (offline_confidence + online_confidence) or .000001
-        online_confidence /= (offline_confidence + online_confidence) or .000001
+        offline_confidence, online_confidence = self._ensemble_confidences(
+            bool(self.global_model), bool(self.model)
+        )
 
         scores = offline_confidence * offline_pred + online_confidence * online_pred
         return scores
 
+    @classmethod
+    def batch_decision_scores(cls, learners, X_text, X_flags):
+        """
+        Returns the decision function scores of several TagLearners at once,
+        as a matrix of shape (len(X_text), len(learners)).
+
+        The online vectorizers are stateless (hashing), so the texts get
+        vectorized only once per vectorizer configuration, and the scores of
+        all the online models are computed as a single product with their
+        stacked coefficients. The offline models still use their own
+        (per tag) vectorizers.
+        """
+        offline_pred = np.zeros((len(X_text), len(learners)))
+        online_pred = np.zeros((len(X_text), len(learners)))
+        offline_confidences = np.zeros(len(learners))
+        online_confidences = np.zeros(len(learners))
+
+        if not X_text:
+            return offline_pred
+
+        # Group the online models by the configuration of their vectorizers
+        online_groups = {}
+        for j, learner in enumerate(learners):
+            if learner.model:
+                vec = learner.online_vectorizer
+                config = (tuple(vec.flags or []), vec.sparsevec.n_features)
+                online_groups.setdefault(config, []).append(j)
+
+        for idxs in online_groups.values():
+            vec = learners[idxs[0]].online_vectorizer
+            X = vec.transform(None, X_text, X_flags).tocsr()
+            coefs = np.vstack([learners[j].model.coef_ for j in idxs])
+            intercepts = np.hstack([learners[j].model.intercept_ for j in idxs])
+            online_pred[:, idxs] = np.asarray(X.dot(coefs.T)) + intercepts
+
+        for j, learner in enumerate(learners):
+            if learner.global_model:
+                X_offline = learner.offline_vectorizer.transform(learner.meta.tag, X_text, X_flags)
+                offline_pred[:, j] = learner.global_model.decision_function(X_offline)
+
+            offline_confidences[j], online_confidences[j] = cls._ensemble_confidences(
+                bool(learner.global_model), bool(learner.model)
+            )
+
+        return offline_confidences * offline_pred + online_confidences * online_pred
+
     def load_online_model(self):
         self.model = self.meta.load_ml_model()
         if self.model is not None:
@@ -273,6 +273,51 @@ class LearnerFacade:
                 flags = [nsc.flags for nsc in neg_capsules]
                 self._fit_samples(texts, flags, [False] * len(texts), infered=True)
 
+    @staticmethod
+    def _preprocess_capsules(capsules):
+        """
+        Masks the party names in a list of ml.capsules.Capsule objects.
+        Returns the list of masked texts and the list of lists of flags.
+        """
+        logging.info('Preprocessing %s sentences' % len(capsules))
+        if capsules:
+            # Generate the party mask regexs only once
+            parties = capsules[0].parties
+            if parties:
+                yparty = parties['you']
+                tparty = parties['them']
+                you_party = party_pattern(yparty)
+                them_party = party_pattern(tparty)
+
+                pmasked_text = [sc.preprocess(you_party=you_party, them_party=them_party) for sc in capsules]
+            else:
+                pmasked_text = [sc.text for sc in capsules]
+            flags = [sc.flags for sc in capsules]
+        else:
+            pmasked_text = []
+            flags = []
+
+        logging.info('Preprocessed %s sentences' % len(capsules))
+        return pmasked_text, flags
+
+    @classmethod
+    def predict_many(cls, facades, capsules):
+        """
+        Same as `predict` (without attributes), but applies several learners
+        to the same list of ml.capsules.Capsule objects at once: the capsules
+        are preprocessed and vectorized only once for all of them.
+
+        Returns a list of numpy arrays of predictions (True/False),
+        one for each facade from :facades.
+        """
+        pmasked_text, flags = cls._preprocess_capsules(capsules)
+
+        logging.info('Predicting tags with %s models' % len(facades))
+        scores = TagLearner.batch_decision_scores(
+            [fcd.ml_model for fcd in facades], pmasked_text, flags
+        )
+        return [scores[:, j] > 0 for j in range(len(facades))]
+
     def predict(self, capsules, include_attributes=False):
         """
         Takes a list of ml.capsules.Capsule objects and predicts labels.
@@ -296,25 +341,8 @@ class LearnerFacade:
                 }
             ]
         """
-        logging.info('Preprocessing %s sentences' % len(capsules))
-        if capsules:
-            # Generate the party mask regexs only once
-            parties = capsules[0].parties
-            if parties:
-                yparty = parties['you']
-                tparty = parties['them']
-                you_party = party_pattern(yparty)
-                them_party = party_pattern(tparty)
+        pmasked_text, flags = self._preprocess_capsules(capsules)
 
-                pmasked_text = [sc.preprocess(you_party=you_party, them_party=them_party) for sc in capsules]
-            else:
-                pmasked_text = [sc.text for sc in capsules]
-            flags = [sc.flags for sc in capsules]
-        else:
-            pmasked_text = []
-            flags = []
-
-        logging.info('Preprocessed %s sentences' % len(capsules))
         logging.info('Predicting tags with model: %s - type=%s' % (self.db_model, type(self.db_model)))
         pred = self.ml_model.predict(pmasked_text, flags)
         ptcomp = self.get_pretrained_component()
@@ -3,6 +3,7 @@ import uuid
 import logging
 import jsonfield
 import StringIO
+import threading
 import cPickle as pickle
 
 from collections import OrderedDict
@@ -18,6 +19,53 @@ from .exceptions import ModelNotFoundException
 from sklearn.linear_model import PassiveAggressiveClassifier, LogisticRegression
 
 
+# The maximum number of online models kept in memory by a single worker process
+ONLINE_MODELS_CACHE_SIZE = 1000
+
+
+class OnlineModelsCache(object):
+    """
+    Process-wide LRU cache of the online models' parameters (coef_, intercept_,
+    classes_), keyed by (model_uuid, model_version).
+
+    Since the version of a model gets bumped every time the model is saved to
+    S3, a stale entry can never be hit, neither in the current process nor in
+    any other one. Saving a model also discards all the local entries for it.
+    """
+
+    def __init__(self, max_size=ONLINE_MODELS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model_uuid, model_version):
+        key = (model_uuid, model_version)
+        with self._lock:
+            params = self._entries.pop(key, None)
+            if params is not None:
+                # Mark as the most recently used
+                self._entries[key] = params
+            return params
+
+    def set(self, model_uuid, model_version, params):
+        with self._lock:
+            self._entries[(model_uuid, model_version)] = params
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, model_uuid):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_uuid]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+ONLINE_MODELS_CACHE = OnlineModelsCache()
+
+
 class OnlineLearner(TimeStampedModel):
     # UUID used to identify the stored model
     model_uuid = models.CharField('Model UUID', max_length=100, unique=True)
@@ -50,6 +98,9 @@ class OnlineLearner(TimeStampedModel):
     # Highlight color
     color_code = models.CharField(default="#f9f6fb", max_length=7)
 
+    # Incremented on each save of the ML model (used for cache invalidation)
+    model_version = models.PositiveIntegerField(default=0)
+
     @classmethod
     def init_ml_model(cls):
         """
@@ -122,24 +173,35 @@ class OnlineLearner(TimeStampedModel):
         """
         Loads the pickled machine learning model
         from the S3 location stored internally in the Django model
+        (or from the process-wide cache, if the current version is there)
         :return: the machine learning model
         """
-        manager = get_s3_bucket_manager(settings.PREDICTION_MODELS_BUCKET)
-        serialized_model = manager.read_to_string(self.model_s3.split(':')[1])
+        model_params = ONLINE_MODELS_CACHE.get(self.model_uuid,
+                                               self.model_version)
 
-        temp_file = StringIO.StringIO()
-        temp_file.write(serialized_model)
-        temp_file.seek(0)
+        if model_params is None:
+            manager = get_s3_bucket_manager(settings.PREDICTION_MODELS_BUCKET)
+            serialized_model = manager.read_to_string(self.model_s3.split(':')[1])
+
+            temp_file = StringIO.StringIO()
+            temp_file.write(serialized_model)
+            temp_file.seek(0)
+
+            try:
+                model_params = pickle.load(temp_file)
+            except EOFError:
+                logging.warning('S3 path is incorrect: %s or we were just looking for a pre-trained classifier'
+                                % self.model_s3.split(':')[1])
+                raise ModelNotFoundException("S3 path is incorrect")
 
-        try:
-            model_params = pickle.load(temp_file)
-        except EOFError:
-            logging.warning('S3 path is incorrect: %s or we were just looking for a pre-trained classifier'
-                            % self.model_s3.split(':')[1])
-            raise ModelNotFoundException("S3 path is incorrect")
+            ONLINE_MODELS_CACHE.set(self.model_uuid, self.model_version,
+                                    model_params)
 
+        # Copy the parameters, so that (re)training the returned model
+        # can't alter the cached ones
         ml_model = self.init_ml_model()
-        ml_model.coef_, ml_model.intercept_, ml_model.classes_ = model_params
+        ml_model.coef_, ml_model.intercept_, ml_model.classes_ = \
+            [param.copy() for param in model_params]
 
         return ml_model
 
@@ -158,6 +220,13 @@ class OnlineLearner(TimeStampedModel):
         temp_file.seek(0)
         manager.save_string(self.model_s3.split(':')[1], temp_file.read())
 
+        # Bump the version, so that no process uses its cached copy anymore
+        # (atomically, since this instance might be stale)
+        learners = OnlineLearner.objects.filter(pk=self.pk)
+        learners.update(model_version=models.F('model_version') + 1)
+        self.model_version = learners.values_list('model_version', flat=True)[0]
+        ONLINE_MODELS_CACHE.discard(self.model_uuid)
+
     def save(self, *args, **kwargs):
         """ Auto generate an unique ID """
         if not self.model_uuid:
@@ -170,6 +239,15 @@ class OnlineLearner(TimeStampedModel):
         if not self.samples:
             self.samples = None
 
+        # The version is only ever bumped by `save_ml_model`, so don't write
+        # back a possibly stale copy of it (which would roll back a bump made
+        # by a concurrent trainer). A new learner (even with an explicit pk)
+        # gets inserted with all its fields.
+        if not self._state.adding and not kwargs.get('force_insert') and \
+                kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'model_version']
+
         return super(OnlineLearner, self).save(*args, **kwargs)
 
     def __unicode__(self):
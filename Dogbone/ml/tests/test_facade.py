@@ -1,10 +1,11 @@
 import tempfile
 
 import mock
+import numpy as np
 
 from dogbone.testing.base import BeagleWebTest
 from ml.capsules import Capsule
-from ml.clfs import LearnerAttributeClassifier
+from ml.clfs import LearnerAttributeClassifier, TagLearner
 from ml.facade import LearnerFacade
 from ml.models import PretrainedLearner, LearnerAttribute
 
@@ -104,3 +105,31 @@ class LearnerFacadeTestCase(BeagleWebTest):
                                 ],
                                 'label': False
                            }])
+
+    def test_predict_many_matches_predict(self):
+        LearnerFacade.get_or_create(tag='tag_offline')
+        offline = LearnerFacade.get_or_create('tag_offline', self.user)
+        offline.ml_model.prefit(self.data, [[]] * 6, [True] * 3 + [False] * 3)
+
+        online = LearnerFacade.get_or_create('tag_online', self.user)
+        online.ml_model.fit(self.data, [[]] * 6, [False, True] * 3)
+
+        both = LearnerFacade.get_or_create('tag_both', self.user)
+        both.ml_model.prefit(self.data, [[]] * 6, [False] * 3 + [True] * 3)
+        both.ml_model.fit(self.data, [['LIABILITY']] * 6, [True, False] * 3)
+
+        facades = [offline, online, both]
+        capsules = [Capsule(text, i) for i, text in enumerate(self.data)]
+        capsules.append(Capsule('Some unseen sample', flags=['TERMINATION']))
+
+        texts = [c.text for c in capsules]
+        flags = [c.flags for c in capsules]
+        scores = TagLearner.batch_decision_scores(
+            [fcd.ml_model for fcd in facades], texts, flags
+        )
+        for j, fcd in enumerate(facades):
+            np.testing.assert_allclose(scores[:, j],
+                                       fcd.ml_model.decision_score(texts, flags))
+
+        for fcd, preds in zip(facades, LearnerFacade.predict_many(facades, capsules)):
+            self.assertEqual(list(preds), list(fcd.predict(capsules)))
@@ -3,6 +3,7 @@ import unittest
 from time import time
 
 from django.conf import settings
+from django.db.models import Max
 import numpy as np
 from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn import metrics
@@ -497,3 +498,81 @@ class OnlineLearnerTest(BeagleWebTest):
         # Enable patching again
         self.load_models_patcher.start()
         self.save_online_model_patcher.start()
+
+    def test_ml_model_cached_until_saved(self):
+        """
+        Checks that a classifier's parameters are read from S3 only once
+        per model version, and that retraining invalidates the cached copy.
+        """
+        db_model = OnlineLearner(tag='cachedtag', owner=self.user)
+        db_model.save()
+
+        model_s3_path = 'online_learners/model_%s.pkl' % db_model.model_uuid
+
+        sentences = ['Aaaa Aaaa', 'Bbbb Bbbb', 'Cccc Cccc', 'Dddd Dddd']
+        doc = self.create_analysed_document('original_filename', sentences, self.user)
+        s1 = Sentence.objects.get(pk=doc.sentences_pks[0])
+        s2 = Sentence.objects.get(pk=doc.sentences_pks[1])
+        s3 = Sentence.objects.get(pk=doc.sentences_pks[2])
+
+        # Temporarily disable patching
+        self.save_online_model_patcher.stop()
+        self.load_models_patcher.stop()
+
+        with mock.patch('ml.models.get_s3_bucket_manager',
+                        side_effect=S3BucketManagerMock):
+            onlinelearner_negative_train_task('cachedtag', self.user, s1, 0)
+            onlinelearner_train_task('cachedtag', self.user, s2, 1)
+
+            with mock.patch('ml.tests.test_online_learners.S3BucketManagerMock.read_to_string',
+                            side_effect=S3BucketManagerMock.read_to_string) as s3_load_mock:
+                LearnerFacade.get_or_create('cachedtag', self.user)
+                LearnerFacade.get_or_create('cachedtag', self.user)
+                s3_load_mock.assert_called_once_with(model_s3_path)
+
+            onlinelearner_train_task('cachedtag', self.user, s3, 2)
+
+            with mock.patch('ml.tests.test_online_learners.S3BucketManagerMock.read_to_string',
+                            side_effect=S3BucketManagerMock.read_to_string) as s3_load_mock:
+                facade = LearnerFacade.get_or_create('cachedtag', self.user)
+                s3_load_mock.assert_called_once_with(model_s3_path)
+                self.assertEqual(facade.db_model.model_version,
+                                 OnlineLearner.objects.get(pk=db_model.pk).model_version)
+
+        # Enable patching again
+        self.load_models_patcher.start()
+        self.save_online_model_patcher.start()
+
+    def test_model_version_not_rolled_back(self):
+        """
+        Checks that saving a stale copy of a learner doesn't roll back
+        the version bumped meanwhile by another trainer.
+        """
+        db_model = OnlineLearner(tag='versionedtag', owner=self.user)
+        db_model.save()
+        stale = OnlineLearner.objects.get(pk=db_model.pk)
+
+        with mock.patch('ml.models.get_s3_bucket_manager',
+                        side_effect=S3BucketManagerMock):
+            db_model.save_ml_model(db_model.init_ml_model().fit([[0], [1]], [False, True]))
+
+        self.assertEqual(db_model.model_version, 1)
+
+        stale.positive_set_size = 3
+        stale.save()
+
+        reloaded = OnlineLearner.objects.get(pk=db_model.pk)
+        self.assertEqual(reloaded.model_version, 1)
+        self.assertEqual(reloaded.positive_set_size, 3)
+
+    def test_new_learner_with_explicit_pk(self):
+        """
+        Checks that a new learner with an explicit pk still gets inserted.
+        """
+        pk = (OnlineLearner.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+        db_model = OnlineLearner(pk=pk, tag='explicitpk', owner=self.user, model_version=2)
+        db_model.save()
+
+        reloaded = OnlineLearner.objects.get(pk=pk)
+        self.assertEqual(reloaded.tag, 'explicitpk')
+        self.assertEqual(reloaded.model_version, 2)
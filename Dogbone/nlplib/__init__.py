@@ -38,8 +38,15 @@ def doclevel_process(text=None, sentences=None):
 
 
 # TODO: Move this inside facade, that's the purpose of facade, to hide complexity
-def sentlevel_process(text=None, sentences=None, parties=None, user=None):
-    facade = NlplibFacade(text=text, sentences=sentences, parties=parties)
+def sentlevel_process(text=None, sentences=None, parties=None, user=None, facade=None,
+                      processes=None):
+    """
+    :param facade: an already initialized facade, used instead of the text,
+        sentences and parties (e.g. one analysing only some of the sentences)
+    :param processes: if greater than 1, the analyzers run in that many processes
+    """
+    if facade is None:
+        facade = NlplibFacade(text=text, sentences=sentences, parties=parties)
 
     them_party, you_party, confidence = facade.parties
 
@@ -52,25 +59,21 @@ def sentlevel_process(text=None, sentences=None, parties=None, user=None):
     # Everything should be enabled by default (unless explicitly disabled)
     rlte_flags = user.details.rlte_flags if user else {}
 
-    clauses = []
+    analyzers = [
+        ('RESPONSIBILITY', 'responsibilities'),
+        ('LIABILITY', 'liabilities'),
+        ('TERMINATION', 'terminations'),
+    ]
 
     # Run each of RLT analyzers (if enabled)
-    for party in party_translation_dict:
-        if rlte_flags.get('responsibilities', True):
-            resps = facade.responsibilities(party)
-            clauses.append(
-                ('RESPONSIBILITY', resps, party)
-            )
-        if rlte_flags.get('liabilities', True):
-            liabs = facade.liabilities(party)
-            clauses.append(
-                ('LIABILITY', liabs, party)
-            )
-        if rlte_flags.get('terminations', True):
-            terms = facade.terminations(party)
-            clauses.append(
-                ('TERMINATION', terms, party)
-            )
+    tasks = [(label, name, party)
+             for party in party_translation_dict
+             for label, name in analyzers
+             if rlte_flags.get(name, True)]
+    results = facade.run_analyzers([(name, party) for _, name, party in tasks],
+                                   processes=processes)
+    clauses = [(label, index, party)
+               for (label, _, party), index in zip(tasks, results)]
 
     analysis = {'sentences': [{'form': s, 'idx': i}
                               for i, s in enumerate(facade.processed_text)]}
@@ -154,31 +154,54 @@ class MentionCluster:
         return self.__str__()
 
 
+def mention_indicators(parsed_sentence):
+    """ The mentions (or links between them) found in a sentence parsed by parse_mentions """
+    return [n[0] for n in extract_nodes(parsed_sentence, label='MENTION_INDICATOR')]
+
+
+def _mention(node):
+    return {'form': tree2str(node[0]), 'type': node[0].label()}
+
+
+def sentence_mentions(parsed_sentence):
+    """
+    The mentions a sentence parsed by parse_mentions starts the clusters with:
+    a list of the mentions of each cluster. Unlike the parsed sentence, they
+    can be serialized (e.g. kept for not parsing the same sentence again).
+    """
+    clusters = []
+    for indicator in mention_indicators(parsed_sentence):
+        if indicator.label() == 'MENTION_LINK':
+            groups = extract_nodes(indicator,
+                                   predicate=lambda n: n.label() in ['MENTION_APPOSITION', 'MENTION'])
+        else:
+            groups = [indicator]
+
+        for m in groups:
+            if m.label() == 'MENTION':
+                clusters.append([_mention(m)])
+            elif m.label() == 'MENTION_APPOSITION':
+                clusters.append([_mention(n) for n in extract_nodes(m, label='MENTION')])
+    return clusters
+
+
 class CoreferenceResolution:
-    def __init__(self, parsed_sentences, parties=None):
+    def __init__(self, parsed_sentences, parties=None, mentions=None):
+        """
+        :param mentions: the mentions of each of the sentences (see
+            sentence_mentions), if known, used instead of the parsed sentences
+        """
         self.parsed_sentences = parsed_sentences
-        self._indicators = None
+        self._mentions = mentions
         self.clusters = None
         self.parties = parties
 
     @property
-    def indicators(self):
-        if not self._indicators:
-            indicators = []
-            for ps in self.parsed_sentences:
-                indicators.extend([n[0] for n in extract_nodes(ps, label='MENTION_INDICATOR')])
-
-            self._indicators = indicators
-
-        return self._indicators
-
-    def _cluster_mention(self, m):
-        return [{'form': tree2str(m[0]), 'type': m[0].label(), 'id': IdGenerator.get('mention')}]
+    def mentions(self):
+        if self._mentions is None:
+            self._mentions = [sentence_mentions(ps) for ps in self.parsed_sentences]
 
-    def _cluster_apposition(self, mn):
-        mentions = extract_nodes(mn, label='MENTION')
-        return [{'form': tree2str(m[0]), 'type': m[0].label(), 'id': IdGenerator.get('mention')}
-                for m in mentions]
+        return self._mentions
 
     def _string_match_sieve(self):
         new_clusters = [self.clusters[0]]
@@ -289,21 +312,10 @@ class CoreferenceResolution:
             #     self.clusters[0].add_form('we')
             #     self.clusters[1].add_form('you')
 
-        for indicator in self.indicators:
-            if indicator.label() == 'MENTION_LINK':
-                mention_groups = extract_nodes(indicator,
-                                               predicate=lambda n: n.label() in ['MENTION_APPOSITION', 'MENTION'])
-
-                for m in mention_groups:
-                    if m.label() == 'MENTION':
-                        self.clusters.append(MentionCluster(self._cluster_mention(m)))
-                    elif m.label() == 'MENTION_APPOSITION':
-                        self.clusters.append(MentionCluster(self._cluster_apposition(m)))
-
-            elif indicator.label() == 'MENTION_APPOSITION':
-                self.clusters.append(MentionCluster(self._cluster_apposition(indicator)))
-            elif indicator.label() == 'MENTION':
-                self.clusters.append(MentionCluster(self._cluster_mention(indicator)))
+        for clusters in self.mentions:
+            for mentions in clusters:
+                self.clusters.append(MentionCluster([dict(m, id=IdGenerator.get('mention'))
+                                                     for m in mentions]))
 
     def resolute(self):
         self._init_clusters()
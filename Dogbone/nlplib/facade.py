@@ -1,4 +1,11 @@
-from nlplib.coreference import CoreferenceResolution
+import threading
+
+from billiard import Pool
+
+from nlplib import generics, prefilter, utils
+from nlplib.coreference import (
+    CoreferenceResolution, MentionCluster, mention_indicators, sentence_mentions,
+)
 from nlplib.partycounter import PartyCounterExtractor
 from nlplib.mention import parse_mentions
 from nlplib.references import ExternalReferencesAnalyzer
@@ -11,8 +18,35 @@ from nlplib.utils import (
 )
 
 
+# The facade whose analyzers are run by the forked processes, set right before
+# forking them, so the processes share its tagged sentences copy-on-write
+_forked_facade = None
+_forked_facade_lock = threading.Lock()
+
+
+def _init_forked_analyzer():
+    # Only the forking thread survives in the children, so a lock held by
+    # another thread at the time of the fork would never get released
+    generics._parsers_cache_lock = threading.Lock()
+    prefilter._prefilters_cache_lock = threading.Lock()
+    utils._wordtag_cache_lock = threading.Lock()
+
+
+def _run_forked_analyzer(task):
+    name, mention = task
+    return getattr(_forked_facade, name)(mention)
+
+
 class NlplibFacade:
-    def __init__(self, text=None, sentences=None, parties=None):
+    # The analyzer property used by each of the analyses
+    ANALYZERS = {
+        'liabilities': 'liabilities_analyzer',
+        'responsibilities': 'responsibilities_analyzer',
+        'terminations': 'termination_analyzer',
+    }
+
+    def __init__(self, text=None, sentences=None, parties=None, analysed_idxs=None,
+                 clusters_state=None, known_mentions=None):
         '''
         Lazy initializes the facade.
 
@@ -21,15 +55,36 @@ class NlplibFacade:
 
         Mostly for backwards compatibility, a facade can be initialized by
         either raw text or by a list of sentences.
+
+        If provided, @analysed_idxs are the indices of the only sentences the
+        analyzers run on. The others still make up the context (the mention
+        clusters), so the results are the same as for a full analysis. It can
+        be changed until the analyzers are first used.
+
+        If provided, @clusters_state are the clusters of parties/mentions
+        (see clusters_state) of the whole text the sentences are part of,
+        which are then not resolved from the sentences themselves.
+
+        If provided, @known_mentions map the indices of some of the sentences
+        to their mentions (see sentence_mentions), e.g. kept from the analysis
+        of another document with the same sentences. Unless analysed, those
+        sentences don't get word-tagged at all.
         '''
+        self.analysed_idxs = analysed_idxs
         self._rawsentences = sentences
         self._text = text
+        self._known_mentions = known_mentions or {}
+        self._wordtagged_by_idx = {}
         self._wordtagged = None
+        self._sentence_mentions = None
         self._preprocessed_sentences = None
         self._processed_text = None
         self._mention_clusters = None
         self._parsed_mentions = None
         self._clusters = None
+        if clusters_state is not None:
+            self._clusters = [MentionCluster([dict(m) for m in mentions])
+                              for mentions in clusters_state]
         self._parties = None
         if parties:
             self._parties = parties
@@ -48,8 +103,9 @@ class NlplibFacade:
             you_party = None
             if self._parties:
                 them_party, you_party, _ = self._parties
-            self._coreference_resolution = CoreferenceResolution(self.parsed_mentions,
-                                                                 parties=(them_party, you_party))
+            self._coreference_resolution = CoreferenceResolution(None,
+                                                                 parties=(them_party, you_party),
+                                                                 mentions=self.sentence_mentions)
 
         return self._coreference_resolution
 
@@ -68,7 +124,8 @@ class NlplibFacade:
             self._external_references_analyzer = ExternalReferencesAnalyzer(
                                                     self.text, self.sentences,
                                                     self.wordtagged,
-                                                    self.parties[:2])
+                                                    self.parties[:2],
+                                                    self.analysed_idxs)
 
         return self._external_references_analyzer
 
@@ -81,6 +138,7 @@ class NlplibFacade:
                 self.clusters,
                 them_party,
                 you_party,
+                self.analysed_idxs,
             )
 
         return self._liabilities_analyzer
@@ -94,6 +152,7 @@ class NlplibFacade:
                 self.clusters,
                 them_party,
                 you_party,
+                self.analysed_idxs,
             )
 
         return self._responsibilities_analyzer
@@ -107,6 +166,7 @@ class NlplibFacade:
                 self.clusters,
                 them_party,
                 you_party,
+                self.analysed_idxs,
             )
 
         return self._termination_analyzer
@@ -138,20 +198,54 @@ class NlplibFacade:
 
         return self._preprocessed_sentences
 
+    def _wordtag(self, idxs):
+        ''' Word-tags the sentences at @idxs (only once each) '''
+        missing = [idx for idx in idxs if idx not in self._wordtagged_by_idx]
+        if missing:
+            tagged = sents2wordtag([self.preprocessed_sentences[idx] for idx in missing])
+            self._wordtagged_by_idx.update(zip(missing, tagged))
+
+        return [self._wordtagged_by_idx[idx] for idx in idxs]
+
     @property
     def wordtagged(self):
+        '''
+        The word-tagged sentences, except for the ones whose mentions are known
+        and which are not analysed (None instead)
+        '''
         if self._wordtagged is None:
-            self._wordtagged = sents2wordtag(self.preprocessed_sentences)
+            idxs = [idx for idx in range(len(self.sentences))
+                    if idx not in self._known_mentions or
+                    self.analysed_idxs is None or idx in self.analysed_idxs]
+            tagged = dict(zip(idxs, self._wordtag(idxs)))
+            self._wordtagged = [tagged.get(idx) for idx in range(len(self.sentences))]
 
         return self._wordtagged
 
     @property
     def parsed_mentions(self):
         if self._parsed_mentions is None:
-            self._parsed_mentions = [parse_mentions(ss) for ss in self.wordtagged]
+            self._parsed_mentions = [parse_mentions(ss)
+                                     for ss in self._wordtag(range(len(self.sentences)))]
 
         return self._parsed_mentions
 
+    @property
+    def sentence_mentions(self):
+        '''
+        The mentions of each of the sentences, which the clusters are resolved
+        from (see sentence_mentions), in a serializable format
+        '''
+        if self._sentence_mentions is None:
+            idxs = [idx for idx in range(len(self.sentences)) if idx not in self._known_mentions]
+            found = dict((idx, sentence_mentions(parse_mentions(ss)))
+                         for idx, ss in zip(idxs, self._wordtag(idxs)))
+            self._sentence_mentions = [self._known_mentions[idx] if idx in self._known_mentions
+                                       else found[idx]
+                                       for idx in range(len(self.sentences))]
+
+        return self._sentence_mentions
+
     @property
     def clusters(self):
         ''' Clusters of parties/mentions '''
@@ -170,6 +264,24 @@ class NlplibFacade:
             self._parties = extractor.extract_parties()
         return self._parties
 
+    @property
+    def clusters_state(self):
+        '''
+        The clusters of parties/mentions (which the analyzers' grammars are
+        rendered from), in a comparable and serializable format, from which
+        they can also be restored
+        '''
+        return [[{'form': m['form'], 'type': m['type']} for m in c.mentions]
+                for c in self.clusters]
+
+    def mention_indicators(self, idx):
+        '''
+        The mentions found in a sentence, which the clusters are resolved
+        from (so the clusters don't change if the mentions of the sentences
+        don't), in a comparable format
+        '''
+        return mention_indicators(self.parsed_mentions[idx])
+
     @property
     def formated_clusters(self):
         ''' Formatted output for clusters of parties/mentions '''
@@ -202,28 +314,52 @@ class NlplibFacade:
     def terminations(self, mention):
         return self.termination_analyzer.readable_results(mention)
 
-    def run_all_analyzers(self, mention=None):
-        from itertools import chain
-
-        def run_analyzer(task):
-            name, analyzer, mention = task
-            return name, analyzer.readable_results(mention), mention
-
+    def run_analyzers(self, tasks, processes=None):
+        """
+        Runs the (analyzer, mention) tasks, e.g. ('liabilities', 'both'), and
+        returns their readable results (in the same order as the tasks).
+
+        With more than one process, the tasks run in a pool of forked processes
+        (the analyzers are pure functions of the tagged sentences, which are
+        computed beforehand and shared with the processes). It's a billiard
+        pool, which unlike a multiprocessing one can also be started from the
+        (daemonic) prefork Celery workers. The pool is only forked from the
+        main thread: a child forked from another thread (e.g. an analysis
+        stage) could deadlock on a lock held by any of the other threads.
+        """
+        global _forked_facade
+
+        if (not processes or processes <= 1 or len(tasks) <= 1 or
+                not isinstance(threading.current_thread(), threading._MainThread)):
+            return [getattr(self, name)(mention) for name, mention in tasks]
+
+        # Compute everything the analyzers share before forking
+        for name in set(name for name, _ in tasks):
+            getattr(self, self.ANALYZERS[name])
+
+        with _forked_facade_lock:
+            _forked_facade = self
+            try:
+                pool = Pool(processes=min(processes, len(tasks)),
+                            initializer=_init_forked_analyzer)
+            finally:
+                _forked_facade = None
+
+        try:
+            return pool.map(_run_forked_analyzer, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    def run_all_analyzers(self, mention=None, processes=None):
         if mention is None:
             them_party, you_party, _ = self.parties
-            tasks = list(chain(*[
-                [
-                    ('liabilities', self.liabilities_analyzer, mention),
-                    ('responsibilities', self.responsibilities_analyzer, mention),
-                    ('terminations', self.termination_analyzer, mention),
-                ]
-                for mention in ['both', them_party, you_party]
-            ]))
+            mentions = ['both', them_party, you_party]
         else:
-            tasks = [
-                ('liabilities', self.liabilities_analyzer, mention),
-                ('responsibilities', self.responsibilities_analyzer, mention),
-                ('terminations', self.termination_analyzer, mention),
-            ]
-        results = [run_analyzer(x) for x in tasks]
-        return results
+            mentions = [mention]
+
+        tasks = [(name, mention)
+                 for mention in mentions
+                 for name in ('liabilities', 'responsibilities', 'terminations')]
+        results = self.run_analyzers(tasks, processes=processes)
+        return [(name, result, mention) for (name, mention), result in zip(tasks, results)]
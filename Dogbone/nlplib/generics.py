@@ -1,3 +1,6 @@
+import threading
+
+from collections import OrderedDict
 from nltk import RegexpParser
 
 from django.template import Template, Context
@@ -5,16 +8,58 @@ from django.template import Template, Context
 from nlplib.coreference import mention2regex
 from nlplib.coreference import MentionCluster
 from nlplib.utils import extract_nodes
+from nlplib.prefilter import get_grammar_prefilter
 
 from .data import lazydict
 
 
+# The maximum number of compiled grammars kept in memory by a process
+PARSERS_CACHE_SIZE = 512
+
+_parsers_cache = OrderedDict()
+_parsers_cache_lock = threading.Lock()
+
+# Compiled templates of the analyzers' grammars
+_templates_cache = {}
+
+
+def get_regexp_parser(grammar):
+    """
+    Returns a RegexpParser for the :grammar text.
+    The parsers are cached per process by the grammar itself, so the same
+    grammar (e.g. rendered for a party called "Company") only gets compiled once.
+    """
+    with _parsers_cache_lock:
+        parser = _parsers_cache.pop(grammar, None)
+        if parser is not None:
+            # Mark as the most recently used
+            _parsers_cache[grammar] = parser
+            return parser
+
+    # Compile outside of the lock, so other grammars are not held back
+    parser = RegexpParser(grammar)
+
+    with _parsers_cache_lock:
+        _parsers_cache[grammar] = parser
+        while len(_parsers_cache) > PARSERS_CACHE_SIZE:
+            _parsers_cache.popitem(last=False)
+
+    return parser
+
+
 class GenericAnalyzer(object):
-    def __init__(self, wordtagged, mention_clusters, them_party, you_party):
+    def __init__(self, wordtagged, mention_clusters, them_party, you_party, analysed_idxs=None):
+        """
+        :param analysed_idxs: the indices of the sentences to be analysed (all
+            of them if None); the grammars are still rendered from the mention
+            clusters of the whole text, so the results for these sentences are
+            the same as if all the sentences were analysed
+        """
         super(GenericAnalyzer, self).__init__()
         self._wordtagged = wordtagged
         self._mention_clusters = mention_clusters
         self._results = None
+        self._analysed_idxs = set(analysed_idxs) if analysed_idxs is not None else None
         self.them_party = them_party
         self.you_party = you_party
 
@@ -37,22 +82,41 @@ class GenericAnalyzer(object):
 
     def render_grammar(self, mention_cluster, both=False):
         pm = [mention2regex(m) for m in mention_cluster.all_forms()]
-        t = Template(self._analyzer_grammar)
+        t = _templates_cache.get(self._analyzer_grammar)
+        if t is None:
+            t = _templates_cache[self._analyzer_grammar] = Template(self._analyzer_grammar)
         c = Context({'party_mentions': pm, 'both': both})
         return t.render(c)
 
+    def _prefilter(self, both=False):
+        """
+        The cheap test telling which sentences might contain any of the result
+        types, derived from the analyzer's grammar (None if it can't be derived)
+        """
+        return get_grammar_prefilter(self._analyzer_grammar, self._result_types, both)
+
+    @staticmethod
+    def _parse(parser, prefilter, wt_sent):
+        """ Returns None for the sentences not worth parsing """
+        if prefilter is not None and not prefilter.matches(wt_sent):
+            return None
+        return parser.parse(wt_sent)
+
+    def _parse_all(self, parser, prefilter):
+        """ Returns None for the sentences not analysed or not worth parsing """
+        return [self._parse(parser, prefilter, wt_sent)
+                if self._analysed_idxs is None or idx in self._analysed_idxs else None
+                for idx, wt_sent in enumerate(self.wordtagged)]
+
     def _extract(self, mention_cluster):
         grammar = self.render_grammar(mention_cluster)
-        parser = RegexpParser(grammar)
-        parsed_sents = []
+        parser = get_regexp_parser(grammar)
+        prefilter = self._prefilter()
 
         # with open('term.out', 'w') as fout:
         #     fout.write(grammar)
 
-        for wt_sent in self.wordtagged:
-            parsed_sents.append(parser.parse(wt_sent))
-
-        return parsed_sents
+        return self._parse_all(parser, prefilter)
 
     def _extract_both(self):
         all_parties_cluster = MentionCluster([])
@@ -71,19 +135,18 @@ class GenericAnalyzer(object):
             all_parties_cluster.merge(MentionCluster([{'form': self.you_party, 'type': 'ENTITY_MENTION'}]))
 
         grammar = self.render_grammar(all_parties_cluster, both=True)
-        parser = RegexpParser(grammar)
-        parsed_sents = []
-
-        for wt_sent in self.wordtagged:
-            parsed_sents.append(parser.parse(wt_sent))
+        parser = get_regexp_parser(grammar)
+        prefilter = self._prefilter(both=True)
 
-        return parsed_sents
+        return self._parse_all(parser, prefilter)
 
     def _process(self, mention_cluster):
         parsed = self._extract(mention_cluster)
         l_results = []
 
         for idx, p_sent in enumerate(parsed):
+            if p_sent is None:
+                continue
             found_nodes = extract_nodes(p_sent, predicate=lambda node: node.label() in self._result_types)
             if found_nodes:
                 for fn in found_nodes:
@@ -100,6 +163,8 @@ class GenericAnalyzer(object):
         l_results = []
 
         for idx, p_sent in enumerate(parsed):
+            if p_sent is None:
+                continue
             found_nodes = extract_nodes(p_sent, predicate=lambda node: node.label() in self._result_types)
             if found_nodes:
                 for fn in found_nodes:
@@ -3,8 +3,8 @@ from nlplib.grammars import LIABILITIES_GRAMMAR, LIABILITIES_TYPES
 
 
 class LiabilityAnalyzer(GenericAnalyzer):
-    def __init__(self, wordtagged, mention_clusters, them_party, you_party):
-        super(LiabilityAnalyzer, self).__init__(wordtagged, mention_clusters, them_party, you_party)
+    def __init__(self, wordtagged, mention_clusters, them_party, you_party, analysed_idxs=None):
+        super(LiabilityAnalyzer, self).__init__(wordtagged, mention_clusters, them_party, you_party, analysed_idxs)
 
     @property
     def _analyzer_grammar(self):
@@ -0,0 +1,275 @@
+import re
+import threading
+
+from django.template import Template, Context
+
+
+# Expansions of a word pattern larger than this are not worth enumerating
+MAX_WORD_FORMS = 64
+
+_label_re = re.compile(r'^(?P<label>[A-Za-z_][A-Za-z0-9_]*)\s*:(?P<rule>.*)$')
+_label_ref_re = re.compile(r'^[A-Z_]+(\|[A-Z_]+)*$')
+_chunk_rule_re = re.compile(r'^\{(?P<pattern>.*)\}$')
+
+
+def _split_top_level(pattern, separator='|'):
+    """ Splits :pattern by :separator, ignoring the separators inside () and <> """
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(pattern):
+        if ch in '(<':
+            depth += 1
+        elif ch in ')>':
+            depth -= 1
+        elif ch == separator and depth == 0:
+            parts.append(pattern[start:i])
+            start = i + 1
+    parts.append(pattern[start:])
+    return parts
+
+
+def _expand_word_pattern(pattern):
+    """
+    Enumerates the words matched by a simple regex made of literal characters,
+    (alternative|groups) and ? quantifiers, e.g. (Polic(y|ies)|POLIC(Y|IES)).
+    Returns None for anything more complex (., *, +, [], ...).
+    """
+    forms = ['']
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '(':
+            depth, j = 1, i + 1
+            while j < len(pattern) and depth:
+                depth += {'(': 1, ')': -1}.get(pattern[j], 0)
+                j += 1
+            if depth:
+                return None
+            options = []
+            for alternative in _split_top_level(pattern[i + 1:j - 1]):
+                expanded = _expand_word_pattern(alternative)
+                if expanded is None:
+                    return None
+                options.extend(expanded)
+            i = j
+        elif ch == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            options = [pattern[i + 1]]
+            i += 2
+        elif ch in '.*+[]{}^$|)?':
+            return None
+        else:
+            options = [ch]
+            i += 1
+
+        if i < len(pattern) and pattern[i] == '?':
+            options = options + ['']
+            i += 1
+
+        forms = [f + o for f in forms for o in options]
+        if len(forms) > MAX_WORD_FORMS:
+            return None
+
+    return forms
+
+
+class GrammarPrefilter(object):
+    """
+    A cheap test telling whether a chunk grammar can possibly find one of its
+    result chunks in a sentence, without parsing it.
+
+    Every chunk rule is reduced to the groups of words it requires (e.g.
+    `<MPARTY> <(Shall|SHALL|shall)__.*> <(Not|NOT|not)__.*>` requires one of
+    the forms of "shall" and one of "not"). A sentence is a candidate only if
+    all the groups of at least one rule producing a result chunk are present
+    among its words. Optional elements, wildcards and patterns too complex to
+    enumerate are simply not required, so the test never drops a sentence the
+    grammar would have matched.
+    """
+
+    def __init__(self, grammar, result_types):
+        """
+        :param grammar: the (rendered) text of a RegexpParser grammar
+        :param result_types: the labels of the chunks an analyzer looks for
+        """
+        self.rules = {}
+        self.opaque_labels = set()
+        self._parse_grammar(grammar)
+
+        self._label_groups = {}
+        self.result_rules = []
+        for label in result_types:
+            if label in self.opaque_labels:
+                raise ValueError('Rules of %s can not be reduced' % label)
+            for elements in self.rules.get(label, []):
+                groups = self._required_groups(elements)
+                if not groups:
+                    raise ValueError('A rule of %s does not require any word' % label)
+                self.result_rules.append(groups)
+
+        # Each matching rule requires at least one of these words
+        self.trigger_words = frozenset(w for groups in self.result_rules for w in groups[0])
+
+    def _parse_grammar(self, grammar):
+        label = None
+        for line in grammar.split('\n'):
+            line = line.strip()
+            match = _label_re.match(line)
+            if match:
+                label = match.group('label')
+                line = match.group('rule').strip()
+            if not line or line.startswith('#'):
+                continue
+
+            line = line.split('#')[0].strip()
+            match = _chunk_rule_re.match(line)
+            if label is None:
+                continue
+            if match and '{' not in match.group('pattern') and '}' not in match.group('pattern'):
+                self.rules.setdefault(label, []).append(match.group('pattern'))
+            else:
+                # Chink, merge and split rules could add chunks of their own
+                self.opaque_labels.add(label)
+
+    def _label_group(self, label, visiting=()):
+        """ Returns the words one of which is part of any :label chunk (or None) """
+        if label not in self._label_groups:
+            group = set()
+            rules = self.rules.get(label)
+            if not rules or label in self.opaque_labels or label in visiting:
+                group = None
+            for elements in rules or []:
+                if group is None:
+                    break
+                groups = self._required_groups(elements, visiting + (label,))
+                if not groups:
+                    group = None
+                else:
+                    group |= groups[0]
+            self._label_groups[label] = frozenset(group) if group is not None else None
+        return self._label_groups[label]
+
+    def _element_group(self, element, visiting):
+        """ The words one of which a single <...> element requires (or None) """
+        element = element[1:-1].strip()
+        if _label_ref_re.match(element):
+            group = set()
+            for label in element.split('|'):
+                label_group = self._label_group(label, visiting)
+                if label_group is None:
+                    return None
+                group |= label_group
+            return frozenset(group)
+
+        if '__' not in element:
+            return None
+        word, tag = element.split('__', 1)
+        if tag.startswith('_'):
+            return None
+        forms = _expand_word_pattern(word)
+        if not forms or '' in forms:
+            return None
+        return frozenset(forms)
+
+    def _tokenize_pattern(self, pattern):
+        """ Splits a rule's pattern into (element, quantifier) pairs """
+        pattern = re.sub(r'\s+', '', pattern)
+        items, i = [], 0
+        while i < len(pattern):
+            if pattern[i] == '<':
+                j = pattern.index('>', i) + 1
+            elif pattern[i] == '(':
+                depth, j = 1, i + 1
+                while depth:
+                    depth += {'(': 1, ')': -1}.get(pattern[j], 0)
+                    j += 1
+            else:
+                raise ValueError('Unexpected "%s" in %s' % (pattern[i], pattern))
+            quantifier = ''
+            if j < len(pattern) and pattern[j] in '?*+':
+                quantifier = pattern[j]
+                j += 1
+            items.append((pattern[i:j - len(quantifier)], quantifier))
+            i = j
+        return items
+
+    def _required_groups(self, pattern, visiting=()):
+        """
+        Returns the list of word groups required by a rule's pattern,
+        the most selective group (the one with the longest words) first
+        """
+        alternatives = _split_top_level(re.sub(r'\s+', '', pattern))
+        if len(alternatives) > 1:
+            # Any of the alternatives: require the union of their best groups
+            group = set()
+            for alternative in alternatives:
+                groups = self._required_groups(alternative, visiting)
+                if not groups:
+                    return []
+                group |= groups[0]
+            return [frozenset(group)]
+
+        groups = []
+        for element, quantifier in self._tokenize_pattern(pattern):
+            if quantifier in ('?', '*'):
+                continue
+            if element.startswith('('):
+                groups.extend(self._required_groups(element[1:-1], visiting))
+                continue
+            group = self._element_group(element, visiting)
+            if group is not None:
+                groups.append(group)
+
+        return sorted(set(groups), key=lambda g: -min(len(w) for w in g))
+
+    @staticmethod
+    def sentence_words(wordtagged_sentence):
+        """
+        Returns the words the tag patterns can match in a sentence:
+        a tag like word__POS matches <word__.*>
+        """
+        words = set()
+        for token in wordtagged_sentence:
+            parts = token[1].split('__')
+            for i in range(1, len(parts)):
+                words.add('__'.join(parts[:i]))
+        return words
+
+    def matches(self, wordtagged_sentence):
+        """ Returns False if the grammar can't find a result chunk in the sentence """
+        words = self.sentence_words(wordtagged_sentence)
+        if self.trigger_words.isdisjoint(words):
+            return False
+
+        for groups in self.result_rules:
+            if all(not group.isdisjoint(words) for group in groups):
+                return True
+
+        return False
+
+
+_prefilters_cache = {}
+_prefilters_cache_lock = threading.Lock()
+
+
+def get_grammar_prefilter(grammar_template, result_types, both=False):
+    """
+    Returns the GrammarPrefilter of an analyzer's grammar template, or None if
+    the grammar can't be reduced to required words. The party mentions don't
+    need to be known, so a prefilter only depends on the grammar and :both.
+    """
+    key = (grammar_template, tuple(result_types), both)
+
+    with _prefilters_cache_lock:
+        if key in _prefilters_cache:
+            return _prefilters_cache[key]
+
+    # Render the grammar without parties: the party mentions are never required
+    grammar = Template(grammar_template).render(Context({'party_mentions': [], 'both': both}))
+    try:
+        prefilter = GrammarPrefilter(grammar, result_types)
+    except (ValueError, IndexError):
+        prefilter = None
+
+    with _prefilters_cache_lock:
+        _prefilters_cache[key] = prefilter
+
+    return prefilter
@@ -73,13 +73,21 @@ class Reference:
 
 
 class ExternalReferencesAnalyzer:
-    def __init__(self, rawtext, sentences, wordtagged=None, parties=None):
+    def __init__(self, rawtext, sentences, wordtagged=None, parties=None, analysed_idxs=None):
+        """
+        :param analysed_idxs: the indices of the sentences to look for
+            references in (all of them if None)
+        """
         self._wordtagged = wordtagged
         self._sentences = sentences
         self._text = rawtext
         self._parsed_sentences = None
         self._references = None
         self._parties = [p.lower() for p in parties]
+        self._analysed_idxs = set(analysed_idxs) if analysed_idxs is not None else None
+
+    def _is_analysed(self, idx):
+        return self._analysed_idxs is None or idx in self._analysed_idxs
 
     @property
     def text(self):
@@ -105,6 +113,9 @@ class ExternalReferencesAnalyzer:
 
     def _get_urls(self):
         for i, s in enumerate(self._sentences):
+            if not self._is_analysed(i):
+                continue
+
             # Create a copy of the text
             text_copy = s[:]
 
@@ -130,12 +141,15 @@ class ExternalReferencesAnalyzer:
                     self.references.append(Reference(m.group(), Reference.TYPE_DOMAIN, m.start(), i))
 
     def _parse_sentences(self):
-        self._parsed_sentences = [parse_references(ss) for ss in self.wordtagged]
+        self._parsed_sentences = [parse_references(ss) if self._is_analysed(i) else None
+                                  for i, ss in enumerate(self.wordtagged)]
 
     def _get_standards(self):
         standards = []
 
         for i, ps in enumerate(self.parsed_sentences):
+            if ps is None:
+                continue
             for t in extract_nodes(ps, predicate=lambda x: x.label() in REFERENCES_TYPES):
                 standtxt = postprocess_text(tree2str(t))
                 offset = self._sentences[i].find(standtxt)
@@ -3,8 +3,8 @@ from nlplib.grammars import RESPONSIBILITY_GRAMMAR, RESPONSIBILITY_TYPES
 
 
 class ResponsibilityAnalyzer(GenericAnalyzer):
-    def __init__(self, wordtagged, mention_clusters, them_party, you_party):
-        super(ResponsibilityAnalyzer, self).__init__(wordtagged, mention_clusters, them_party, you_party)
+    def __init__(self, wordtagged, mention_clusters, them_party, you_party, analysed_idxs=None):
+        super(ResponsibilityAnalyzer, self).__init__(wordtagged, mention_clusters, them_party, you_party, analysed_idxs)
 
     @property
     def _analyzer_grammar(self):
@@ -3,8 +3,8 @@ from nlplib.grammars import TERMINATION_GRAMMAR, TERMINATION_TYPES
 
 
 class TerminationAnalyzer(GenericAnalyzer):
-    def __init__(self, wordtagged, mention_clusters, them_party, you_party):
-        super(TerminationAnalyzer, self).__init__(wordtagged, mention_clusters, them_party, you_party)
+    def __init__(self, wordtagged, mention_clusters, them_party, you_party, analysed_idxs=None):
+        super(TerminationAnalyzer, self).__init__(wordtagged, mention_clusters, them_party, you_party, analysed_idxs)
 
     @property
     def _analyzer_grammar(self):
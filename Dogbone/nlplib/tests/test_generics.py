@@ -0,0 +1,31 @@
+import mock
+
+from unittest import TestCase
+from nlplib import generics
+from nlplib.generics import get_regexp_parser
+
+
+class RegexpParsersCacheTest(TestCase):
+
+    def setUp(self):
+        generics._parsers_cache.clear()
+
+    def test_parser_compiled_once_per_grammar(self):
+        grammar = 'NP: {<DT>?<JJ>*<NN>}'
+        parser = get_regexp_parser(grammar)
+
+        self.assertIs(get_regexp_parser(grammar), parser)
+        self.assertIsNot(get_regexp_parser('VP: {<VB.*>}'), parser)
+
+        tree = parser.parse([('the', 'DT'), ('big', 'JJ'), ('dog', 'NN')])
+        self.assertEqual(tree[0].label(), 'NP')
+
+    def test_cache_is_bounded(self):
+        with mock.patch('nlplib.generics.PARSERS_CACHE_SIZE', 2):
+            first = get_regexp_parser('A: {<DT>}')
+            get_regexp_parser('B: {<NN>}')
+            # Using the first grammar again makes the second one the oldest
+            self.assertIs(get_regexp_parser('A: {<DT>}'), first)
+            get_regexp_parser('C: {<JJ>}')
+
+            self.assertEqual(list(generics._parsers_cache), ['A: {<DT>}', 'C: {<JJ>}'])
@@ -0,0 +1,117 @@
+import os
+import json
+from glob import glob
+from unittest import TestCase
+
+import mock
+from django.template import Template, Context
+from nlplib import NlplibFacade
+from nlplib.generics import get_regexp_parser
+from nlplib.liability import LiabilityAnalyzer
+from nlplib.responsibility import ResponsibilityAnalyzer
+from nlplib.termination import TerminationAnalyzer
+from nlplib.grammars import (
+    LIABILITIES_GRAMMAR, LIABILITIES_TYPES,
+    RESPONSIBILITY_GRAMMAR, RESPONSIBILITY_TYPES,
+    TERMINATION_GRAMMAR, TERMINATION_TYPES,
+)
+from nlplib.prefilter import get_grammar_prefilter, _expand_word_pattern
+from nlplib.utils import extract_nodes
+
+
+# Contract sentences, with the parties masked as __THEM_PARTY__ and __YOU_PARTY__
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           'ml', 'resources', 'pretrain_datasets', '*.json')
+
+
+def wordtag(text):
+    """ 'Company__NNP shall__MD' -> [('Company', 'Company__NNP'), ('shall', 'shall__MD')] """
+    return [(t.split('__')[0], t) for t in text.split()]
+
+
+class GrammarPrefilterTest(TestCase):
+
+    ANALYZERS = [
+        (LIABILITIES_GRAMMAR, LIABILITIES_TYPES),
+        (RESPONSIBILITY_GRAMMAR, RESPONSIBILITY_TYPES),
+        (TERMINATION_GRAMMAR, TERMINATION_TYPES),
+    ]
+
+    SENTENCES = [
+        'Company__NNP shall__MD not__RB be__VB liable__JJ for__IN any__DT damages__NNS .__.',
+        'Neither__DT party__NN shall__MD be__VB liable__JJ to__TO the__DT other__JJ .__.',
+        'Customer__NNP is__VBZ solely__RB responsible__JJ for__IN the__DT content__NN .__.',
+        'Either__DT party__NN may__MD terminate__VB this__DT Agreement__NN at__IN any__DT time__NN .__.',
+        'Company__NNP may__MD suspend__VB ,__, or__CC terminate__VB the__DT license__NN .__.',
+        'If__IN Customer__NNP fails__VBZ to__TO pay__VB ,__, Company__NNP must__MD notify__VB it__PRP .__.',
+        'This__DT Agreement__NN is__VBZ governed__VBN by__IN the__DT laws__NNS of__IN Texas__NNP .__.',
+        'The__DT parties__NNS agree__VBP on__IN the__DT following__JJ definitions__NNS .__.',
+        'Payment__NN is__VBZ due__JJ within__IN thirty__CD days__NNS .__.',
+    ]
+
+    def test_expand_word_pattern(self):
+        self.assertEqual(sorted(_expand_word_pattern('(Polic(y|ies)|polic(y|ies))')),
+                         ['Policies', 'Policy', 'policies', 'policy'])
+        self.assertEqual(sorted(_expand_word_pattern('(Agrees?|agrees?)')),
+                         ['Agree', 'Agrees', 'agree', 'agrees'])
+        self.assertEqual(_expand_word_pattern("'s"), ["'s"])
+        self.assertIsNone(_expand_word_pattern('.*'))
+
+    def test_trigger_words(self):
+        prefilter = get_grammar_prefilter(LIABILITIES_GRAMMAR, LIABILITIES_TYPES)
+        self.assertIn('liable', prefilter.trigger_words)
+        self.assertNotIn('the', prefilter.trigger_words)
+
+        prefilter = get_grammar_prefilter(TERMINATION_GRAMMAR, TERMINATION_TYPES, both=True)
+        self.assertIn('terminate', prefilter.trigger_words)
+
+    def test_prefilter_keeps_all_the_results(self):
+        party_mentions = ['<(Company|company|COMPANY)__.*>', '<(Customer|customer|CUSTOMER)__.*>']
+        skipped = 0
+
+        for grammar, result_types in self.ANALYZERS:
+            for both in (False, True):
+                rendered = Template(grammar).render(Context({'party_mentions': party_mentions, 'both': both}))
+                parser = get_regexp_parser(rendered)
+                prefilter = get_grammar_prefilter(grammar, result_types, both)
+
+                for sentence in self.SENTENCES:
+                    wt_sent = wordtag(sentence)
+                    found = extract_nodes(parser.parse(wt_sent),
+                                          predicate=lambda node: node.label() in result_types)
+                    if found:
+                        self.assertTrue(prefilter.matches(wt_sent), sentence)
+                    elif not prefilter.matches(wt_sent):
+                        skipped += 1
+
+        # Most of the irrelevant sentences don't even get parsed
+        self.assertGreater(skipped, 20)
+
+    def test_prefilter_same_chunks_over_corpus(self):
+        """ The analyzers find the very same chunks with and without the prefilter """
+        parties = ('Company', 'Customer', (50, 50))
+        analyzers = (LiabilityAnalyzer, ResponsibilityAnalyzer, TerminationAnalyzer)
+        found = 0
+
+        for filename in sorted(glob(CORPUS_PATH)):
+            with open(filename) as jsin:
+                sentences = [d[0].replace('__THEM_PARTY__', parties[0])
+                                 .replace('__YOU_PARTY__', parties[1])
+                                 .replace('__NUM_MASK__', '10')
+                             for d in json.load(jsin)[:150]]
+            facade = NlplibFacade(sentences=sentences, parties=parties)
+
+            def chunks(analyzer_class):
+                analyzer = analyzer_class(facade.wordtagged, facade.clusters, *parties[:2])
+                return [[(t.text_index, t.label(), str(t)) for t in analyzer.results[mention]]
+                        for mention in ('both',) + parties[:2]]
+
+            for analyzer_class in analyzers:
+                prefiltered = chunks(analyzer_class)
+                with mock.patch('nlplib.generics.get_grammar_prefilter', return_value=None):
+                    parsed = chunks(analyzer_class)
+
+                self.assertEqual(prefiltered, parsed, '%s over %s' % (analyzer_class.__name__, filename))
+                found += sum(map(len, parsed))
+
+        self.assertGreater(found, 0)
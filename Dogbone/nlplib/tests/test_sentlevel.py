@@ -0,0 +1,69 @@
+import threading
+from unittest import TestCase
+
+import mock
+
+from nlplib import sentlevel_process, NlplibFacade
+
+
+class SentlevelProcessTest(TestCase):
+
+    SENTENCES = [
+        'This Agreement is made between Blackfoot and Customer.',
+        'Customer shall pay all the fees within thirty days.',
+        'Blackfoot will not be liable for any lost profits.',
+        'Neither party shall be liable for delays caused by force majeure.',
+        'Either party may terminate this Agreement at any time by written notice.',
+        'Customer is solely responsible for the content it uploads.',
+    ]
+    PARTIES = ('Blackfoot', 'Customer', (50, 50))
+
+    def test_analysed_idxs(self):
+        """ Only the given sentences get analysed, the same as in a full analysis """
+        analysed_idxs = [1, 2, 4]
+        full, _ = sentlevel_process(sentences=self.SENTENCES, parties=self.PARTIES)
+        facade = NlplibFacade(sentences=self.SENTENCES, parties=self.PARTIES,
+                              analysed_idxs=analysed_idxs)
+        partial, _ = sentlevel_process(facade=facade)
+
+        self.assertTrue(any(full['sentences'][i].get('annotations') for i in analysed_idxs))
+        self.assertEqual(len(partial['sentences']), len(self.SENTENCES))
+        for i, sentence in enumerate(partial['sentences']):
+            if i in analysed_idxs:
+                self.assertEqual(sentence, full['sentences'][i])
+            else:
+                self.assertNotIn('annotations', sentence)
+                self.assertEqual(sentence['external_refs'], [])
+
+    def test_analyzers_processes(self):
+        """ The analyzers give the same results in a pool of processes as serially """
+        serial, _ = sentlevel_process(sentences=self.SENTENCES, parties=self.PARTIES)
+        parallel, _ = sentlevel_process(sentences=self.SENTENCES, parties=self.PARTIES, processes=3)
+
+        self.assertTrue(any(s.get('annotations') for s in serial['sentences']))
+        self.assertEqual(serial, parallel)
+
+    def test_analyzers_processes_off_main_thread(self):
+        """ The analyzers run serially instead of forking from a thread other than the main one """
+        serial, _ = sentlevel_process(sentences=self.SENTENCES, parties=self.PARTIES)
+        results = []
+
+        with mock.patch('nlplib.facade.Pool') as pool_mock:
+            thread = threading.Thread(target=lambda: results.append(sentlevel_process(
+                sentences=self.SENTENCES, parties=self.PARTIES, processes=3)[0]))
+            thread.start()
+            thread.join()
+
+        self.assertFalse(pool_mock.called)
+        self.assertEqual(results, [serial])
+
+    def test_clusters_state(self):
+        """ A sentence analysed with the restored clusters of its text gets the same results """
+        full, facade = sentlevel_process(sentences=self.SENTENCES, parties=self.PARTIES)
+        restored = NlplibFacade(sentences=[self.SENTENCES[2]], parties=self.PARTIES,
+                                clusters_state=facade.clusters_state)
+        partial, _ = sentlevel_process(facade=restored)
+
+        self.assertEqual(restored.clusters_state, facade.clusters_state)
+        self.assertTrue(full['sentences'][2].get('annotations'))
+        self.assertEqual(partial['sentences'][0].get('annotations'), full['sentences'][2].get('annotations'))
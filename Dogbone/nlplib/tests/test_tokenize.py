@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import mock
+
 from unittest import TestCase
 
+from nlplib import utils
 from nlplib.utils import preprocess_text, sents2wordtag
 
 
@@ -14,3 +17,30 @@ Blackfoot, as defined below and described in one or more Service Order Forms exe
         expected_toks = ['Blackfoot', ',', 'as', 'defined', 'below', 'and', 'described', 'in', 'one', 'or', 'more', 'Service', 'Order', 'Forms', 'executed', 'by', 'Customer', 'and', 'Blackfoot', '_LPAR_', '"', 'Service', 'Orders', '"', '_RPAR_', '.']
         actual_toks = [tok for tok, tagged in sents2wordtag([preprocess_text(txt)])[0]]
         self.assertEqual(expected_toks, actual_toks)
+
+    def test_sents2wordtag_cache(self):
+        sentences = [u'Customer shall pay the fees.', u'Blackfoot may terminate this Agreement.']
+        expected = sents2wordtag(sentences)
+
+        # Only the new sentences get tagged, all at once
+        with mock.patch('nlplib.utils.pos_tag_sents', wraps=utils.pos_tag_sents) as mock_tag:
+            edited = [sentences[0], u'Blackfoot may not terminate this Agreement.', sentences[1]]
+            wordtagged = sents2wordtag(edited)
+
+            mock_tag.assert_called_once_with([['Blackfoot', 'may', 'not', 'terminate', 'this', 'Agreement', '.']])
+
+        self.assertEqual(wordtagged[0], expected[0])
+        self.assertEqual(wordtagged[2], expected[1])
+        self.assertEqual([w for w, _ in wordtagged[1]],
+                         ['Blackfoot', 'may', 'not', 'terminate', 'this', 'Agreement', '.'])
+
+    def test_sents2wordtag_cache_bounded(self):
+        limit = utils._wordtag_size(tuple(sents2wordtag([u'Customer shall pay the fees.'])[0]))
+
+        with mock.patch('nlplib.utils.WORDTAG_CACHE_MAX_BYTES', limit):
+            sents2wordtag([u'Blackfoot may terminate this Agreement at any time.',
+                           u'Neither party shall be liable for any delays.'])
+
+        self.assertLessEqual(utils._wordtag_cache_bytes, limit)
+        self.assertEqual(utils._wordtag_cache_bytes,
+                         sum(size for _, size in utils._wordtag_cache.values()))
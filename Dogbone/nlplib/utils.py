@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 
 import re
+import sys
+import hashlib
+import threading
 import collections
 
-from nltk import pos_tag
+from nltk import pos_tag_sents
 from nltk import Tree
 from nlplib.tokenizing.splitta.splitta import splitta_word_tokenize as word_tokenize
 from unidecode import unidecode
@@ -614,10 +617,40 @@ def text2wordtag(text):
     return sents2wordtag(sentences)
 
 
+# The (approximate) maximum memory taken by the word-tagged sentences cached
+# by a process (about a few thousand typical sentences)
+WORDTAG_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Maps the keys of the sentences to (wordtagged, size in bytes) pairs
+_wordtag_cache = collections.OrderedDict()
+_wordtag_cache_bytes = 0
+_wordtag_cache_lock = threading.Lock()
+
+
+def _sentence_key(sentence):
+    if isinstance(sentence, unicode):
+        sentence = sentence.encode('utf-8')
+    return hashlib.sha1(sentence).digest()
+
+
+def _wordtag_size(wordtagged):
+    """ The memory taken by a word-tagged sentence, strings included """
+    size = sys.getsizeof(wordtagged)
+    for pair in wordtagged:
+        size += sys.getsizeof(pair) + sum(sys.getsizeof(item) for item in pair)
+    return size
+
+
 def sents2wordtag(sentences):
-    """ Convert list of raw sentences to word-tagged format """
+    """
+    Convert list of raw sentences to word-tagged format.
 
-    def _pos_tag(ts):
+    The results are cached by the text of the sentences, so only the new
+    sentences get tokenized and tagged (all at once).
+    """
+    global _wordtag_cache_bytes
+
+    def _clean(ts):
         """
         Empty words lead to errors in the current version of NLTK,
         so simply filter them out before applying the actual `pos_tag` function.
@@ -629,11 +662,45 @@ def sents2wordtag(sentences):
         """
         if '' in ts:
             ts = [w for w in ts if w]
-        return pos_tag(ts)
-
-    tokenized_sentences = [word_tokenize(s) for s in sentences]
-    tagged_sentences = [_pos_tag(ts) for ts in tokenized_sentences]
-    return [tagged2wordtag(ts) for ts in tagged_sentences]
+        return ts
+
+    keys = [_sentence_key(s) for s in sentences]
+    wordtagged = {}
+
+    with _wordtag_cache_lock:
+        for key in keys:
+            if key in _wordtag_cache and key not in wordtagged:
+                # Mark as the most recently used
+                entry = _wordtag_cache.pop(key)
+                _wordtag_cache[key] = entry
+                wordtagged[key] = entry[0]
+
+    missing = collections.OrderedDict()
+    for key, s in zip(keys, sentences):
+        if key not in wordtagged:
+            missing[key] = s
+
+    if missing:
+        tokenized_sentences = [_clean(word_tokenize(s)) for s in missing.values()]
+        # Load the tagger only once for all the sentences
+        tagged_sentences = pos_tag_sents(tokenized_sentences)
+
+        for key, ts in zip(missing, tagged_sentences):
+            wordtagged[key] = tuple(tagged2wordtag(ts))
+
+        with _wordtag_cache_lock:
+            for key in missing:
+                if key in _wordtag_cache:
+                    # Tagged by another thread meanwhile
+                    continue
+                size = _wordtag_size(wordtagged[key])
+                _wordtag_cache[key] = (wordtagged[key], size)
+                _wordtag_cache_bytes += size
+            while _wordtag_cache_bytes > WORDTAG_CACHE_MAX_BYTES and _wordtag_cache:
+                _, (_, size) = _wordtag_cache.popitem(last=False)
+                _wordtag_cache_bytes -= size
+
+    return [list(wordtagged[key]) for key in keys]
 
 
 def tree2str(t):
@@ -50,7 +50,7 @@ def hubspot_update_contact_properties(email, data):
 
 
 @shared_task
-def update_PDFUploadMonitor(fpath, need_ocr):
+def update_PDFUploadMonitor(fpath, need_ocr, pages=None):
     from portal.models import PDFUploadMonitor
 
     # Keep the record
@@ -60,10 +60,12 @@ def update_PDFUploadMonitor(fpath, need_ocr):
     else:
         stat = PDFUploadMonitor.objects.latest()
 
-    # Add page count
-    with open(fpath) as pdfin:
-        reader = pyPdf.PdfFileReader(pdfin)
-        stat.add_doc(pages=reader.getNumPages(), ocr=need_ocr)
+    # Add page count (unless it was counted already)
+    if pages is None:
+        with open(fpath) as pdfin:
+            reader = pyPdf.PdfFileReader(pdfin)
+            pages = reader.getNumPages()
+    stat.add_doc(pages=pages, ocr=need_ocr)
 
 
 @shared_task
@@ -2,9 +2,8 @@ import docx
 import os
 import zipfile
 from StringIO import StringIO
-from xml.sax.saxutils import escape as xmlescape
+from xml.sax.saxutils import escape as xmlescape, quoteattr
 
-from bs4 import BeautifulSoup
 from nlplib.utils import markers_to_linebreaks
 from django.conf import settings
 
@@ -30,11 +29,32 @@ from utils.conversion import contentsdecode
 ANNOTATION_IMG_FILE = os.path.join(os.path.realpath(os.path.dirname(__file__)),
                                    'resources', ANNOTATION_IMG_NAME)
 
+# The S3 metadata holding the key of what an export was made from
+EXPORT_KEY_METADATA = 'export-key'
+
+# Part of the export keys, bump it whenever the exports change for the same
+# data, so that the ones already in S3 don't get reused
+EXPORT_FORMAT_VERSION = 1
+
+
+def read_export_key(s3_path):
+    """ Returns the key of what the export stored at :s3_path was made from """
+    s3_bucket = get_s3_bucket_manager(bucket_name=settings.UPLOADED_DOCUMENTS_BUCKET)
+    return s3_bucket.read_metadata(s3_path, EXPORT_KEY_METADATA)
+
+
+def save_export(s3_path, docx_file, export_key=None):
+    """ Saves the in-memory :docx_file to the specified path in S3 """
+    metadata = {EXPORT_KEY_METADATA: export_key} if export_key else None
+    s3_bucket = get_s3_bucket_manager(bucket_name=settings.UPLOADED_DOCUMENTS_BUCKET)
+    s3_bucket.save_file(s3_path, docx_file, metadata=metadata)
+
 
 def document_to_docx(document, s3_path,
                      include_comments=False,
                      include_track_changes=False,
-                     included_annotations=None):
+                     included_annotations=None,
+                     export_key=None):
     """ Produces a plaintext docx from the :document Document model. """
 
     # Create an empty document using some default templates
@@ -49,8 +69,13 @@ def document_to_docx(document, s3_path,
 
     new_temporary_archive = StringIO()
 
+    tz_name = document.time_zone
+
+    sentences = document.get_sorted_sentences()
+    approved_revisions = get_latest_approved_revisions(sentences, include_track_changes)
+
     # Create a new archive by copying the initial archive,
-    # but without document.xml; also read initial document.xml.
+    # but with the reconstructed document.xml
     with zipfile.ZipFile(initial_temporary_archive, mode='r') as zin, \
             zipfile.ZipFile(new_temporary_archive, mode='w') as zout:
         zout.comment = zin.comment  # Preserve the comment
@@ -59,17 +84,13 @@ def document_to_docx(document, s3_path,
                 zout.writestr(item, zin.read(item.filename))
         initial_doc = contentsdecode(zin.read(DOCX_DOCUMENT_FNAME))
 
-    tz_name = document.time_zone
-
-    # Reconstruct the document
-    sentences = document.get_sorted_sentences()
-    new_doc = reconstruct_docx(initial_doc, sentences, include_track_changes,
-                               tz_name)
+        # Reconstruct the document
+        new_doc = reconstruct_docx(initial_doc, sentences, include_track_changes,
+                                   tz_name, approved_revisions)
 
-    # Write new document.xml to the new archive
-    with zipfile.ZipFile(new_temporary_archive, mode='a',
-                         compression=zipfile.ZIP_DEFLATED) as zout:
-        zout.writestr(DOCX_DOCUMENT_FNAME, new_doc.encode('utf-8'))
+        # Write new document.xml to the new archive
+        zout.writestr(DOCX_DOCUMENT_FNAME, new_doc.encode('utf-8'),
+                      compress_type=zipfile.ZIP_DEFLATED)
 
     new_temporary_archive.seek(0)
 
@@ -87,22 +108,48 @@ def document_to_docx(document, s3_path,
                                               from_plain=True, tz_name=tz_name)
 
     # Save the in-memory file to the specified path in S3
-    s3_bucket = get_s3_bucket_manager(bucket_name=settings.UPLOADED_DOCUMENTS_BUCKET)
-    s3_bucket.save_file(s3_path, result_docx)
+    save_export(s3_path, result_docx, export_key)
+
+
+def get_latest_approved_revisions(sentences, redlines=True):
+    """
+    Fetches at once the latest approved revisions of the :sentences which
+    are shown as redlines (i.e. the unaccepted ones, if :redlines is set).
+    """
+    from core.models import Sentence
+
+    if not redlines:
+        return {}
+    return Sentence.get_latest_approved_revisions(
+        [sentence for sentence in sentences if not sentence.accepted])
 
 
-def reconstruct_docx(initial_doc, sentences, redlines=True, tz_name=None):
-    soup = BeautifulSoup(initial_doc, features='xml')
+def reconstruct_docx(initial_doc, sentences, redlines=True, tz_name=None,
+                     approved_revisions=None):
+    """
+    Writes the :sentences as plain paragraphs at the end of the body of the
+    :initial_doc document.xml (right before its section properties).
+    :approved_revisions maps the uuids of the unaccepted sentences to their
+    latest approved revisions (otherwise they are queried one by one).
+    """
+    # Everything before the section properties stays as it is
+    body_start = initial_doc.find(u'<w:body')
+    body_end = initial_doc.find(u'<w:sectPr', body_start)
+    if body_end == -1:
+        body_end = initial_doc.rfind(u'</w:body>')
 
-    sectPr_tag = soup.body.sectPr
-    p_tag = soup.new_tag(u'w:p')
+    xml = [initial_doc[:body_end]]
+    p_contents = []
 
     del_id = 0
     ins_id = 0
 
     for sentence_index, sentence in enumerate(sentences):
         if redlines and not sentence.accepted:
-            latest_approved_revision = sentence.latest_approved_revision
+            if approved_revisions is None:
+                latest_approved_revision = sentence.latest_approved_revision
+            else:
+                latest_approved_revision = approved_revisions.get(sentence.uuid)
             if latest_approved_revision:
                 diff = grouped_text_diff(latest_approved_revision.text,
                                          sentence.text)
@@ -122,63 +169,47 @@ def reconstruct_docx(initial_doc, sentences, redlines=True, tz_name=None):
             sentence.text += u' '
 
         for entry in diff:
-            text = entry[u'value']
+            text = xmlescape(entry[u'value'])
 
             if entry.get(u'removed'):
-                del_tag = soup.new_tag(u'w:del')
-                del_tag[u'w:id'] = str(del_id)
+                p_contents.append(
+                    u'<w:del w:id="%d" w:author=%s w:date=%s><w:r>'
+                    u'<w:delText xml:space="preserve">%s</w:delText>'
+                    u'</w:r></w:del>' % (
+                        del_id,
+                        quoteattr(get_modifier_name(sentence)),
+                        quoteattr(get_creation_time(sentence, tz_name)),
+                        text))
                 del_id += 1
-                del_tag[u'w:author'] = get_modifier_name(sentence)
-                del_tag[u'w:date'] = get_creation_time(sentence, tz_name)
-
-                r_tag = soup.new_tag(u'w:r')
-                delText_tag = soup.new_tag(u'w:delText')
-                delText_tag[u'xml:space'] = u'preserve'
-                delText_tag.append(text)
-                r_tag.append(delText_tag)
-                del_tag.append(r_tag)
-                p_tag.append(del_tag)
 
             elif entry.get(u'added'):
-                ins_tag = soup.new_tag(u'w:ins')
-                ins_tag[u'w:id'] = str(ins_id)
+                p_contents.append(
+                    u'<w:ins w:id="%d" w:author=%s w:date=%s><w:r>'
+                    u'<w:t xml:space="preserve">%s</w:t>'
+                    u'</w:r></w:ins>' % (
+                        ins_id,
+                        quoteattr(get_modifier_name(sentence)),
+                        quoteattr(get_creation_time(sentence, tz_name)),
+                        text))
                 ins_id += 1
-                ins_tag[u'w:author'] = get_modifier_name(sentence)
-                ins_tag[u'w:date'] = get_creation_time(sentence, tz_name)
-
-                r_tag = soup.new_tag(u'w:r')
-                t_tag = soup.new_tag(u'w:t')
-                t_tag[u'xml:space'] = u'preserve'
-                t_tag.append(text)
-                r_tag.append(t_tag)
-                ins_tag.append(r_tag)
-                p_tag.append(ins_tag)
 
             else:
-                r_tag = soup.new_tag(u'w:r')
-                t_tag = soup.new_tag(u'w:t')
-                t_tag[u'xml:space'] = u'preserve'
-                t_tag.append(text)
-                r_tag.append(t_tag)
-                p_tag.append(r_tag)
+                p_contents.append(
+                    u'<w:r><w:t xml:space="preserve">%s</w:t></w:r>' % text)
 
         for _ in range(sentence.newlines):
-            sectPr_tag.insert_before(p_tag)
-            p_tag = soup.new_tag(u'w:p')
+            xml.append(u'<w:p>%s</w:p>' % u''.join(p_contents))
+            p_contents = []
 
-    if p_tag.contents:
-        sectPr_tag.insert_before(p_tag)
+    if p_contents:
+        xml.append(u'<w:p>%s</w:p>' % u''.join(p_contents))
 
     # Add a final page-break
-    p_tag = soup.new_tag(u'w:p')
-    r_tag = soup.new_tag(u'w:r')
-    br_tag = soup.new_tag(u'w:br')
-    br_tag[u'w:type'] = u'page'
-    r_tag.append(br_tag)
-    p_tag.append(r_tag)
-    sectPr_tag.insert_before(p_tag)
+    xml.append(u'<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    xml.append(initial_doc[body_end:])
 
-    return unicode(soup)
+    return u''.join(xml)
 
 
 def get_modifier_name(sentence):
@@ -205,7 +236,8 @@ def get_creation_time(sentence, tz_name=None):
 def document_to_rich_docx(document, s3_path,
                           include_comments=False,
                           include_track_changes=False,
-                          included_annotations=None):
+                          included_annotations=None,
+                          export_key=None):
     """ Produces a richtext docx from the :document Document model. """
 
     docx_file = document.get_docx()
@@ -217,7 +249,8 @@ def document_to_rich_docx(document, s3_path,
             s3_path,
             include_comments=include_comments,
             include_track_changes=include_track_changes,
-            included_annotations=included_annotations
+            included_annotations=included_annotations,
+            export_key=export_key
         )
         return
 
@@ -235,7 +268,9 @@ def document_to_rich_docx(document, s3_path,
 
     # Reconstruct the document
     sentences = document.get_sorted_sentences()
-    doc = reconstruct_rich_docx(sentences, include_track_changes, tz_name)
+    approved_revisions = get_latest_approved_revisions(sentences, include_track_changes)
+    doc = reconstruct_rich_docx(sentences, include_track_changes, tz_name,
+                                approved_revisions)
 
     # Now add document.xml with its new data
     with zipfile.ZipFile(temporary_archive, mode='a',
@@ -257,16 +292,19 @@ def document_to_rich_docx(document, s3_path,
                                               tz_name=tz_name)
 
     # Save the in-memory file to the specified path in S3
-    s3_bucket = get_s3_bucket_manager(bucket_name=settings.UPLOADED_DOCUMENTS_BUCKET)
-    s3_bucket.save_file(s3_path, result_docx)
+    save_export(s3_path, result_docx, export_key)
 
 
-def reconstruct_rich_docx(sentences, redlines=True, tz_name=None):
+def reconstruct_rich_docx(sentences, redlines=True, tz_name=None,
+                          approved_revisions=None):
     nodes = []
     ids = {}
     for sentence in sentences:
         if redlines and not sentence.accepted:
-            latest_approved_revision = sentence.latest_approved_revision
+            if approved_revisions is None:
+                latest_approved_revision = sentence.latest_approved_revision
+            else:
+                latest_approved_revision = approved_revisions.get(sentence.uuid)
             if latest_approved_revision:
                 sentence_text = sentence.text if not sentence.deleted else ''
                 sentence.formatting = \
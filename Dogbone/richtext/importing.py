@@ -1,4 +1,5 @@
 import os
+import codecs
 import requests
 import tempfile
 import re
@@ -9,10 +10,10 @@ from bs4 import BeautifulSoup
 from richtext.xmldiff import (
     DOCX_DOCUMENT_FNAME, DOCX_STYLES_FNAME, DOCX_NUMBERING_FNAME,
     ANNOTATION_IMG_NAME, DOCX_RELS_FNAME, DOCX_COMMENTS_FNAME,
-    nodes_to_plaintext, tokenize_xml, apply_sentences_to_nodes,
+    nodes_to_plaintext, iter_tokenize_xml, apply_sentences_to_nodes,
     fix_runs_nodes, remove_superfluous_runs,
     get_comments_from_docx, get_ordered_comments_list,
-    add_indentlevel_and_numbering_markers,
+    iter_add_indentlevel_and_numbering_markers,
     process_deletions_and_insertions, remove_insertions, remove_deletions,
     remove_image_relations, remove_doc_annotations, remove_comments_annotations,
     fix_comments_dates
@@ -27,6 +28,10 @@ from utils.conversion import filedecode, contentsdecode
 from nlplib.utils import split_sentences
 
 page_rgx = re.compile(r'^[Pp]age \d+\s*$')
+xml_encoding_rgx = re.compile(r'^<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']')
+
+# The document.xml gets read and tokenized by chunks of this size (in bytes)
+DOCX_READ_CHUNK_SIZE = 64 * 1024
 
 
 class DOCTypeException(Exception):
@@ -37,6 +42,14 @@ def get_named_styles_from_docx(filename):
     """
     Parses the styles.xml file for named styles in a docx document.
     """
+    with zipfile.ZipFile(filename, mode='r') as zin:
+        return read_named_styles(zin)
+
+
+def read_named_styles(zin):
+    """
+    Parses the styles.xml file for named styles in an open docx zip file.
+    """
     styles = {}
 
     def extract_style_from_node(n):
@@ -55,21 +68,20 @@ def get_named_styles_from_docx(filename):
             style['underline'] = parse_underline_value(u.get('w:val'))
         return style
 
-    with zipfile.ZipFile(filename, mode='r') as zin:
-        if DOCX_STYLES_FNAME not in zin.namelist():
-            return {}
+    if DOCX_STYLES_FNAME not in zin.namelist():
+        return {}
 
-        stylestext = zin.read(DOCX_STYLES_FNAME)
-        parsed = BeautifulSoup(stylestext)
-        xmlstyles = parsed.find_all('w:style')
+    stylestext = zin.read(DOCX_STYLES_FNAME)
+    parsed = BeautifulSoup(stylestext)
+    xmlstyles = parsed.find_all('w:style')
 
-        for s in xmlstyles:
-            styles[s['w:styleid']] = extract_style_from_node(s)
+    for s in xmlstyles:
+        styles[s['w:styleid']] = extract_style_from_node(s)
 
-        # Read document defaults
-        defaults = parsed.find('w:docdefaults')
-        if defaults:
-            styles[STYLE_DEFAULTS_LABEL] = extract_style_from_node(defaults)
+    # Read document defaults
+    defaults = parsed.find('w:docdefaults')
+    if defaults:
+        styles[STYLE_DEFAULTS_LABEL] = extract_style_from_node(defaults)
 
     return styles
 
@@ -78,6 +90,14 @@ def get_numbering_styles_from_docx(filename):
     """
     Parses the numbering.xml file for numbering styles in a docx document.
     """
+    with zipfile.ZipFile(filename, mode='r') as zin:
+        return read_numbering_styles(zin)
+
+
+def read_numbering_styles(zin):
+    """
+    Parses the numbering.xml file for numbering styles in an open docx zip file.
+    """
 
     def extract_indentlevel_styles(abstractnum):
         styles = {}
@@ -113,12 +133,11 @@ def get_numbering_styles_from_docx(filename):
 
         return styles
 
-    with zipfile.ZipFile(filename, mode='r') as zin:
-        try:
-            content = zin.read(DOCX_NUMBERING_FNAME)
-            soup = BeautifulSoup(content)
-        except KeyError:
-            return {}
+    try:
+        content = zin.read(DOCX_NUMBERING_FNAME)
+        soup = BeautifulSoup(content)
+    except KeyError:
+        return {}
 
     numbering = {}
 
@@ -141,17 +160,40 @@ def get_numbering_styles_from_docx(filename):
     return numbering
 
 
+def iter_decoded_xml(fileobj, chunk_size=DOCX_READ_CHUNK_SIZE):
+    """
+    Reads an XML file by chunks and decodes them on the fly. The encoding
+    comes from the BOM or the XML declaration (UTF-8 by default), as the
+    docx format mandates, instead of guessing it from the whole contents.
+    """
+    chunk = fileobj.read(chunk_size)
+    if chunk.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = 'utf-16'
+    else:
+        match = xml_encoding_rgx.match(chunk.lstrip(codecs.BOM_UTF8))
+        encoding = match.group(1) if match else 'utf-8'
+        try:
+            if codecs.lookup(encoding).name == 'utf-8':
+                # Skip the BOM if there's one
+                encoding = 'utf-8-sig'
+        except LookupError:
+            encoding = 'utf-8-sig'
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while chunk:
+        yield decoder.decode(chunk)
+        chunk = fileobj.read(chunk_size)
+    yield decoder.decode('', final=True)
+
+
 def parse_docx(filename):
     """
     The whole docx processing workflow.
     Takes in the filename and spits out the sentence split plain text,
     the sentence split XML nodes and the extracted styles for each sentence.
     """
-    # Read
+    # Read and parse in a single pass over the docx
     with zipfile.ZipFile(filename, mode='r') as zin:
-        doctext = zin.read(DOCX_DOCUMENT_FNAME)
-        dec_contents = contentsdecode(doctext)
-
         # Get comments from docx if exist
         if DOCX_COMMENTS_FNAME in zin.namelist():
             doc_comments = zin.read(DOCX_COMMENTS_FNAME)
@@ -160,17 +202,22 @@ def parse_docx(filename):
         else:
             comments = None
 
-    # Get named styles from docx
-    named_styles = get_named_styles_from_docx(filename)
+        # Get named styles from docx
+        named_styles = read_named_styles(zin)
 
-    # Get numbering styles from docx
-    numbering_styles = get_numbering_styles_from_docx(filename)
+        # Get numbering styles from docx
+        numbering_styles = read_numbering_styles(zin)
 
-    # -- Parse --
-    # Generate the nodes format
-    nodes = tokenize_xml(dec_contents)
-    nodes = add_indentlevel_and_numbering_markers(nodes, numbering_styles)
-    nodes = process_deletions_and_insertions(nodes)
+        # -- Parse --
+        # Generate the nodes format, streaming the document.xml through
+        # the tokenizer and the markers pass (only the final nodes are kept)
+        docfile = zin.open(DOCX_DOCUMENT_FNAME)
+        try:
+            nodes = iter_tokenize_xml(iter_decoded_xml(docfile))
+            nodes = iter_add_indentlevel_and_numbering_markers(nodes, numbering_styles)
+            nodes = process_deletions_and_insertions(nodes)
+        finally:
+            docfile.close()
 
     # Get (space preserving) plaintext (no markers, for a better sentence split)
     plaintext = nodes_to_plaintext(nodes, include_markers=False)
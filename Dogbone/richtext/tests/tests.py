@@ -3,6 +3,7 @@ import bs4
 import mock
 import os
 import time
+import zipfile
 from random import shuffle
 from unittest import TestCase
 
@@ -10,12 +11,13 @@ from core.models import Document, Sentence
 from django.contrib.auth.models import User
 from richtext import importing, exporting
 from richtext.xmldiff import (
+    DOCX_DOCUMENT_FNAME,
     preserve_xml_space,
     apply_sentences_to_nodes,
     fix_runs_nodes, remove_superfluous_runs,
     create_numbering_counter, get_formatted_numbering,
     reconstruct_xml, nodes_to_plaintext,
-    tokenize_xml, diff_change_sentence,
+    tokenize_xml, iter_tokenize_xml, diff_change_sentence,
     get_comments_from_docx, get_ordered_comments_list, get_new_comments,
     get_comments_xml, get_basic_comments_xml, add_comment_formatting,
     _add_comment_ids, add_comments_to_doc, add_comment_to_xml,
@@ -182,6 +184,24 @@ class DocxTest(TestCase):
                           ('tag2', 'o'), ('text_2', 'ot'), ('tag2', 'c')]
         self.assertEqual(expected_nodes, actual_nodes)
 
+    def test_iter_tokenize_xml(self):
+        """ Test the streaming tokenizer against the whole text one. """
+        with zipfile.ZipFile(TEST_DOCX, mode='r') as zin:
+            doctext = zin.read(DOCX_DOCUMENT_FNAME)
+            expected_nodes = tokenize_xml(doctext.decode('utf-8'))
+
+            # Chunks split tags, attributes and multi-byte characters apart
+            for chunk_size in (1, 7, 1024):
+                docfile = zin.open(DOCX_DOCUMENT_FNAME)
+                nodes = list(iter_tokenize_xml(
+                    importing.iter_decoded_xml(docfile, chunk_size=chunk_size)))
+                docfile.close()
+                self.assertEqual(expected_nodes, nodes)
+
+        xml = u'<w:r><w:t>caf\xe9 &amp; cr\xe8me</w:t></w:r>\n'
+        for chunks in ([xml], list(xml), [xml[:9], xml[9:14], xml[14:]]):
+            self.assertEqual(tokenize_xml(xml), list(iter_tokenize_xml(chunks)))
+
     @staticmethod
     def _create_document():
         if not User.objects.filter(username='user_for_xmldiff_test'):
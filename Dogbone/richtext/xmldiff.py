@@ -151,41 +151,66 @@ def preserve_xml_space(tx):
 epoch = datetime.datetime.utcfromtimestamp(0).replace(tzinfo=pytz.utc)
 
 
-def tokenize_xml(formatted_text):
+def iter_tokenize_xml(chunks):
     """
-    Turns XML text into list of XML nodes.
-    E.g.   <w:t>txt</w:t>  =>  [('w:t', 'o'), ('txt', 't'), ('w:t', 'c')]
+    Streaming version of tokenize_xml(): takes an iterable of XML text chunks
+    and yields the very same XML nodes, without holding the whole text.
+    """
+    last = None
+    tail = ''
+    for chunk in chunks:
+        tokens = (tail + chunk).split('>')
+        # The last token might continue in the next chunk
+        tail = tokens.pop()
+        for token in tokens:
+            for node in _tokenize_xml_token(token, last):
+                last = node
+                yield node
+
+    for node in _tokenize_xml_token(tail, last):
+        yield node
+
+
+def _tokenize_xml_token(token, last):
     """
-    tokens = formatted_text.split('>')
+    Turns the XML text between two consecutive '>' into XML nodes
+    (:last is the node preceding the text, if any).
+    """
+    if token.startswith('<'):
+        # Beginning of some tag, i.e. <w:tag
+        if token[1:].startswith('/'):
+            return [(token[2:], CLOSE)]
+        return [(token[1:], OPEN)]
+
     nodes = []
-    for token in tokens:
-        if token.startswith('<'):
-            # Beginning of some tag, i.e. <w:tag
-            if token[1:].startswith('/'):
-                nodes.append((token[2:], CLOSE))
-            else:
-                nodes.append((token[1:], OPEN))
+    # Some text followed by <w:tag
+    subtokens = token.split('<')
+    # The only useful text is inside w:t or w:delText tags
+    if last is not None and last[1] == OPEN:
+        if is_text_node(last[0]):
+            node_type = TEXT
+        elif is_deleted_text_node(last[0]):
+            node_type = DELETED_TEXT
         else:
-            # Some text followed by <w:tag
-            subtokens = token.split('<')
-            # The only useful text is inside w:t or w:delText tags
-            if nodes and nodes[-1][1] == OPEN:
-                if is_text_node(nodes[-1][0]):
-                    node_type = TEXT
-                elif is_deleted_text_node(nodes[-1][0]):
-                    node_type = DELETED_TEXT
-                else:
-                    node_type = OTHER_TEXT
-                node_text = html.unescape(xml_unescape(subtokens[0]))
-                nodes.append((node_text, node_type))
-            if len(subtokens) > 1:
-                if subtokens[1].startswith('/'):
-                    nodes.append((subtokens[1][1:], CLOSE))
-                else:
-                    nodes.append((subtokens[1], OPEN))
+            node_type = OTHER_TEXT
+        node_text = html.unescape(xml_unescape(subtokens[0]))
+        nodes.append((node_text, node_type))
+    if len(subtokens) > 1:
+        if subtokens[1].startswith('/'):
+            nodes.append((subtokens[1][1:], CLOSE))
+        else:
+            nodes.append((subtokens[1], OPEN))
     return nodes
 
 
+def tokenize_xml(formatted_text):
+    """
+    Turns XML text into list of XML nodes.
+    E.g.   <w:t>txt</w:t>  =>  [('w:t', 'o'), ('txt', 't'), ('w:t', 'c')]
+    """
+    return list(iter_tokenize_xml([formatted_text]))
+
+
 def reconstruct_xml(nodes):
     """
     Turns list of XML nodes into XML text. Reverse of tokenize_xml().
@@ -570,19 +595,17 @@ def get_formatted_numbering(lvltext, counters):
     return numbering
 
 
-def add_indentlevel_and_numbering_markers(nodes, numbering_styles={}):
+def iter_add_indentlevel_and_numbering_markers(nodes, numbering_styles={}):
     """
-    Extends a list of XML nodes with additional nodes:
+    Extends a stream of XML nodes with additional nodes:
     indent-level and numbering markers.
     """
-    marked_nodes = []
-
     inside_numberingstyle = False
     current_ilvl = last_ilvl = None
     current_numid = last_numid = None
     counters = []
     for nd in nodes:
-        marked_nodes.append(nd)
+        yield nd
 
         tx, tp = nd
         if is_numberingstyle_node(tx):
@@ -595,7 +618,7 @@ def add_indentlevel_and_numbering_markers(nodes, numbering_styles={}):
             ilvl = get_val_attr(tx)
             if ilvl is not None and ilvl.isdigit():
                 last_ilvl = int(ilvl)
-                marked_nodes.append((INDENTLEVEL_MARKER % last_ilvl, MARKER))
+                yield (INDENTLEVEL_MARKER % last_ilvl, MARKER)
 
         elif is_numbering_node(tx) and inside_numberingstyle:
             numid = get_val_attr(tx)
@@ -637,9 +660,15 @@ def add_indentlevel_and_numbering_markers(nodes, numbering_styles={}):
 
             numbering = get_formatted_numbering(lvltext, counters)
             if numbering != '':
-                marked_nodes.append((NUMBERING_MARKER % numbering, MARKER))
+                yield (NUMBERING_MARKER % numbering, MARKER)
 
-    return marked_nodes
+
+def add_indentlevel_and_numbering_markers(nodes, numbering_styles={}):
+    """
+    Extends a list of XML nodes with additional nodes:
+    indent-level and numbering markers.
+    """
+    return list(iter_add_indentlevel_and_numbering_markers(nodes, numbering_styles))
 
 
 def nodes_to_plaintext(nodes, include_markers=True):
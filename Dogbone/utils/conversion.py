@@ -7,33 +7,44 @@
 
 import chardet
 import contextlib
+import functools
+import hashlib
+import json
 import logging
 import os
-import string
+import shutil
 import subprocess
+import tempfile
 import time
 
 import pyPdf
 
+from multiprocessing.pool import ThreadPool
+
 from constance import config
+from django.conf import settings
 from dogbone.exceptions import DocumentSizeOverLimitException
 from utils.EasyPDFCloudAPI.EasyPDFCloudSample import pdf_convert, doc_convert
 
 
-def strings(filename, min=4):
+# Size of the chunks binary files get scanned in
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+
+def file_contains(filename, needle, chunk_size=SCAN_CHUNK_SIZE):
     """
-    Helper function to iterate through a file binary and pull out strings
-    called by requires_ocr()
+    Looks for :needle in a file binary, chunk by chunk and stopping at the
+    first occurrence
     """
     with open(filename, "rb") as f:
-        result = ""
-        for c in f.read():
-            if c in string.printable:
-                result += c
-                continue
-            if len(result) >= min:
-                yield result
-            result = ""
+        # Keep the end of the previous chunk, the needle might span both
+        tail = ""
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            chunk = tail + chunk
+            if needle in chunk:
+                return True
+            tail = chunk[max(0, len(chunk) - len(needle) + 1):]
+    return False
 
 
 def requires_ocr(filename):
@@ -41,12 +52,9 @@ def requires_ocr(filename):
     Helper function to look for 'FontName' in a binary file
     indicating text presence and hence no necessity for OCR
     """
-    is_ocr = True
-    for s in strings(filename):
-        if 'FontName' in s:
-            is_ocr = False
-            break
-    return is_ocr
+    # 'FontName' is made of printable characters only, so there's no need
+    # to pull the printable strings out of the file before looking for it
+    return not file_contains(filename, 'FontName')
 
 
 @contextlib.contextmanager
@@ -91,36 +99,34 @@ def pdftotext(filename):
     return execute(['pdftotext', '-layout', filename, filename_out])
 
 
-def tesseract(filename):
+def ocr_page(filename, page=None):
     """
-    Converts a PDF file to TIFF and tries to perform OCR with tesseract.
-    If tesseract succeeds, it outputs another PDF file (overwriting
-    the original one!), which is processed by pdftotext afterwards in order to
-    preserve the original text layout (since tesseract cannot do that).
+    Converts a page (0-based, or all of them if :page is None) of a PDF file
+    to TIFF and tries to perform OCR with tesseract.
+    Returns the path to the PDF file output by tesseract (or None on failure).
     """
 
-    logging.warning('tesseract: %s', filename)
+    suffix = '' if page is None else '.page%d' % page
+    # Replace '.pdf' with the suffix of the page
+    filename_out = filename[:-4] + suffix
+    filename_in = filename_out + '.tiff'
 
     try:
-        # Replace '.pdf' with '.tiff' for the auxiliary input file
-        filename_in = filename[:-4] + '.tiff'
-
         convert_args = ['convert', '-density', '300', '-depth', '8',
                         '-strip', '-background', 'white', '-alpha', 'off',
-                        filename, filename_in]
+                        filename if page is None else '%s[%d]' % (filename, page),
+                        filename_in]
 
         if not execute(convert_args):
-            return False
-
-        # Overwrite the contents of the original file!
+            return None
 
         # Yet another '.pdf' will be added automatically to the output filename
-        tesseract_args = ['tesseract', filename_in, filename[:-4], 'pdf']
+        tesseract_args = ['tesseract', filename_in, filename_out, 'pdf']
 
         if not execute(tesseract_args):
-            return False
+            return None
 
-        return pdftotext(filename)
+        return filename_out + '.pdf'
 
     finally:
         # Cleanup
@@ -128,59 +134,224 @@ def tesseract(filename):
             os.remove(filename_in)
 
 
+def tesseract(filename):
+    """
+    Converts a PDF file to TIFF and tries to perform OCR with tesseract,
+    page by page (up to OCR_CONCURRENCY pages at the same time).
+    If tesseract succeeds, the pages it outputs are merged by pdfunite into
+    another PDF file (overwriting the original one!), which is processed by
+    pdftotext afterwards in order to preserve the original text layout (since
+    tesseract cannot do that).
+    Both pdfunite and pdftotext come with poppler-utils.
+    """
+
+    logging.warning('tesseract: %s', filename)
+
+    try:
+        with open(filename, 'rb') as pdfin:
+            pages = range(pyPdf.PdfFileReader(pdfin).getNumPages())
+    except Exception as e:
+        # Fall back to converting all the pages in one go
+        logging.error('tesseract: Error on counting pages of pdf %s. Got exception %s: %s',
+                      filename, type(e).__name__, str(e))
+        pages = [None]
+
+    ocr = functools.partial(ocr_page, filename)
+    concurrency = min(settings.OCR_CONCURRENCY, len(pages))
+    if concurrency <= 1:
+        outputs = map(ocr, pages)
+    else:
+        # The threads just wait for the convert and tesseract processes
+        pool = ThreadPool(processes=concurrency)
+        try:
+            outputs = pool.map(ocr, pages)
+        finally:
+            pool.close()
+            pool.join()
+
+    try:
+        if not outputs or None in outputs:
+            return False
+
+        # Overwrite the contents of the original file!
+        if len(outputs) == 1:
+            os.rename(outputs[0], filename)
+        elif not execute(['pdfunite'] + outputs + [filename]):
+            return False
+
+        return pdftotext(filename)
+
+    finally:
+        # Cleanup
+        for filename_out in outputs:
+            if filename_out and filename_out != filename and os.path.isfile(filename_out):
+                os.remove(filename_out)
+
+
 def pdf_to_txt(filename, need_ocr):
     converter = tesseract if need_ocr else pdftotext
     return converter(filename)
 
 
+def file_sha256(filename, chunk_size=SCAN_CHUNK_SIZE):
+    """ Hashes the contents of a file, chunk by chunk """
+    sha256 = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def count_pages(filename):
+    """ Counts the pages of a PDF file (0 if it can't be read) """
+    try:
+        with open(filename, 'rb') as pdfin:
+            return pyPdf.PdfFileReader(pdfin).getNumPages()
+    except Exception as e:
+        # Log the exception and move on
+        logging.error(
+            'process_document_conversion: Error on counting pages of pdf %s. Got exception %s: %s'
+            % (filename, type(e).__name__, str(e))
+        )
+        return 0
+
+
+def conversion_cache_name(digest, info):
+    """
+    The name of the cached conversion of the file hashed as :digest.
+    The txt ones also record the converter which output them (see pdf_to_txt).
+    """
+    if info['ext'] == '.txt':
+        converter = 'tesseract' if info['need_ocr'] else 'pdftotext'
+        return '%s.%s.txt' % (digest, converter)
+    return digest + info['ext']
+
+
+def read_conversion_cache(digest):
+    """
+    Looks for the conversion of the file hashed as :digest in the cache.
+    Returns the path to the cached file and the info it was stored with
+    (see write_conversion_cache), or (None, None) if there isn't any.
+    The txt conversions expire after CONVERSION_CACHE_TXT_TTL seconds.
+    """
+    cache_dir = settings.CONVERSION_CACHE_DIR
+    if not cache_dir:
+        return None, None
+
+    try:
+        info_path = os.path.join(cache_dir, digest + '.json')
+        with open(info_path) as f:
+            info = json.load(f)
+
+        if info['ext'] == '.txt' and time.time() - info['created'] > settings.CONVERSION_CACHE_TXT_TTL:
+            return None, None
+
+        cached = os.path.join(cache_dir, conversion_cache_name(digest, info))
+        # Mark them as recently used (also checks they're still there)
+        os.utime(cached, None)
+        os.utime(info_path, None)
+    except (IOError, OSError, ValueError, KeyError):
+        return None, None
+    return cached, info
+
+
+def write_conversion_cache(digest, filename, info):
+    """
+    Stores a copy of :filename (the conversion of the file hashed as :digest)
+    in the cache, along with the :info dict: the extension of the conversion
+    ('ext'), whether the file needed OCR ('need_ocr') and its page count
+    ('num_pages'). Evicts the least recently used files over the size limit.
+    Failing to do that doesn't fail the conversion.
+    """
+    cache_dir = settings.CONVERSION_CACHE_DIR
+    if not cache_dir:
+        return
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        # Copy then rename, so that other workers never read a partial file
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(filename, temp_path)
+        os.rename(temp_path, os.path.join(cache_dir, conversion_cache_name(digest, info)))
+
+        # The info goes last, the conversion isn't looked up without it
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(dict(info, created=time.time()), f)
+        os.rename(temp_path, os.path.join(cache_dir, digest + '.json'))
+
+        cached = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if not name.endswith('.tmp'):
+                stat = os.stat(path)
+                cached.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in cached)
+        for _, size, path in sorted(cached):
+            if total_size <= settings.CONVERSION_CACHE_MAX_SIZE:
+                break
+            os.remove(path)
+            total_size -= size
+    except (IOError, OSError) as e:
+        logging.warning('Could not cache the conversion of %s: %r', digest, e)
+
+
 def pdf_to_docx(filename):
     """
     Transcodes a .pdf file to docx via the EasyPdfCloud
+    (or to txt, if that fails)
     :param filename: path to locate the .pdf file
-    :returns: path to the docx version of the file
+    :returns: path to the docx (or txt) version of the file
     """
 
     upload = os.path.abspath(filename)
-    need_ocr = requires_ocr(upload)
+    basepath = '.'.join(upload.split('.')[:-1])
+
+    # The same files get uploaded over and over again
+    digest = file_sha256(upload)
+    cached, info = read_conversion_cache(digest)
+    if cached:
+        logging.info('Document %s was converted before' % filename)
+        need_ocr, num_pages = info['need_ocr'], info['num_pages']
+    else:
+        need_ocr = requires_ocr(upload)
+        num_pages = count_pages(upload)
 
     if need_ocr:
         logging.info('Document %s needs OCR' % filename)
-        try:
-            pdfin = open(upload)
-            reader = pyPdf.PdfFileReader(pdfin)
-            num_pages = reader.getNumPages()
-        except Exception as e:
-            # Log the exception and move on
-            logging.error(
-                'process_document_conversion: Error on counting pages of pdf %s. Got exception %s: %s'
-                % (filename, type(e).__name__, str(e))
-            )
-            num_pages = 0
-
         logging.info('Document %s has %s pages' % (filename, num_pages))
 
         if num_pages > config.MAX_PDF_OCR_UPLOAD_PAGES:
             logging.warning('Document %s is over-sized' % filename)
             raise DocumentSizeOverLimitException("Document uploaded is too large to be OCRed: %s" % num_pages)
 
-    ext = '.docx'
-
-    try:
-        pdf_convert(upload, need_ocr)
-    except Exception as e:
-        logging.error('%spdf_to_docx conversion failed: %r',
-                      'ocr_' if need_ocr else '', e)
-        if pdf_to_txt(upload, need_ocr):
-            ext = '.txt'
-        else:
-            raise
+    if cached:
+        ext = info['ext']
+        shutil.copyfile(cached, basepath + ext)
+    else:
+        ext = '.docx'
+        try:
+            pdf_convert(upload, need_ocr)
+        except Exception as e:
+            logging.error('%spdf_to_docx conversion failed: %r',
+                          'ocr_' if need_ocr else '', e)
+            if pdf_to_txt(upload, need_ocr):
+                ext = '.txt'
+            else:
+                raise
 
     # Run task to keep the record
     from portal.tasks import update_PDFUploadMonitor
-    update_PDFUploadMonitor(upload, need_ocr)
+    update_PDFUploadMonitor(upload, need_ocr, pages=num_pages)
 
-    docxpath = '.'.join(os.path.abspath(filename).split('.')[:-1]) + ext
-    return docxpath
+    if not cached:
+        write_conversion_cache(digest, basepath + ext,
+                               {'ext': ext, 'need_ocr': need_ocr, 'num_pages': num_pages})
+    return basepath + ext
 
 
 def doc_to_docx(filename):
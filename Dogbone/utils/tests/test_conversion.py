@@ -0,0 +1,230 @@
+import mock
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from dogbone.exceptions import DocumentSizeOverLimitException
+from utils import conversion
+
+
+class FileContainsTest(SimpleTestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write('0123/FontName/4567')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_needle_across_chunks(self):
+        # 'FontName' starts in the 2nd chunk of 4 bytes and ends in the 4th one
+        self.assertTrue(conversion.file_contains(self.filename, 'FontName', chunk_size=4))
+        self.assertTrue(conversion.file_contains(self.filename, '3/F', chunk_size=4))
+        self.assertFalse(conversion.file_contains(self.filename, 'FontFile', chunk_size=4))
+
+    def test_needle_in_chunk(self):
+        self.assertTrue(conversion.file_contains(self.filename, 'FontName'))
+        self.assertFalse(conversion.file_contains(self.filename, 'FontFile'))
+
+
+class ConversionCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+        patcher = mock.patch('portal.tasks.update_PDFUploadMonitor')
+        self.update_monitor_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def create_pdf(self, name, contents='%PDF /FontName /Helvetica'):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+        return path
+
+    @staticmethod
+    def fake_pdf_convert(upload, need_ocr):
+        with open(upload[:-4] + '.docx', 'wb') as f:
+            f.write('DOCX')
+
+    @staticmethod
+    def fake_pdf_to_txt(upload, need_ocr):
+        with open(upload[:-4] + '.txt', 'wb') as f:
+            f.write('TXT')
+        return True
+
+    def test_cache_hit(self):
+        with self.settings(CONVERSION_CACHE_DIR=self.cache_dir):
+            with mock.patch('utils.conversion.pdf_convert',
+                            side_effect=self.fake_pdf_convert) as pdf_convert_mock:
+                first = conversion.pdf_to_docx(self.create_pdf('first.pdf'))
+                self.assertEqual(pdf_convert_mock.call_count, 1)
+
+                # The same file uploaded again
+                with mock.patch('utils.conversion.requires_ocr') as requires_ocr_mock:
+                    second = conversion.pdf_to_docx(self.create_pdf('second.pdf'))
+                self.assertEqual(pdf_convert_mock.call_count, 1)
+                self.assertFalse(requires_ocr_mock.called)
+
+        self.assertEqual(first, os.path.join(self.tmp_dir, 'first.docx'))
+        self.assertEqual(second, os.path.join(self.tmp_dir, 'second.docx'))
+        with open(second, 'rb') as f:
+            self.assertEqual(f.read(), 'DOCX')
+
+        # The upload is still recorded, with the stored page count
+        self.assertEqual(self.update_monitor_mock.call_args_list,
+                         [mock.call(os.path.join(self.tmp_dir, 'first.pdf'), False, pages=0),
+                          mock.call(os.path.join(self.tmp_dir, 'second.pdf'), False, pages=0)])
+
+    def test_cache_miss(self):
+        with self.settings(CONVERSION_CACHE_DIR=self.cache_dir):
+            with mock.patch('utils.conversion.pdf_convert',
+                            side_effect=self.fake_pdf_convert) as pdf_convert_mock:
+                conversion.pdf_to_docx(self.create_pdf('first.pdf'))
+                conversion.pdf_to_docx(self.create_pdf('second.pdf', '%PDF /FontName /Times'))
+                self.assertEqual(pdf_convert_mock.call_count, 2)
+
+        # Each conversion along with its info
+        self.assertEqual(len(os.listdir(self.cache_dir)), 4)
+
+    def test_txt_fallback_cached(self):
+        with self.settings(CONVERSION_CACHE_DIR=self.cache_dir):
+            with mock.patch('utils.conversion.pdf_convert', side_effect=Exception('Down')) as pdf_convert_mock, \
+                    mock.patch('utils.conversion.pdf_to_txt', side_effect=self.fake_pdf_to_txt):
+                upload = self.create_pdf('first.pdf')
+                first = conversion.pdf_to_docx(upload)
+                second = conversion.pdf_to_docx(self.create_pdf('second.pdf'))
+                self.assertEqual(pdf_convert_mock.call_count, 1)
+
+                # Until it expires, so that the docx conversion gets retried
+                with self.settings(CONVERSION_CACHE_TXT_TTL=-1):
+                    conversion.pdf_to_docx(self.create_pdf('third.pdf'))
+                self.assertEqual(pdf_convert_mock.call_count, 2)
+
+        self.assertEqual(first, os.path.join(self.tmp_dir, 'first.txt'))
+        self.assertEqual(second, os.path.join(self.tmp_dir, 'second.txt'))
+        with open(second, 'rb') as f:
+            self.assertEqual(f.read(), 'TXT')
+        # Stored as output by pdftotext (the upload has text)
+        self.assertIn('%s.pdftotext.txt' % conversion.file_sha256(upload), os.listdir(self.cache_dir))
+
+    def test_cache_hit_checks_ocr_pages(self):
+        upload = self.create_pdf('scanned.pdf', '%PDF scanned')
+        with self.settings(CONVERSION_CACHE_DIR=self.cache_dir):
+            conversion.write_conversion_cache(conversion.file_sha256(upload), upload,
+                                              {'ext': '.docx', 'need_ocr': True, 'num_pages': 5})
+
+            reader_mock = mock.Mock()
+            with mock.patch('utils.conversion.pyPdf.PdfFileReader', reader_mock), \
+                    mock.patch('utils.conversion.config', MAX_PDF_OCR_UPLOAD_PAGES=3):
+                self.assertRaises(DocumentSizeOverLimitException, conversion.pdf_to_docx, upload)
+
+        # The stored page count is used
+        self.assertFalse(reader_mock.called)
+        self.assertFalse(self.update_monitor_mock.called)
+
+    def test_cache_eviction(self):
+        first = self.create_pdf('first.docx', '12345678')
+        second = self.create_pdf('second.docx', 'abcdefgh')
+        info = {'ext': '.docx', 'need_ocr': False, 'num_pages': 1}
+
+        with self.settings(CONVERSION_CACHE_DIR=self.cache_dir):
+            conversion.write_conversion_cache('first', first, info)
+            # Make sure it's the least recently used one
+            paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+            for path in paths:
+                os.utime(path, (0, 0))
+
+            # Only room for one of them
+            with self.settings(CONVERSION_CACHE_MAX_SIZE=sum(map(os.path.getsize, paths)) + 10):
+                conversion.write_conversion_cache('second', second, info)
+
+            self.assertEqual(conversion.read_conversion_cache('first'), (None, None))
+            self.assertEqual(conversion.read_conversion_cache('second')[0],
+                             os.path.join(self.cache_dir, 'second.docx'))
+
+
+class OCRTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.upload = os.path.join(self.tmp_dir, 'scanned.pdf')
+        with open(self.upload, 'wb') as f:
+            f.write('%PDF scanned')
+
+        # The tools (or their input files) the conversion fails for
+        self.failing = set()
+        patcher = mock.patch('utils.conversion.execute', side_effect=self.fake_execute)
+        self.execute_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def fake_execute(self, args):
+        """ Writes the files the tools would output """
+        tool = args[0]
+        if tool in self.failing or args[1] in self.failing:
+            return False
+
+        output = args[2] + '.pdf' if tool == 'tesseract' else args[-1]
+        with open(output, 'wb') as f:
+            f.write(tool)
+        return True
+
+    def tool_calls(self, tool):
+        return [call[0][0] for call in self.execute_mock.call_args_list if call[0][0][0] == tool]
+
+    def test_ocr_page(self):
+        output = conversion.ocr_page(self.upload, 1)
+
+        self.assertEqual(output, os.path.join(self.tmp_dir, 'scanned.page1.pdf'))
+        self.assertTrue(os.path.isfile(output))
+        self.assertEqual(self.tool_calls('convert')[0][-2], self.upload + '[1]')
+        # The intermediate TIFF file is removed
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ['scanned.page1.pdf', 'scanned.pdf'])
+
+    def test_ocr_page_failure(self):
+        self.failing.add('tesseract')
+
+        self.assertIsNone(conversion.ocr_page(self.upload, 0))
+        self.assertEqual(os.listdir(self.tmp_dir), ['scanned.pdf'])
+
+    def test_tesseract_pages(self):
+        reader_mock = mock.Mock()
+        reader_mock.return_value.getNumPages.return_value = 3
+        with self.settings(OCR_CONCURRENCY=2), \
+                mock.patch('utils.conversion.pyPdf.PdfFileReader', reader_mock):
+            self.assertTrue(conversion.tesseract(self.upload))
+
+        # Each page is OCRed, then they are merged in order
+        self.assertEqual(len(self.tool_calls('tesseract')), 3)
+        pages = [os.path.join(self.tmp_dir, 'scanned.page%d.pdf' % page) for page in range(3)]
+        self.assertEqual(self.tool_calls('pdfunite'), [['pdfunite'] + pages + [self.upload]])
+        with open(self.upload, 'rb') as f:
+            self.assertEqual(f.read(), 'pdfunite')
+
+        # Only the merged file and its text are left
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), ['scanned.pdf', 'scanned.txt'])
+
+    def test_tesseract_page_failure(self):
+        # The other pages are OCRed all right
+        self.failing.add(os.path.join(self.tmp_dir, 'scanned.page1.tiff'))
+
+        reader_mock = mock.Mock()
+        reader_mock.return_value.getNumPages.return_value = 3
+        with self.settings(OCR_CONCURRENCY=2), \
+                mock.patch('utils.conversion.pyPdf.PdfFileReader', reader_mock):
+            self.assertFalse(conversion.tesseract(self.upload))
+
+        self.assertEqual(self.tool_calls('pdfunite'), [])
+        with open(self.upload, 'rb') as f:
+            self.assertEqual(f.read(), '%PDF scanned')
+        self.assertEqual(os.listdir(self.tmp_dir), ['scanned.pdf'])